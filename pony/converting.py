@@ -71,11 +71,9 @@ def isbn13_to_isbn10(s):
 # The next two regular expressions taken from
 # http://www.regular-expressions.info/email.html
 
-email_re = re.compile(
-    r'^[a-z0-9._%+-]+@[a-z0-9][a-z0-9-]*(?:\.[a-z0-9][a-z0-9-]*)+$',
-    re.IGNORECASE)
+email_str = r'^[a-z0-9._%+-]+@[a-z0-9][a-z0-9-]*(?:\.[a-z0-9][a-z0-9-]*)+$'
 
-rfc2822_email_re = re.compile(r'''
+rfc2822_email_str = r'''
     ^(?: [a-z0-9!#$%&'*+/=?^_`{|}~-]+(?:\.[a-z0-9!#$%&'*+/=?^_`{|}~-]+)*
      |   "(?:[\x01-\x08\x0b\x0c\x0e-\x1f\x21\x23-\x5b\x5d-\x7f]|\\[\x01-\x09\x0b\x0c\x0e-\x7f])*"
      )
@@ -86,15 +84,17 @@ rfc2822_email_re = re.compile(r'''
                 :(?:[\x01-\x08\x0b\x0c\x0e-\x1f\x21-\x5a\x53-\x7f]|\\[\x01-\x09\x0b\x0c\x0e-\x7f])+
             )
          \]
-     )$''', re.IGNORECASE | re.VERBOSE)
+     )$'''
 
 def check_email(s):
     s = s.strip()
+    if email_re is None: compile_regexes()
     if email_re.match(s) is None: raise ValueError()
     return s
 
 def check_rfc2822_email(s):
     s = s.strip()
+    if rfc2822_email_re is None: compile_regexes()
     if rfc2822_email_re.match(s) is None: raise ValueError()
     return s
 
@@ -107,8 +107,6 @@ date_str_list = [
     r'\D*(?P<year>\d{4})\D+(?P<day>\d{1,2})\D*',
     r'\D*(?P<day>\d{1,2})\D+(?P<year>\d{4})\D*'
     ]
-date_re_list = [ re.compile('^%s$'%s, re.UNICODE) for s in date_str_list ]
-
 time_str = r'''
     (?P<hh>\d{1,2})  # hours
     (?: \s* [hu] \s* )?  # optional hours suffix
@@ -127,10 +125,18 @@ time_str = r'''
         \s* (?: (?P<am> a\.?m\.? ) | (?P<pm> p\.?m\.? ) )
     )?
 '''
-time_re = re.compile('^%s$'%time_str, re.VERBOSE)
 
-datetime_re_list = [ re.compile('^%s(?:[t ]%s)?$' % (date_str, time_str), re.UNICODE | re.VERBOSE)
-                     for date_str in date_str_list ]
+# regular expressions are compiled on first use, it takes noticeable part of `import pony.orm` time
+email_re = rfc2822_email_re = date_re_list = time_re = datetime_re_list = None
+
+def compile_regexes():
+    global email_re, rfc2822_email_re, date_re_list, time_re, datetime_re_list
+    email_re = re.compile(email_str, re.IGNORECASE)
+    rfc2822_email_re = re.compile(rfc2822_email_str, re.IGNORECASE | re.VERBOSE)
+    date_re_list = [ re.compile('^%s$'%s, re.UNICODE) for s in date_str_list ]
+    time_re = re.compile('^%s$'%time_str, re.VERBOSE)
+    datetime_re_list = [ re.compile('^%s(?:[t ]%s)?$' % (date_str, time_str), re.UNICODE | re.VERBOSE)
+                         for date_str in date_str_list ]
 
 month_lists = [
     "jan feb mar apr may jun jul aug sep oct nov dec".split(),
@@ -146,6 +152,7 @@ month_dict[u'
 
 def str2date(s):
     s = s.strip().lower()
+    if date_re_list is None: compile_regexes()
     for date_re in date_re_list:
         match = date_re.match(s)
         if match is not None: break
@@ -162,6 +169,7 @@ def str2date(s):
 
 def str2time(s):
     s = s.strip().lower()
+    if time_re is None: compile_regexes()
     match = time_re.match(s)
     if match is None: raise ValueError('Unrecognized time format')
     hh, mm, ss, mcs = _extract_time_parts(match.groupdict())
@@ -169,6 +177,7 @@ def str2time(s):
 
 def str2datetime(s):
     s = s.strip().lower()
+    if datetime_re_list is None: compile_regexes()
     for datetime_re in datetime_re_list:
         match = datetime_re.match(s)
         if match is not None: break
@@ -61,6 +61,30 @@ CONSOLE_ENCODING = None
 # db options
 MAX_FETCH_COUNT = None
 
+# cache size options (None means unlimited size)
+TRANSLATOR_CACHE_SIZE = 1000  # per Database instance
+CONSTRUCTED_SQL_CACHE_SIZE = 2000  # per Database instance
+INSERT_SQL_CACHE_SIZE = 1000  # per Database instance, used by db.insert()
+DECOMPILER_CACHE_SIZE = 5000
+ADAPTED_SQL_CACHE_SIZE = 1000  # raw SQL fragments
+STRING2AST_CACHE_SIZE = 1000  # queries written as strings
+EXTRACTORS_CACHE_SIZE = 5000  # external expressions of queries and lambdas
+CODEOBJECT_CACHE_SIZE = 5000  # code objects of queries and lambdas
+READ_YOUR_WRITES_CACHE_SIZE = 10000  # per Database instance, users with recent writes
+QUERY_RESULT_CACHE_SIZE = 1000  # per Database instance, results of queries with .cache() option
+COMPILED_QUERY_PLANS_SIZE = 100  # per compiled query, shapes of queries returned by the function
+
+# number of rows which Entity.bulk_insert() writes by one COPY or executemany() call
+BULK_INSERT_BATCH_SIZE = 10000
+
+# table which keeps fingerprints of verified schemata, used by generate_mapping(schema_fingerprint=True)
+SCHEMA_FINGERPRINT_TABLE = 'pony_schema_fingerprint'
+
+# async db_session options
+ASYNC_MAX_WORKERS = 10  # threads (and connections) used by async db_sessions at the same time
+ASYNC_MAX_IDLE_WORKERS = 10  # threads which are kept for reuse by next async db_sessions
+EXECUTOR_MAX_WORKERS = 10  # per Database instance, used by db.submit() when the pool size is not specified
+
 # used for select(...).show()
 CONSOLE_WIDTH = 80
 
@@ -70,6 +94,10 @@ SIMPLE_ALIASES = True  # if True just use entity name like "Course-1"
 
 INNER_JOIN_SYNTAX = False # put conditions to INNER JOIN ... ON ... or to WHERE ...
 
+# pad tuples used in `x in items` conditions to the nearest power of two length,
+# so the same translated query can be reused for lists of different length
+IN_LIST_PADDING = True
+
 # debugging options
 DEBUGGING_REMOVE_ADDR = True
 DEBUGGING_RESTORE_ESCAPES = True
@@ -0,0 +1,65 @@
+from __future__ import absolute_import, print_function, division
+
+from collections import deque
+from functools import partial
+from threading import Lock
+
+from pony import options
+
+class AsyncWorker(object):
+    # Dedicated thread which executes all database operations of one async db_session,
+    # the same way as aiosqlite executes blocking sqlite3 calls in a thread of its own.
+    # Session state is kept in thread-local storage, so the whole session should live in one thread.
+    # Threads are reused between sessions, so connections of thread-local pools are reused too
+    def __init__(worker):
+        from concurrent.futures import ThreadPoolExecutor  # imported lazily to speed up `import pony.orm`
+        worker.executor = ThreadPoolExecutor(1, thread_name_prefix='pony-async')
+    def run(worker, func, *args, **kwargs):
+        import asyncio
+        loop = asyncio.get_running_loop()
+        return loop.run_in_executor(worker.executor, partial(func, *args, **kwargs))
+    def shutdown(worker):
+        worker.executor.shutdown(wait=False)
+
+# At most ASYNC_MAX_WORKERS sessions (and so threads and connections) are active at the same time,
+# other sessions wait until one of the workers is released
+workers_lock = Lock()
+workers_count = 0
+idle_workers = []
+waiters = deque()  # (loop, future) pairs of sessions which wait for a worker
+
+async def acquire_worker():
+    global workers_count
+    import asyncio
+    with workers_lock:
+        if idle_workers: return idle_workers.pop()
+        if workers_count < options.ASYNC_MAX_WORKERS:
+            workers_count += 1
+            future = None
+        else:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            waiters.append((loop, future))
+    if future is None: return AsyncWorker()
+    try: return await future
+    except asyncio.CancelledError:
+        if future.done() and not future.cancelled(): release_worker(future.result())
+        raise
+
+def _pass_worker(future, worker):
+    if future.cancelled(): release_worker(worker)
+    else: future.set_result(worker)
+
+def release_worker(worker):
+    global workers_count
+    with workers_lock:
+        while waiters:
+            loop, future = waiters.popleft()
+            if future.cancelled() or loop.is_closed(): continue
+            loop.call_soon_threadsafe(_pass_worker, future, worker)
+            return
+        if len(idle_workers) < options.ASYNC_MAX_IDLE_WORKERS and workers_count <= options.ASYNC_MAX_WORKERS:
+            idle_workers.append(worker)
+            return
+        workers_count -= 1
+    worker.shutdown()
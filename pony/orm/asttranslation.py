@@ -5,7 +5,8 @@ import ast
 
 from functools import update_wrapper
 
-from pony.utils import HashableDict, throw, copy_ast
+from pony import options
+from pony.utils import HashableDict, LRUCache, throw, copy_ast
 
 class TranslationError(Exception): pass
 
@@ -440,7 +441,7 @@ class PreTranslator(ASTTranslator):
     postBitOr = postBitXor = postBitAnd = postLShift = postRShift \
         = postAdd = postSub = postMult = postMatMult = postDiv = postFloorDiv = postMod = post_binop
 
-extractors_cache = {}
+extractors_cache = LRUCache(options.EXTRACTORS_CACHE_SIZE)
 
 def create_extractors(code_key, tree, globals, locals, special_functions, const_functions, outer_names=()):
     result = extractors_cache.get(code_key)
@@ -458,5 +459,20 @@ def create_extractors(code_key, tree, globals, locals, special_functions, const_
                 def extractor(globals, locals, code=code):
                     return eval(code, globals, locals)
             extractors[src] = extractor
+        tree.in_list_srcs = get_in_list_srcs(tree, pretranslator.externals)
         result = extractors_cache[code_key] = tree, extractors
     return result
+
+def get_in_list_srcs(tree, externals):
+    # Sources of external expressions which are used only as a right operand of `in` and `not in`.
+    # Values of such expressions can be padded with duplicate items without changing the query result
+    external_ids = { id(node) for node in externals }
+    in_list_ids = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Compare):
+            for op, comparator in zip(node.ops, node.comparators):
+                if isinstance(op, (ast.In, ast.NotIn)) and id(comparator) in external_ids:
+                    in_list_ids.add(id(comparator))
+    srcs = { node.src for node in externals if id(node) in in_list_ids }
+    srcs.difference_update(node.src for node in externals if id(node) not in in_list_ids)
+    return frozenset(srcs)
@@ -0,0 +1,118 @@
+from __future__ import absolute_import, print_function, division
+
+import json, os, platform, shutil, sqlite3, tempfile
+from datetime import datetime
+from time import perf_counter
+
+import pony
+from pony.utils import throw
+
+benchmarks = {}
+
+# Results stored with the source code, used by `python -m pony.orm.benchmarks --compare`.
+# Timings depend on the machine, so the file should be regenerated with --output before comparison
+# on a different machine
+BASELINE_FILENAME = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+def benchmark(operations, scalable=True):
+    # Registers workload function. The function receives populated database and the scale factor
+    # and returns callable which is timed, or a pair (run, reset) where reset is called untimed after each run.
+    # The number of operations of scalable workload is proportional to the scale factor
+    def decorator(func):
+        name = func.__name__
+        if name in benchmarks: throw(TypeError, 'Benchmark %s is already registered' % name)
+        benchmarks[name] = func, operations, scalable
+        return func
+    return decorator
+
+def get_benchmark_names():
+    from pony.orm.benchmarks import workloads
+    return sorted(benchmarks)
+
+def run_benchmarks(names=None, repeat=5, warmup=1, scale=1.0, progress=None):
+    from pony.orm.benchmarks import workloads
+    if names is None: names = get_benchmark_names()
+    for name in names:
+        if name not in benchmarks: throw(ValueError, 'Unknown benchmark: %s' % name)
+    if not isinstance(repeat, int) or repeat < 1:
+        throw(ValueError, 'repeat must be positive integer. Got: %r' % repeat)
+    results = {}
+    dirname = tempfile.mkdtemp(prefix='pony-benchmarks-')
+    try:
+        for name in names:
+            func, operations, scalable = benchmarks[name]
+            db = workloads.create_database(os.path.join(dirname, name + '.sqlite'), scale)
+            try:
+                result = func(db, scale)
+                run, reset = result if isinstance(result, tuple) else (result, None)
+                timings = []
+                for i in range(warmup + repeat):
+                    start = perf_counter()
+                    run()
+                    duration = perf_counter() - start
+                    if reset is not None: reset()
+                    if i >= warmup: timings.append(duration)
+            finally:
+                db.disconnect()
+            ops = max(1, int(operations * scale)) if scalable else operations
+            results[name] = get_stats(timings, ops)
+            if progress is not None: progress(name, results[name])
+    finally:
+        shutil.rmtree(dirname, ignore_errors=True)
+    return dict(
+        pony_version=pony.__version__,
+        python_version=platform.python_version(),
+        sqlite_version=sqlite3.sqlite_version,
+        platform=platform.platform(),
+        timestamp=datetime.utcnow().isoformat(),
+        repeat=repeat,
+        scale=scale,
+        benchmarks=results)
+
+def get_stats(timings, operations):
+    timings = sorted(timings)
+    size = len(timings)
+    median = timings[size // 2] if size % 2 else (timings[size // 2 - 1] + timings[size // 2]) / 2
+    return dict(min=timings[0], max=timings[-1], median=median, mean=sum(timings) / size,
+                operations=operations, ops_per_sec=operations / median if median else None)
+
+def save_results(results, filename):
+    with open(filename, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+def load_results(filename):
+    with open(filename) as f:
+        results = json.load(f)
+    if not isinstance(results, dict) or 'benchmarks' not in results:
+        throw(ValueError, 'File %s does not contain benchmark results' % filename)
+    return results
+
+def compare_results(results, baseline, threshold=0.1):
+    # Compares median timings; returns list of (name, baseline_median, median, ratio, status) tuples
+    if results.get('scale') != baseline.get('scale'): throw(ValueError,
+        'Baseline results were measured with scale %s, current scale is %s' % (baseline.get('scale'), results.get('scale')))
+    comparison = []
+    current = results['benchmarks']
+    for name, base_stats in sorted(baseline['benchmarks'].items()):
+        stats = current.get(name)
+        if stats is None: continue
+        ratio = stats['median'] / base_stats['median'] if base_stats['median'] else None
+        if ratio is None: status = 'ok'
+        elif ratio > 1 + threshold: status = 'slower'
+        elif ratio < 1 - threshold: status = 'faster'
+        else: status = 'ok'
+        comparison.append((name, base_stats['median'], stats['median'], ratio, status))
+    return comparison
+
+def format_results(results, comparison=None):
+    lines = [ '%-24s %12s %12s %14s' % ('benchmark', 'median, ms', 'min, ms', 'ops/sec') ]
+    for name, stats in sorted(results['benchmarks'].items()):
+        lines.append('%-24s %12.3f %12.3f %14.1f' % (
+            name, stats['median'] * 1000, stats['min'] * 1000, stats['ops_per_sec'] or 0))
+    if comparison:
+        lines.append('')
+        lines.append('%-24s %12s %12s %8s  %s' % ('benchmark', 'baseline, ms', 'current, ms', 'ratio', 'status'))
+        for name, base_median, median, ratio, status in comparison:
+            lines.append('%-24s %12.3f %12.3f %8s  %s' % (
+                name, base_median * 1000, median * 1000, '%.2f' % ratio if ratio is not None else '-', status))
+    return '\n'.join(lines)
@@ -0,0 +1,37 @@
+from __future__ import absolute_import, print_function, division
+
+import argparse, sys
+
+from pony.orm.benchmarks import (
+    BASELINE_FILENAME, get_benchmark_names, run_benchmarks, save_results, load_results, compare_results, format_results)
+
+def main(args=None):
+    parser = argparse.ArgumentParser(prog='python -m pony.orm.benchmarks', description='Pony ORM benchmarks')
+    parser.add_argument('names', nargs='*', help='benchmarks to run (all by default)')
+    parser.add_argument('--list', action='store_true', help='list available benchmarks and exit')
+    parser.add_argument('--repeat', type=int, default=5, help='number of timed runs of each benchmark')
+    parser.add_argument('--warmup', type=int, default=1, help='number of untimed runs of each benchmark')
+    parser.add_argument('--scale', type=float, default=1.0, help='multiplier of the data size')
+    parser.add_argument('--output', help='file to save results in JSON format')
+    parser.add_argument('--compare', '--baseline', nargs='?', const=BASELINE_FILENAME, metavar='FILE',
+                        help='JSON file with results to compare with (the stored baseline by default)')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='relative difference of median time which is reported as slower or faster')
+    options = parser.parse_args(args)
+    if options.list:
+        for name in get_benchmark_names(): print(name)
+        return 0
+    def progress(name, stats):
+        print('%-24s %10.3f ms' % (name, stats['median'] * 1000), file=sys.stderr)
+    results = run_benchmarks(options.names or None, options.repeat, options.warmup, options.scale, progress)
+    if options.output: save_results(results, options.output)
+    comparison = None
+    if options.compare:
+        comparison = compare_results(results, load_results(options.compare), options.threshold)
+    print(format_results(results, comparison))
+    if comparison and any(status == 'slower' for name, base_median, median, ratio, status in comparison):
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
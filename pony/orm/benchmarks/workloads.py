@@ -0,0 +1,211 @@
+from __future__ import absolute_import, print_function, division
+
+import io, os, subprocess, sys, threading
+from decimal import Decimal
+
+import pony
+from pony.orm.core import *
+from pony.orm import serialization
+from pony.orm.benchmarks import benchmark
+
+CUSTOMERS = 200
+ORDERS_PER_CUSTOMER = 5
+PRODUCTS = 100
+MEASUREMENTS = 2000
+MEASUREMENT_COLUMNS = 20
+THREADS = 4
+
+def define_entities(db):
+    class Customer(db.Entity):
+        email = Required(str, unique=True)
+        name = Required(str)
+        country = Required(str)
+        orders = Set('Order')
+
+    class Product(db.Entity):
+        name = Required(str)
+        price = Required(Decimal)
+        quantity = Required(int)
+        items = Set('OrderItem')
+
+    class Order(db.Entity):
+        customer = Required(Customer)
+        state = Required(str)
+        total = Required(Decimal)
+        items = Set('OrderItem')
+
+    class OrderItem(db.Entity):
+        order = Required(Order)
+        product = Required(Product)
+        quantity = Required(int)
+        PrimaryKey(order, product)
+
+    attrs = dict(('value%d' % i, Required(float)) for i in range(MEASUREMENT_COLUMNS))
+    attrs['label'] = Required(str)
+    type('Measurement', (db.Entity,), attrs)
+
+def create_database(filename, scale=1.0):
+    db = Database()
+    define_entities(db)
+    db.bind('sqlite', filename, create_db=True)
+    db.generate_mapping(create_tables=True)
+    populate(db, scale)
+    return db
+
+def scaled(count, scale):
+    return max(1, int(count * scale))
+
+@db_session
+def populate(db, scale):
+    products = [ db.Product(name='Product %d' % i, price=Decimal(i % 50 + 1), quantity=i)
+                 for i in range(scaled(PRODUCTS, scale)) ]
+    for i in range(scaled(CUSTOMERS, scale)):
+        customer = db.Customer(email='customer%d@example.com' % i, name='Customer %d' % i, country='Country %d' % (i % 10))
+        for j in range(ORDERS_PER_CUSTOMER):
+            order = db.Order(customer=customer, state='DELIVERED', total=Decimal(j))
+            db.OrderItem(order=order, product=products[(i + j) % len(products)], quantity=j + 1)
+    for i in range(scaled(MEASUREMENTS, scale)):
+        db.Measurement(label='M%d' % i, **dict(('value%d' % k, float(i + k)) for k in range(MEASUREMENT_COLUMNS)))
+
+@benchmark(operations=CUSTOMERS)
+def pk_lookup(db, scale):
+    with db_session: ids = select(c.id for c in db.Customer)[:]
+    def run():
+        with db_session:
+            for id in ids: db.Customer[id].name
+    return run
+
+@benchmark(operations=MEASUREMENTS)
+def wide_select(db, scale):
+    def run():
+        with db_session:
+            select(m for m in db.Measurement)[:]
+    return run
+
+@benchmark(operations=CUSTOMERS)
+def n_plus_one(db, scale):
+    def run():
+        with db_session:
+            for customer in db.Customer.select():
+                for order in customer.orders: order.total
+    return run
+
+@benchmark(operations=CUSTOMERS)
+def bulk_create(db, scale):
+    count = scaled(CUSTOMERS, scale)
+    def run():
+        with db_session:
+            for i in range(count):
+                db.Customer(email='new%d@example.com' % i, name='New customer %d' % i, country='New')
+    def reset():
+        with db_session:
+            db.Customer.select(lambda c: c.country == 'New').delete(bulk=True)
+    return run, reset
+
+@benchmark(operations=CUSTOMERS * ORDERS_PER_CUSTOMER)
+def bulk_update(db, scale):
+    states = ['SHIPPED', 'DELIVERED']
+    def run():
+        with db_session:
+            state = states[0]
+            for order in db.Order.select():
+                order.state = state
+        states.reverse()
+    return run
+
+@benchmark(operations=CUSTOMERS)
+def bulk_delete(db, scale):
+    count = scaled(CUSTOMERS, scale)
+    def run():
+        with db_session:
+            for customer in db.Customer.select(lambda c: c.country == 'Deleted'):
+                customer.delete()
+    def reset():
+        with db_session:
+            for i in range(count):
+                db.Customer(email='deleted%d@example.com' % i, name='Customer %d' % i, country='Deleted')
+    reset()
+    return run, reset
+
+def make_queries(db):
+    Customer, Order = db.Customer, db.Order
+    return [
+        lambda: select(c for c in Customer if c.country == 'Country 1'),
+        lambda: select((o.customer.name, sum(o.total)) for o in Order if o.state == 'DELIVERED'),
+        lambda: select(c for c in Customer if count(c.orders) > 2).order_by(Customer.name),
+        lambda: select(o for o in Order if o.customer.email.startswith('customer1') and o.total > 1),
+        lambda: Customer.select(lambda c: exists(i for i in c.orders.items if i.quantity > 3)),
+    ]
+
+@benchmark(operations=50, scalable=False)
+def translation_cold(db, scale):
+    queries = make_queries(db)
+    def run():
+        with db_session:
+            for i in range(10):
+                db._translator_cache.clear()
+                db._constructed_sql_cache.clear()
+                for query in queries: query().get_sql()
+    return run
+
+@benchmark(operations=50, scalable=False)
+def translation_warm(db, scale):
+    queries = make_queries(db)
+    def run():
+        with db_session:
+            for i in range(10):
+                for query in queries: query().get_sql()
+    return run
+
+@benchmark(operations=MEASUREMENTS)
+def columns_fetch(db, scale):
+    def run():
+        with db_session:
+            select((m.id, m.value0, m.value1, m.value2) for m in db.Measurement).to_columns()
+    return run
+
+@benchmark(operations=MEASUREMENTS)
+def to_dict(db, scale):
+    def run():
+        with db_session:
+            for m in db.Measurement.select(): m.to_dict()
+    return run
+
+@benchmark(operations=CUSTOMERS)
+def to_json(db, scale):
+    def run():
+        with db_session:
+            serialization.to_json(list(db.Customer.select()))
+    return run
+
+@benchmark(operations=CUSTOMERS)
+def database_to_json(db, scale):
+    with db.set_perms_for(db.Customer, db.Order, db.OrderItem, db.Product):
+        perm('view', group='anybody')
+    include = [ db.Customer.orders, db.Order.items, db.OrderItem.product ]
+    def run():
+        with db_session:
+            db.Customer.select().to_json(include=include, stream=io.StringIO())
+    return run
+
+@benchmark(operations=THREADS * 100, scalable=False)
+def concurrent_sessions(db, scale):
+    with db_session: ids = select(c.id for c in db.Customer)[:]
+    def worker():
+        for i in range(100):
+            with db_session:
+                customer = db.Customer[ids[i % len(ids)]]
+                select(o for o in db.Order if o.customer == customer)[:]
+    def run():
+        threads = [ threading.Thread(target=worker) for i in range(THREADS) ]
+        for thread in threads: thread.start()
+        for thread in threads: thread.join()
+    return run
+
+@benchmark(operations=1, scalable=False)
+def import_time(db, scale):
+    # cold start of a new process which only imports pony.orm, as CLI tools and serverless handlers do
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.dirname(os.path.abspath(pony.__file__))))
+    def run():
+        subprocess.check_call([ sys.executable, '-c', 'import pony.orm' ], env=env)
+    return run
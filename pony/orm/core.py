@@ -1,35 +1,41 @@
 from __future__ import absolute_import, print_function, division
 from pony.py23compat import cmp, unicode, buffer, int_types
 
-import builtins, json, re, sys, types, datetime, logging, itertools, warnings, inspect, ast
+import builtins, json, re, sys, types, datetime, logging, itertools, warnings, inspect, ast, base64
 from operator import attrgetter, itemgetter
 from itertools import chain, starmap, repeat
+from array import array
 from time import time
 from decimal import Decimal
+from uuid import UUID
 from random import shuffle, randint, random
 from threading import Lock, RLock, current_thread, _MainThread
 from contextlib import contextmanager
-from collections import defaultdict
-from hashlib import md5
+from collections import defaultdict, namedtuple
 from inspect import isgeneratorfunction
 from functools import wraps
 
+try: from contextvars import ContextVar
+except ImportError: ContextVar = None  # Python 3.6
+
 import pony
-from pony import options
+from pony import options, converting
+from pony.orm import aio, decompiling
 from pony.orm.decompiling import decompile
 from pony.orm.ormtypes import (
     LongStr, LongUnicode, numeric_types, raw_sql, RawSQL, normalize, Json, TrackedValue, QueryType,
-    Array, IntArray, StrArray, FloatArray
+    Array, IntArray, StrArray, FloatArray, SetType
     )
-from pony.orm.asttranslation import ast2src, create_extractors, TranslationError
+from pony.orm.asttranslation import ast2src, create_extractors, extractors_cache, TranslationError
+from pony.orm.entitycache import EntityCache, LocalEntityCache, QueryResultCache, get_entity_cache
 from pony.orm.dbapiprovider import (
     DBAPIProvider, DBException, Warning, Error, InterfaceError, DatabaseError, DataError,
-    OperationalError, IntegrityError, InternalError, ProgrammingError, NotSupportedError
+    OperationalError, IntegrityError, InternalError, ProgrammingError, NotSupportedError, PoolTimeoutError
     )
 from pony import utils
 from pony.utils import localbase, decorator, cut_traceback, cut_traceback_depth, throw, reraise, truncate_repr, \
-     get_lambda_args, pickle_ast, unpickle_ast, deprecated, import_module, parse_expr, is_ident, tostring, strjoin, \
-     between, concat, coalesce, HashableDict, deref_proxy, deduplicate
+     get_lambda_args, get_codeobject_id, pickle_ast, unpickle_ast, deprecated, import_module, parse_expr, is_ident, \
+     tostring, strjoin, between, concat, coalesce, HashableDict, LRUCache, deref_proxy, deduplicate
 
 __all__ = [
     'pony',
@@ -37,11 +43,12 @@ __all__ = [
     'DBException', 'RowNotFound', 'MultipleRowsFound', 'TooManyRowsFound',
 
     'Warning', 'Error', 'InterfaceError', 'DatabaseError', 'DataError', 'OperationalError',
-    'IntegrityError', 'InternalError', 'ProgrammingError', 'NotSupportedError',
+    'IntegrityError', 'InternalError', 'ProgrammingError', 'NotSupportedError', 'PoolTimeoutError',
 
     'OrmError', 'ERDiagramError', 'DBSchemaError', 'MappingError', 'BindingError',
     'TableDoesNotExist', 'TableIsNotEmpty', 'ConstraintError', 'CacheIndexError',
     'ObjectNotFound', 'MultipleObjectsFoundError', 'TooManyObjectsFoundError', 'OperationWithDeletedObjectError',
+    'OperationWithEvictedObjectError',
     'TransactionError', 'ConnectionClosedError', 'TransactionIntegrityError', 'IsolationError',
     'CommitException', 'RollbackException', 'UnrepeatableReadError', 'OptimisticCheckError',
     'UnresolvableCyclicDependency', 'UnexpectedError', 'DatabaseSessionIsOver',
@@ -53,9 +60,12 @@ __all__ = [
     'PrimaryKey', 'Required', 'Optional', 'Set', 'Discriminator',
     'composite_key', 'composite_index',
     'flush', 'commit', 'rollback', 'db_session', 'with_transaction', 'make_proxy',
+    'flush_async', 'commit_async', 'rollback_async', 'run_async',
 
     'LongStr', 'LongUnicode', 'Json', 'IntArray', 'StrArray', 'FloatArray',
 
+    'EntityCache', 'LocalEntityCache',
+
     'select', 'left_join', 'get', 'exists', 'delete',
 
     'count', 'sum', 'min', 'max', 'avg', 'group_concat', 'distinct',
@@ -116,8 +126,8 @@ def args2str(args):
     elif isinstance(args, dict):
         return '{%s}' % ', '.join('%s:%s' % (repr(key), repr(val)) for key, val in sorted(args.items()))
 
-adapted_sql_cache = {}
-string2ast_cache = {}
+adapted_sql_cache = LRUCache(options.ADAPTED_SQL_CACHE_SIZE)
+string2ast_cache = LRUCache(options.STRING2AST_CACHE_SIZE)
 
 class OrmError(Exception): pass
 
@@ -153,6 +163,7 @@ class ObjectNotFound(OrmError):
 class MultipleObjectsFoundError(OrmError): pass
 class TooManyObjectsFoundError(OrmError): pass
 class OperationWithDeletedObjectError(OrmError): pass
+class OperationWithEvictedObjectError(OrmError): pass
 class TransactionError(OrmError): pass
 class ConnectionClosedError(TransactionError): pass
 
@@ -307,6 +318,79 @@ class PrefetchContext(object):
         return result
 
 
+class PrefetchPlanner(object):
+    # Counts attributes which are loaded one by one for objects returned by the same query
+    # (identified by code_key). When the pattern repeats in `threshold` different db_sessions,
+    # the attribute is prefetched by that query automatically (if auto_prefetch is set)
+    def __init__(planner, threshold=3, auto_prefetch=True):
+        if not isinstance(threshold, int_types) or threshold < 1:
+            throw(ValueError, 'threshold must be positive integer. Got: %r' % threshold)
+        planner.threshold = threshold
+        planner.auto_prefetch = auto_prefetch
+        planner.lock = Lock()
+        planner.stats = {}  # (code_key, attr) -> [session_count, load_count]
+        planner.queries = {}
+        planner.prefetch_attrs = {}
+        planner.reference_attrs = {}
+    def plan(planner, query):
+        if not planner.auto_prefetch: return query
+        attrs = planner.prefetch_attrs.get(query._key['code_key'])
+        if not attrs: return query
+        return query.prefetch(*attrs)
+    def register_objects(planner, cache, query, items):
+        code_key = query._key['code_key']
+        if code_key not in planner.queries:
+            entry = extractors_cache.get(code_key)
+            src = ast2src(entry[0]) if entry is not None else str(code_key)
+            origin = query._vars.get((0, '.0', code_key))
+            if isinstance(origin, EntityMeta): src = src.replace(' in .0', ' in ' + origin.__name__, 1)
+            planner.queries[code_key] = src
+        object_sites = cache.object_sites
+        seed_origins = cache.seed_origins
+        for obj in query._get_objects(items):
+            if obj in object_sites: continue
+            object_sites[obj] = code_key
+            entity = obj.__class__
+            reference_attrs = planner.reference_attrs.get(entity)
+            if reference_attrs is None:
+                reference_attrs = planner.reference_attrs[entity] = tuple(
+                    attr for attr in entity._attrs_ if attr.is_relation and not attr.is_collection and attr.columns)
+            vals = obj._vals_
+            for attr in reference_attrs:
+                val = vals.get(attr)
+                if val is not None and val not in seed_origins and val in cache.seeds[val._pk_attrs_]:
+                    seed_origins[val] = code_key, attr
+    def register_load(planner, cache, obj, attr):
+        if attr is None:  # loading of seed object
+            origin = cache.seed_origins.get(obj)
+            if origin is None: return
+            code_key, attr = origin
+        else:
+            code_key = cache.object_sites.get(obj)
+            if code_key is None: return
+        key = code_key, attr
+        first_load = key not in cache.nplus1_keys
+        if first_load: cache.nplus1_keys.add(key)
+        with planner.lock:
+            stat = planner.stats.get(key)
+            if stat is None: stat = planner.stats[key] = [ 0, 0 ]
+            stat[1] += 1
+            if not first_load: return
+            stat[0] += 1
+            # reverse side of one-to-one relationship cannot be prefetched by the query
+            if stat[0] == planner.threshold and (attr.is_collection or attr.columns):
+                planner.prefetch_attrs[code_key] = planner.prefetch_attrs.get(code_key, ()) + (attr,)
+    def report(planner):
+        with planner.lock:
+            stats = [ (key, tuple(stat)) for key, stat in planner.stats.items() ]
+        result = []
+        for (code_key, attr), (session_count, load_count) in stats:
+            result.append(dict(query=planner.queries.get(code_key), attr=attr, sessions=session_count,
+                               loads=load_count, prefetched=attr in planner.prefetch_attrs.get(code_key, ())))
+        result.sort(key=lambda d: (-d['loads'], -d['sessions'], repr(d['attr'])))
+        return result
+
+
 class Local(localbase):
     def __init__(local):
         local.debug = False
@@ -404,14 +488,55 @@ def rollback():
     finally:
         del exceptions
 
+class AsyncSession(object):
+    def __init__(session, db_session, worker):
+        session.db_session = db_session
+        session.worker = worker
+        session.counter = 0
+        session.token = None
+
+current_async_session = ContextVar('pony_async_session', default=None) if ContextVar is not None else None
+
+async def _enter_async_session(db_session):
+    if current_async_session is None: throw(NotImplementedError, 'async db_session requires Python 3.7 or newer')
+    session = current_async_session.get()
+    if session is None:
+        session = AsyncSession(db_session, await aio.acquire_worker())
+        session.token = current_async_session.set(session)
+    session.counter += 1
+    return session
+
+def _exit_async_session(session):
+    session.counter -= 1
+    if session.counter: return
+    current_async_session.reset(session.token)
+    aio.release_worker(session.worker)
+
+# Loaded attributes of objects fetched inside async db_session can be read from the event loop thread,
+# but lazy attributes and collections should be loaded in the worker thread of the session via run_async()
+async def run_async(func, *args, **kwargs):
+    session = current_async_session.get() if current_async_session is not None else None
+    if session is None: throw(TransactionError, 'async db_session is required when working with the database asynchronously')
+    return await session.worker.run(func, *args, **kwargs)
+
+def flush_async():
+    return run_async(flush)
+
+def commit_async():
+    return run_async(commit)
+
+def rollback_async():
+    return run_async(rollback)
+
 select_re = re.compile(r'\s*select\b', re.IGNORECASE)
 
 class DBSessionContextManager(object):
     __slots__ = 'retry', 'retry_exceptions', 'allowed_exceptions', \
-                'immediate', 'ddl', 'serializable', 'strict', 'optimistic', \
+                'immediate', 'ddl', 'serializable', 'strict', 'optimistic', 'readonly', \
                 'sql_debug', 'show_values'
     def __init__(db_session, retry=0, immediate=False, ddl=False, serializable=False, strict=False, optimistic=True,
-                 retry_exceptions=(TransactionError,), allowed_exceptions=(), sql_debug=None, show_values=None):
+                 retry_exceptions=(TransactionError,), allowed_exceptions=(), sql_debug=None, show_values=None,
+                 readonly=False):
         if retry != 0:
             if type(retry) is not int: throw(TypeError,
                 "'retry' parameter of db_session must be of integer type. Got: %s" % type(retry))
@@ -423,7 +548,11 @@ class DBSessionContextManager(object):
                 if e in retry_exceptions: throw(TypeError,
                     'The same exception %s cannot be specified in both '
                     'allowed and retry exception lists simultaneously' % e.__name__)
+        if readonly and (immediate or ddl or serializable or not optimistic): throw(TypeError,
+            "'readonly' parameter of db_session cannot be used together with "
+            "'immediate', 'ddl', 'serializable' or 'optimistic=False' parameters")
         db_session.retry = retry
+        db_session.readonly = readonly
         db_session.ddl = ddl
         db_session.serializable = serializable
         db_session.immediate = immediate or ddl or serializable or not optimistic
@@ -448,6 +577,18 @@ class DBSessionContextManager(object):
         if db_session.retry != 0: throw(TypeError,
             "@db_session can accept 'retry' parameter only when used as decorator and not as context manager")
         db_session._enter()
+    async def __aenter__(db_session):
+        if db_session.retry != 0: throw(TypeError,
+            "@db_session can accept 'retry' parameter only when used as decorator and not as context manager")
+        session = await _enter_async_session(db_session)
+        try: await session.worker.run(db_session._enter)
+        except:
+            _exit_async_session(session)
+            raise
+    async def __aexit__(db_session, exc_type=None, exc=None, tb=None):
+        session = current_async_session.get()
+        try: await session.worker.run(db_session.__exit__, exc_type, exc, tb)
+        finally: _exit_async_session(session)
     def _enter(db_session):
         if local.db_session is None:
             assert not local.db_context_counter
@@ -681,6 +822,9 @@ sql_debugging = SQLDebuggingContextManager()
 
 
 def throw_db_session_is_over(action, obj, attr=None):
+    if obj._status_ == 'evicted':
+        msg = 'Cannot %s %s%s: the object was evicted from the session cache by stream(evict=True)'
+        throw(OperationWithEvictedObjectError, msg % (action, safe_repr(obj), '.%s' % attr.name if attr else ''))
     msg = 'Cannot %s %s%s: the database session is over'
     throw(DatabaseSessionIsOver, msg % (action, safe_repr(obj), '.%s' % attr.name if attr else ''))
 
@@ -727,6 +871,10 @@ class OnConnectDecorator(object):
 
 db_id_counter = itertools.count(1)
 
+def _run_in_db_session(func, args, kwargs):
+    with db_session:
+        return func(*args, **kwargs)
+
 
 class Database(object):
     def __deepcopy__(self, memo):
@@ -736,11 +884,12 @@ class Database(object):
         self.id = next(db_id_counter)
         # argument 'self' cannot be named 'database', because 'database' can be in kwargs
         self.priority = 0
-        self._insert_cache = {}
+        self._insert_cache = LRUCache(options.INSERT_SQL_CACHE_SIZE)
 
         # ER-diagram related stuff:
-        self._translator_cache = {}
-        self._constructed_sql_cache = {}
+        self._translator_cache = LRUCache(options.TRANSLATOR_CACHE_SIZE)
+        self._constructed_sql_cache = LRUCache(options.CONSTRUCTED_SQL_CACHE_SIZE)
+        self._result_cache = QueryResultCache(options.QUERY_RESULT_CACHE_SIZE)
         self.entities = {}
         self.schema = None
         self.Entity = type.__new__(EntityMeta, 'Entity', (Entity,), {})
@@ -753,6 +902,15 @@ class Database(object):
 
         self.on_connect = OnConnectDecorator(self, None)
         self._on_connect_funcs = []
+        self._hooks = []
+        self._prefetch_planner = None
+        self._replicas = []
+        self._replica_connections = {}
+        self._replica_lock = Lock()
+        self._replica_counter = itertools.count()
+        self._last_writes = LRUCache(options.READ_YOUR_WRITES_CACHE_SIZE)
+        self._executor = None
+        self._executor_lock = Lock()
         self.provider = self.provider_name = None
         if args or kwargs: self._bind(*args, **kwargs)
     def call_on_connect(database, con):
@@ -783,14 +941,122 @@ class Database(object):
             self.provider_name = provider
             provider_module = import_module('pony.orm.dbproviders.' + provider)
             provider_cls = provider_module.provider_cls
+        replicas = kwargs.pop('replicas', None) or ()
+        balancing = kwargs.pop('replica_balancing', 'round_robin')
+        if balancing not in ('round_robin', 'least_connections'): throw(ValueError,
+            "replica_balancing must be 'round_robin' or 'least_connections'. Got: %r" % balancing)
+        routing = kwargs.pop('replica_routing', 'auto')
+        if routing not in ('auto', 'readonly'): throw(ValueError,
+            "replica_routing must be 'auto' or 'readonly'. Got: %r" % routing)
+        read_your_writes = kwargs.pop('read_your_writes', None)
+        if read_your_writes is not None and (not isinstance(read_your_writes, (int, float)) or read_your_writes < 0):
+            throw(ValueError, 'read_your_writes must be non-negative number of seconds. Got: %r' % read_your_writes)
         kwargs['pony_call_on_connect'] = self.call_on_connect
         self.provider = provider_cls(self, *args, **kwargs)
+        if replicas:
+            # connection parameters which are not specified for replica are the same as for the primary.
+            # Positional parameters of the primary are converted to keyword parameters, so replica can
+            # override them. Variadic ones (such as DSN string) are passed as is, followed by replica parameters
+            bound = inspect.signature(provider_cls.__init__).bind_partial(None, self, *args)
+            primary_args = ()
+            primary_kwargs = dict(kwargs)
+            for name, value in list(bound.arguments.items())[2:]:
+                if bound.signature.parameters[name].kind is inspect.Parameter.VAR_POSITIONAL: primary_args = value
+                else: primary_kwargs[name] = value
+        for replica_kwargs in replicas:
+            if not isinstance(replica_kwargs, dict): throw(TypeError,
+                'Each replica should be specified as dict of connection parameters. Got: %r' % replica_kwargs)
+            replica = provider_cls(self, *primary_args, **dict(primary_kwargs, **replica_kwargs))
+            self._replicas.append(replica)
+            self._replica_connections[replica] = 0
+        self._replica_balancing = balancing
+        self._replica_routing = routing
+        self._read_your_writes = read_your_writes
+    def _get_replica(database, cache):
+        replicas = database._replicas
+        if not replicas or cache.immediate or cache.modified: return None
+        db_session = cache.db_session
+        readonly = db_session is not None and db_session.readonly
+        if not readonly and database._replica_routing != 'auto': return None
+        if database._read_your_writes is not None:
+            user = get_current_user()
+            if user is not None:
+                last_write = database._last_writes.get(user)
+                if last_write is not None and time() - last_write < database._read_your_writes: return None
+        with database._replica_lock:
+            if database._replica_balancing == 'round_robin':
+                replica = replicas[next(database._replica_counter) % len(replicas)]
+            else: replica = min(replicas, key=database._replica_connections.__getitem__)
+            database._replica_connections[replica] += 1
+        return replica
+    def _release_replica(database, replica):
+        with database._replica_lock: database._replica_connections[replica] -= 1
+    def _register_write(database):
+        if database._read_your_writes is None: return
+        user = get_current_user()
+        if user is not None: database._last_writes[user] = time()
+    @property
+    def replica_stats(database):
+        with database._replica_lock:
+            return [ dict(provider=replica, connections=database._replica_connections[replica])
+                     for replica in database._replicas ]
+    def _get_executor(database):
+        # Worker threads are reused, so each of them keeps its own connection in the thread-local pool
+        with database._executor_lock:
+            if database._executor is None:
+                if database.provider is None: throw(MappingError, 'Database object is not bound with a provider yet')
+                max_workers = getattr(database.provider.pool, 'max_size', None) or options.EXECUTOR_MAX_WORKERS
+                from concurrent.futures import ThreadPoolExecutor  # imported lazily to speed up `import pony.orm`
+                database._executor = ThreadPoolExecutor(max_workers, thread_name_prefix='pony-db%d' % database.id)
+            return database._executor
+    @cut_traceback
+    def submit(database, func, *args, **kwargs):
+        return database._get_executor().submit(_run_in_db_session, func, args, kwargs)
+    @cut_traceback
+    def run_in_executor(database, func, *args, **kwargs):
+        import asyncio
+        return asyncio.wrap_future(database.submit(func, *args, **kwargs))
+    @cut_traceback
+    def compile(database, func):
+        return CompiledQuery(database, func)
+    prepared_query = compile
+    @cut_traceback
+    def shutdown_executor(database, wait=True):
+        with database._executor_lock:
+            executor = database._executor
+            database._executor = None
+        if executor is not None: executor.shutdown(wait)
     @property
     def last_sql(database):
         return database._dblocal.last_sql
     @property
     def local_stats(database):
         return database._dblocal.stats
+    @cut_traceback
+    def enable_prefetch_planner(database, threshold=3, auto_prefetch=True):
+        database._prefetch_planner = PrefetchPlanner(threshold, auto_prefetch)
+    @cut_traceback
+    def disable_prefetch_planner(database):
+        database._prefetch_planner = None
+    @cut_traceback
+    def nplus1_report(database):
+        planner = database._prefetch_planner
+        return planner.report() if planner is not None else []
+    @cut_traceback
+    def add_hook(database, func):
+        if not callable(func): throw(TypeError, 'Hook should be callable. Got: %r' % func)
+        database._hooks = database._hooks + [ func ]  # copy on write, hooks can be added while queries are executed
+        return func
+    @cut_traceback
+    def remove_hook(database, func):
+        database._hooks = [ hook for hook in database._hooks if hook != func ]
+    def _fire_hooks(database, phase, start_time, sql=None, arguments=None, row_count=None, entity=None, cached=False):
+        duration = time() - start_time
+        if arguments is None: arguments_count = 0
+        elif isinstance(arguments, (list, tuple, dict)): arguments_count = len(arguments)
+        else: arguments_count = None
+        event = QueryEvent(phase, database, sql, arguments_count, row_count, duration, entity, cached)
+        for hook in database._hooks: hook(event)
     def _update_local_stat(database, sql, query_start_time):
         dblocal = database._dblocal
         dblocal.last_sql = sql
@@ -809,6 +1075,11 @@ class Database(object):
             total_stat.query_executed(duration)
         else:
             stats[None] = QueryStat(None, duration)
+    def _update_cache_stat(database, sql):
+        stats = database._dblocal.stats
+        stat = stats.get(sql)
+        if stat is not None: stat.cache_count += 1
+        else: stats[sql] = QueryStat(sql)
     def merge_local_stats(database):
         setdefault = database._global_stats.setdefault
         with database._global_stats_lock:
@@ -821,6 +1092,22 @@ class Database(object):
         with database._global_stats_lock:
             return {sql: stat.copy() for sql, stat in database._global_stats.items()}
     @property
+    def pool_stats(database):
+        provider = database.provider
+        if provider is None: return None
+        return getattr(provider.pool, 'stats', None)
+    @property
+    def cache_stats(database):
+        return dict(translator=database._translator_cache.stats,
+                    constructed_sql=database._constructed_sql_cache.stats,
+                    insert=database._insert_cache.stats,
+                    query_results=database._result_cache.stats,
+                    # the following caches are shared between all Database instances
+                    decompiler=decompiling.ast_cache.stats,
+                    adapted_sql=adapted_sql_cache.stats,
+                    string2ast=string2ast_cache.stats,
+                    extractors=extractors_cache.stats)
+    @property
     def global_stats_lock(database):
         deprecated(3, "global_stats_lock is deprecated, just use global_stats property without any locking")
         return database._global_stats_lock
@@ -842,13 +1129,18 @@ class Database(object):
         cache = local.db2cache.get(database)
         if cache is not None: cache.rollback()
         provider.disconnect()
+        for replica in database._replicas: replica.disconnect()
     def _get_cache(database):
         if database.provider is None: throw(MappingError, 'Database object is not bound with a provider yet')
         cache = local.db2cache.get(database)
         if cache is not None: return cache
         if not local.db_context_counter and not (
                 pony.MODE == 'INTERACTIVE' and current_thread().__class__ is _MainThread
-            ): throw(TransactionError, 'db_session is required when working with the database')
+            ):
+            if current_async_session is not None and current_async_session.get() is not None: throw(TransactionError,
+                'Database cannot be accessed directly from async code. Lazy attributes and collections of objects '
+                'should be loaded inside async db_session with run_async() or prefetch()')
+            throw(TransactionError, 'db_session is required when working with the database')
         cache = local.db2cache[database] = SessionCache(database)
         return cache
     @cut_traceback
@@ -879,6 +1171,8 @@ class Database(object):
             locals = sys._getframe(frame_depth).f_locals
         adapted_sql, code = adapt_sql(sql, provider.paramstyle)
         arguments = eval(code, globals, locals)
+        if start_transaction and not select_re.match(sql):
+            database._get_cache().modified_tables.add(None)  # any table can be modified by raw SQL
         return database._exec_sql(adapted_sql, arguments, False, start_transaction)
     @cut_traceback
     def select(database, sql, globals=None, locals=None, frame_depth=0):
@@ -925,6 +1219,7 @@ class Database(object):
             database._insert_cache[query_key] = cached_sql
         else: sql, adapter = cached_sql
         arguments = adapter(list(kwargs.values()))  # order of values same as order of keys
+        database._get_cache().modified_tables.add(table_name)
         if returning is not None:
             return database._exec_sql(sql, arguments, returning_id=True, start_transaction=True)
         cursor = database._exec_sql(sql, arguments, start_transaction=True)
@@ -932,28 +1227,47 @@ class Database(object):
     def _ast2sql(database, sql_ast):
         sql, adapter = database.provider.ast2sql(sql_ast)
         return sql, adapter
-    def _exec_sql(database, sql, arguments=None, returning_id=False, start_transaction=False):
+    def _exec_sql(database, sql, arguments=None, returning_id=False, start_transaction=False, stream_batch_size=None):
         cache = database._get_cache()
         if start_transaction: cache.immediate = True
         connection = cache.prepare_connection_for_query_execution()
-        cursor = connection.cursor()
+        provider = cache.provider
+        if stream_batch_size: cursor = provider.get_streaming_cursor(connection, stream_batch_size)
+        else: cursor = connection.cursor()
+        if cache.read_versions is None: cache.read_versions = database._result_cache.get_versions_snapshot()
         if local.debug: log_sql(sql, arguments)
-        provider = database.provider
         t = time()
         try: new_id = provider.execute(cursor, sql, arguments, returning_id)
         except Exception as e:
             connection = cache.reconnect(e)
-            cursor = connection.cursor()
+            provider = cache.provider
+            if stream_batch_size: cursor = provider.get_streaming_cursor(connection, stream_batch_size)
+            else: cursor = connection.cursor()
             if local.debug: log_sql(sql, arguments)
             t = time()
             new_id = provider.execute(cursor, sql, arguments, returning_id)
         if cache.immediate:
             cache.in_transaction = True
         database._update_local_stat(sql, t)
+        if database._hooks: database._fire_hooks('execute', t, sql, arguments, cursor.rowcount)
         if not returning_id: return cursor
         return new_id
+    def _exec_copy(database, table_name, columns, converters, rows):
+        cache = database._get_cache()
+        cache.immediate = True
+        connection = cache.prepare_connection_for_query_execution()
+        provider = cache.provider
+        cursor = connection.cursor()
+        sql = provider.get_copy_sql(table_name, columns)
+        if local.debug: log_sql(sql)
+        t = time()
+        provider.copy_from(cursor, sql, converters, rows)
+        cache.in_transaction = True
+        database._update_local_stat(sql, t)
+        if database._hooks: database._fire_hooks('execute', t, sql, None, cursor.rowcount)
+        return cursor
     @cut_traceback
-    def generate_mapping(database, filename=None, check_tables=True, create_tables=False):
+    def generate_mapping(database, filename=None, check_tables=True, create_tables=False, schema_fingerprint=False):
         provider = database.provider
         if provider is None: throw(MappingError, 'Database object is not bound with a provider yet')
         if database.schema: throw(BindingError, 'Mapping was already generated')
@@ -1134,8 +1448,8 @@ class Database(object):
                         table.add_index(attr.index, columns, is_unique=attr.is_unique)
             entity._initialize_bits_()
 
-        if create_tables: database.create_tables(check_tables)
-        elif check_tables: database.check_tables()
+        if create_tables: database.create_tables(check_tables, schema_fingerprint)
+        elif check_tables: database.check_tables(schema_fingerprint)
     @cut_traceback
     @db_session(ddl=True)
     def drop_table(database, table_name, if_exists=False, with_all_data=False):
@@ -1194,21 +1508,32 @@ class Database(object):
         for table_name in existed_tables:
             if local.debug: log_orm('DROPPING TABLE %s' % provider.format_table_name(table_name))
             provider.drop_table(connection, table_name)
+        if existed_tables:
+            schema = database.schema or provider.dbschema_cls(provider)
+            schema.clear_fingerprint(provider, connection)
     @cut_traceback
     @db_session(ddl=True)
-    def create_tables(database, check_tables=False):
+    def create_tables(database, check_tables=False, schema_fingerprint=False):
         cache = database._get_cache()
-        if database.schema is None: throw(MappingError, 'No mapping was generated for the database')
+        schema, provider = database.schema, database.provider
+        if schema is None: throw(MappingError, 'No mapping was generated for the database')
         connection = cache.prepare_connection_for_query_execution()
-        database.schema.create_tables(database.provider, connection)
-        if check_tables: database.schema.check_tables(database.provider, connection)
+        fingerprint_matches = schema_fingerprint and schema.check_fingerprint(provider, connection)
+        schema.create_tables(provider, connection)
+        if fingerprint_matches: return  # a matching fingerprint skips only the verification of tables
+        if check_tables: schema.check_tables(provider, connection)
+        if schema_fingerprint: schema.store_fingerprint(provider, connection)
     @cut_traceback
     @db_session()
-    def check_tables(database):
+    def check_tables(database, schema_fingerprint=False):
         cache = database._get_cache()
-        if database.schema is None: throw(MappingError, 'No mapping was generated for the database')
+        schema, provider = database.schema, database.provider
+        if schema is None: throw(MappingError, 'No mapping was generated for the database')
+        if schema_fingerprint: cache.immediate = True
         connection = cache.prepare_connection_for_query_execution()
-        database.schema.check_tables(database.provider, connection)
+        if schema_fingerprint and schema.check_fingerprint(provider, connection): return
+        schema.check_tables(provider, connection)
+        if schema_fingerprint: schema.store_fingerprint(provider, connection)
     @contextmanager
     def set_perms_for(database, *entities):
         if not entities: throw(TypeError, 'You should specify at least one positional argument')
@@ -1253,11 +1578,14 @@ class Database(object):
             result.append(d)
         return result
     def _get_schema_json(database):
+        from hashlib import md5
         schema_json = json.dumps(database._get_schema_dict(), default=basic_converter, sort_keys=True)
         schema_hash = md5(schema_json.encode('utf-8')).hexdigest()
         return schema_json, schema_hash
     @cut_traceback
-    def to_json(database, data, include=(), exclude=(), converter=None, with_schema=True, schema_hash=None):
+    def to_json(database, data, include=(), exclude=(), converter=None, with_schema=True, schema_hash=None,
+                stream=None):
+        from pony.orm.serialization import load_objects, iter_objects_json
         for attrs, param_name in ((include, 'include'), (exclude, 'exclude')):
             for attr in attrs:
                 if not isinstance(attr, Attribute): throw(TypeError,
@@ -1290,58 +1618,73 @@ class Database(object):
 
         data_json = json.dumps(data, default=obj_converter)
 
-        objects = {}
-        if caches:
-            cache = caches.pop()
-            if cache.database is not database:
-                throw(TransactionError, 'An object does not belong to specified database')
-            object_list = list(object_set)
-            objects = {}
-            for obj in object_list:
-                if obj in cache.seeds[obj._pk_attrs_]: obj._load_()
-                entity = obj.__class__
-                if not can_view(user, obj):
-                    user_has_no_rights_to_see(obj)
-                d = objects.setdefault(entity.__name__, {})
-                for val in obj._get_raw_pkval_(): d = d.setdefault(val, {})
-                assert not d, d
-                for attr in obj._attrs_:
+        attrs_cache = {}
+        def get_attrs(entity):
+            attrs = attrs_cache.get(entity)
+            if attrs is None:
+                attrs = attrs_cache[entity] = []
+                for attr in entity._attrs_:
                     if attr in exclude: continue
                     if attr in include: pass
                         # if attr not in entity_perms.can_read: user_has_no_rights_to_see(obj, attr)
                     elif attr.is_collection: continue
                     elif attr.lazy: continue
                     # elif attr not in entity_perms.can_read: continue
+                    if attr.is_collection and not isinstance(attr, Set): throw(NotImplementedError)
+                    attrs.append(attr)
+            return attrs
+        def get_collections(entity):
+            return [ attr for attr in get_attrs(entity) if attr.is_collection ]
 
-                    if attr.is_collection:
-                        if not isinstance(attr, Set): throw(NotImplementedError)
-                        value = []
-                        for item in attr.__get__(obj):
-                            if item not in object_set:
-                                object_set.add(item)
-                                object_list.append(item)
-                            pkval = item._get_raw_pkval_()
-                            value.append(pkval[0] if len(pkval) == 1 else pkval)
-                        value.sort()
-                    else:
-                        value = attr.__get__(obj)
-                        if value is not None and attr.is_relation:
-                            if attr in include and value not in object_set:
-                                object_set.add(value)
-                                object_list.append(value)
-                            pkval = value._get_raw_pkval_()
-                            value = pkval[0] if len(pkval) == 1 else pkval
-
-                    d[attr.name] = value
-        objects_json = json.dumps(objects, default=converter)
-        if not with_schema:
-            return '{"data": %s, "objects": %s}' % (data_json, objects_json)
-        schema_json, new_schema_hash = database._get_schema_json()
-        if schema_hash is not None and schema_hash == new_schema_hash:
-            return '{"data": %s, "objects": %s, "schema_hash": "%s"}' \
-                   % (data_json, objects_json, new_schema_hash)
-        return '{"data": %s, "objects": %s, "schema": %s, "schema_hash": "%s"}' \
-               % (data_json, objects_json, schema_json, new_schema_hash)
+        if caches:
+            cache = caches.pop()
+            if cache.database is not database:
+                throw(TransactionError, 'An object does not belong to specified database')
+            # objects are loaded in waves: each wave loads seeds and collections of newly found objects in batches
+            new_objects = set(object_set)
+            while new_objects:
+                load_objects(new_objects, get_collections)
+                related = set()
+                for obj in new_objects:
+                    if not can_view(user, obj):
+                        user_has_no_rights_to_see(obj)
+                    for attr in get_attrs(obj.__class__):
+                        if attr.is_collection: related.update(attr.__get__(obj))
+                        elif attr.is_relation and attr in include:
+                            value = attr.__get__(obj)
+                            if value is not None: related.add(value)
+                new_objects = related - object_set
+                object_set |= new_objects
+
+        def get_dict(obj):
+            d = {}
+            for attr in get_attrs(obj.__class__):
+                if attr.is_collection:
+                    value = []
+                    for item in attr.__get__(obj):
+                        pkval = item._get_raw_pkval_()
+                        value.append(pkval[0] if len(pkval) == 1 else pkval)
+                    value.sort()
+                else:
+                    value = attr.__get__(obj)
+                    if value is not None and attr.is_relation:
+                        pkval = value._get_raw_pkval_()
+                        value = pkval[0] if len(pkval) == 1 else pkval
+                d[attr.name] = value
+            return d
+
+        def iter_json():
+            yield '{"data": %s, "objects": ' % data_json
+            yield from iter_objects_json(object_set, get_dict, converter)
+            if with_schema:
+                schema_json, new_schema_hash = database._get_schema_json()
+                if schema_hash is None or schema_hash != new_schema_hash:
+                    yield ', "schema": %s' % schema_json
+                yield ', "schema_hash": "%s"' % new_schema_hash
+            yield '}'
+
+        if stream is None: return ''.join(iter_json())
+        for chunk in iter_json(): stream.write(chunk)
     @cut_traceback
     @db_session
     def from_json(database, changes, observer=None):
@@ -1687,6 +2030,8 @@ class DbLocal(localbase):
         dblocal.stats = {None: QueryStat(None)}
         dblocal.last_sql = None
 
+QueryEvent = namedtuple('QueryEvent', 'phase database sql arguments_count row_count duration entity cached')
+
 class QueryStat(object):
     def __init__(stat, sql, duration=None):
         if duration is not None:
@@ -1744,12 +2089,20 @@ class SessionCache(object):
         cache.modified_collections = defaultdict(set)
         cache.objects_to_save = []
         cache.saved_objects = []
+        cache.invalidated_cache_keys = []
+        cache.modified_tables = set()
+        cache.read_versions = None  # table versions taken before the first query since the last commit
         cache.query_results = {}
         cache.dbvals_deduplication_cache = defaultdict(dict)
+        cache.object_sites = {}
+        cache.seed_origins = {}
+        cache.nplus1_keys = set()
         cache.modified = False
         cache.db_session = db_session = local.db_session
         cache.immediate = db_session is not None and db_session.immediate
         cache.connection = None
+        cache.provider = database.provider
+        cache.replica = None
         cache.in_transaction = False
         cache.saved_fk_state = None
         cache.perm_cache = defaultdict(lambda : defaultdict(dict))  # user -> perm -> cls_or_attr_or_obj -> bool
@@ -1760,20 +2113,38 @@ class SessionCache(object):
         if cache.in_transaction: throw(ConnectionClosedError,
             'Transaction cannot be continued because database connection failed')
         database = cache.database
-        provider = database.provider
-        connection, is_new_connection = provider.connect()
-        if is_new_connection:
-            database.call_on_connect(connection)
+        replica = cache.replica = database._get_replica(cache)
+        provider = cache.provider = replica or database.provider
         try:
-            provider.set_transaction_mode(connection, cache)  # can set cache.in_transaction
+            connection, is_new_connection = provider.connect(cache)
+            if is_new_connection:
+                database.call_on_connect(connection)
+            try:
+                provider.set_transaction_mode(connection, cache)  # can set cache.in_transaction
+            except:
+                provider.drop(connection, cache)
+                raise
         except:
-            provider.drop(connection, cache)
+            cache._leave_replica()
             raise
-
         cache.connection = connection
         return connection
+    def _leave_replica(cache):
+        replica = cache.replica
+        if replica is None: return
+        cache.replica = None
+        cache.provider = cache.database.provider
+        cache.database._release_replica(replica)
+    def _switch_to_primary(cache):
+        # Session which was started on a replica is pinned to the primary when it needs to write
+        assert not cache.in_transaction
+        connection = cache.connection
+        cache.connection = None
+        provider = cache.provider
+        cache._leave_replica()
+        provider.release(connection, cache)
     def reconnect(cache, exc):
-        provider = cache.database.provider
+        provider = cache.provider
         if exc is not None:
             exc = getattr(exc, 'original_exc', exc)
             if not provider.should_reconnect(exc): reraise(*sys.exc_info())
@@ -1782,6 +2153,7 @@ class SessionCache(object):
             assert connection is not None
             cache.connection = None
             provider.drop(connection, cache)
+            cache._leave_replica()
         else: assert cache.connection is None
         return cache.connect()
     def prepare_connection_for_query_execution(cache):
@@ -1797,9 +2169,12 @@ class SessionCache(object):
             cache.immediate = cache.immediate or db_session.immediate
         else: assert cache.db_session is db_session, (cache.db_session, db_session)
         connection = cache.connection
+        if connection is not None and cache.replica is not None and (cache.immediate or cache.modified):
+            cache._switch_to_primary()
+            connection = None
         if connection is None: connection = cache.connect()
         elif cache.immediate and not cache.in_transaction:
-            provider = cache.database.provider
+            provider = cache.provider
             try: provider.set_transaction_mode(connection, cache)  # can set cache.in_transaction
             except Exception as e: connection = cache.reconnect(e)
         if not cache.noflush_counter and cache.modified: cache.flush()
@@ -1813,11 +2188,19 @@ class SessionCache(object):
         except: transact_reraise(CommitException, [sys.exc_info()])
     def commit(cache):
         assert cache.is_alive
+        database = cache.database
+        if database._hooks: start_time = time()
         try:
             if cache.modified: cache.flush()
             if cache.in_transaction:
                 assert cache.connection is not None
-                cache.database.provider.commit(cache.connection, cache)
+                cache.provider.commit(cache.connection, cache)
+                database._register_write()
+            # table versions are incremented before the invalidation of second-level cache keys,
+            # see _objects_from_rows_()
+            if cache.modified_tables: cache._invalidate_query_results()
+            if cache.invalidated_cache_keys: cache._invalidate_second_level_cache()
+            cache.read_versions = None
             cache.for_update.clear()
             cache.query_results.clear()
             cache.max_id_cache.clear()
@@ -1825,6 +2208,18 @@ class SessionCache(object):
         except:
             cache.rollback()
             raise
+        if database._hooks: database._fire_hooks('commit', start_time)
+    def _invalidate_second_level_cache(cache):
+        # objects could be put into the second-level cache by concurrent
+        # sessions before the transaction was committed, so invalidate them again
+        for entity_cache, key in cache.invalidated_cache_keys:
+            if key is None: entity_cache.clear()
+            else: entity_cache.delete(key)
+        cache.invalidated_cache_keys = []
+    def _invalidate_query_results(cache):
+        modified_tables = cache.modified_tables
+        cache.database._result_cache.invalidate(None if None in modified_tables else modified_tables)
+        cache.modified_tables = set()
     def rollback(cache):
         cache.close(rollback=True)
     def release(cache):
@@ -1835,10 +2230,11 @@ class SessionCache(object):
         database = cache.database
         x = local.db2cache.pop(database); assert x is cache
         cache.is_alive = False
-        provider = database.provider
+        provider = cache.provider
         connection = cache.connection
         if connection is None: return
         cache.connection = None
+        cache._leave_replica()
 
         try:
             if rollback:
@@ -1862,7 +2258,58 @@ class SessionCache(object):
 
             cache.objects = cache.objects_to_save = cache.saved_objects = cache.query_results \
                 = cache.indexes = cache.seeds = cache.for_update = cache.max_id_cache \
-                = cache.modified_collections = cache.collection_statistics = cache.dbvals_deduplication_cache = None
+                = cache.modified_collections = cache.collection_statistics = cache.dbvals_deduplication_cache \
+                = cache.invalidated_cache_keys = cache.modified_tables = cache.object_sites = cache.seed_origins = cache.nplus1_keys = None
+    def _register_load(cache, obj, attr):
+        planner = cache.database._prefetch_planner
+        if planner is not None: planner.register_load(cache, obj, attr)
+    def _evict_objects(cache, objects):
+        # Removes unmodified objects from the identity map in order to keep memory usage flat
+        # during streaming. Objects linked with other objects in memory are kept in the cache,
+        # except objects referenced through many-to-one relationships which were not read yet:
+        # such references are dropped and loaded again on access
+        evicted = False
+        indexes = cache.indexes
+        for obj in objects:
+            if obj._status_ != 'loaded' or obj._wbits_ or obj in cache.for_update: continue
+            if obj._session_cache_ is not cache: continue
+            vals = obj._vals_
+            for attr, val in vals.items():
+                if attr.is_collection:
+                    if val is None: continue
+                    if attr.reverse.is_collection or val.is_fully_loaded or val.added or val.removed: break
+                    reverse = attr.reverse
+                    if any(item._rbits_ is None or item._rbits_ & item._bits_[reverse] for item in val): break
+                    continue
+                if not attr.reverse or val is None: continue
+                if not attr.reverse.is_collection: break
+                setdata = val._vals_.get(attr.reverse)
+                if setdata is not None and setdata.is_fully_loaded: break
+            else:
+                for attr, val in list(vals.items()):
+                    if attr.is_collection:
+                        if val is not None:
+                            for item in val:
+                                item._vals_.pop(attr.reverse, None)
+                                item._dbvals_.pop(attr.reverse, None)
+                        del vals[attr]
+                    elif attr.reverse and val is not None:
+                        setdata = val._vals_.get(attr.reverse)
+                        if setdata is not None: setdata.discard(obj)
+                indexes[obj._pk_attrs_].pop(obj._pkval_, None)
+                for attr in obj._simple_keys_:
+                    val = vals.get(attr)
+                    if val is not None and indexes[attr].get(val) is obj: del indexes[attr][val]
+                for attrs in obj._composite_keys_:
+                    key = tuple(vals.get(attr) for attr in attrs)
+                    if indexes[attrs].get(key) is obj: del indexes[attrs][key]
+                cache.objects.discard(obj)
+                obj._dbvals_ = obj._session_cache_ = None
+                obj._status_ = 'evicted'
+                evicted = True
+        if evicted:
+            cache.query_results.clear()
+            cache.dbvals_deduplication_cache.clear()
     @contextmanager
     def flush_disabled(cache):
         cache.noflush_counter += 1
@@ -1870,6 +2317,15 @@ class SessionCache(object):
         finally: cache.noflush_counter -= 1
     def flush(cache):
         if cache.noflush_counter: return
+        if cache.modified and cache.db_session is not None and cache.db_session.readonly:
+            throw(TransactionError, 'Changes cannot be saved inside of read-only db_session')
+        database = cache.database
+        if not database._hooks or not cache.modified: return cache._flush()
+        start_time = time()
+        row_count = builtins.sum(1 for obj in cache.objects_to_save if obj is not None)
+        cache._flush()
+        database._fire_hooks('flush', start_time, row_count=row_count)
+    def _flush(cache):
         assert cache.is_alive
         assert not cache.saved_objects
         prev_immediate = cache.immediate
@@ -1885,10 +2341,10 @@ class SessionCache(object):
                     cache.query_results.clear()
                     modified_m2m = cache._calc_modified_m2m()
                     for attr, (added, removed) in modified_m2m.items():
+                        cache.modified_tables.add(attr.table)
                         if not removed: continue
                         attr.remove_m2m(removed)
-                    for obj in cache.objects_to_save:
-                        if obj is not None: obj._save_()
+                    cache._save_objects()
                     for attr, (added, removed) in modified_m2m.items():
                         if not added: continue
                         attr.add_m2m(added)
@@ -1905,6 +2361,55 @@ class SessionCache(object):
         finally:
             if not cache.in_transaction:
                 cache.immediate = prev_immediate
+    def _save_objects(cache):
+        # Consecutive objects of the same entity which require the same SQL command
+        # are saved together, other objects are saved one by one in the original order
+        batch = []
+        batch_key = None
+        for obj in list(cache.objects_to_save):
+            if obj is None: continue
+            status = obj._status_
+            if status not in ('created', 'modified', 'marked_to_delete'):
+                continue  # already saved as a principal object of some other object
+            if batch and status != 'marked_to_delete' and obj._has_unsaved_principal_objects_():
+                cache._save_batch(batch_key, batch)
+                batch = []
+            entity = obj.__class__
+            cache.modified_tables.add(entity._table_)
+            key = None
+            if status == 'marked_to_delete':
+                key = 'DELETE', entity
+                item = obj
+            elif obj._has_unsaved_principal_objects_(): pass
+            elif status == 'created':
+                auto_pk = obj._pkval_ is None
+                if entity._batch_insert_supported_(auto_pk):
+                    auto_pk, attrs, values, new_dbvals = obj._prepare_insert_()
+                    key = 'INSERT', entity, auto_pk, attrs
+                    item = obj, values, new_dbvals
+            else:
+                sql, adapter, values, new_dbvals = obj._prepare_update_()
+                if sql is not None:
+                    key = 'UPDATE', entity, sql, adapter
+                    item = obj, values, new_dbvals
+            if key is not None:
+                if batch and key != batch_key:
+                    cache._save_batch(batch_key, batch)
+                    batch = []
+                batch_key = key
+                batch.append(item)
+                continue
+            if batch:
+                cache._save_batch(batch_key, batch)
+                batch = []
+            obj._save_()
+        if batch: cache._save_batch(batch_key, batch)
+    def _save_batch(cache, key, items):
+        command, entity = key[:2]
+        if command == 'INSERT': entity._save_created_many_(key[2], key[3], items)
+        elif command == 'UPDATE': entity._save_updated_many_(key[2], key[3], items)
+        elif command == 'DELETE': entity._save_deleted_many_(items)
+        else: assert False, command  # pragma: no cover
     def call_after_save_hooks(cache):
         saved_objects = cache.saved_objects
         cache.saved_objects = []
@@ -2239,9 +2744,18 @@ class Attribute(object):
                 dbval = None
             else: dbval = attr.py_type._get_by_raw_pkval_(dbvals)
         return dbval
+    def parse_raw_value(attr, row, offsets):
+        # Same as parse_value(), but the value of relationship attribute is returned
+        # as a raw primary key value instead of an object, so the identity map is not touched
+        if not attr.reverse: return attr.validate(row[offsets[0]], None, attr.entity, from_db=True)
+        dbvals = [ row[offset] for offset in offsets ]
+        if None in dbvals: return None
+        raw_pkval = attr.py_type._validate_raw_pkval_(dbvals)
+        return raw_pkval[0] if len(raw_pkval) == 1 else raw_pkval
     def load(attr, obj):
         cache = obj._session_cache_
         if cache is None or not cache.is_alive: throw_db_session_is_over('load attribute', obj, attr)
+        if cache.object_sites: cache._register_load(obj, attr)
         if not attr.columns:
             reverse = attr.reverse
             assert reverse is not None and reverse.columns
@@ -2769,6 +3283,16 @@ class SetData(set):
         setdata.added = setdata.removed = setdata.absent = None
         setdata.count = None
 
+def iter_batches(items, max_batch_size, max_exact_size=16):
+    # The tail which is shorter than max_batch_size is split into batches of power-of-two sizes
+    # until it is small enough, so multi-row statements are constructed and cached for a few sizes only
+    start, count = 0, len(items)
+    while start < count:
+        size = min(count - start, max_batch_size)
+        if max_exact_size < size < max_batch_size: size = 1 << (size.bit_length() - 1)
+        yield items[start:start+size]
+        start += size
+
 def construct_batchload_criteria_list(alias, columns, converters, batch_size, row_value_syntax, start=0, from_seeds=True):
     assert batch_size > 0
     def param(i, j, converter):
@@ -2926,6 +3450,7 @@ class Set(Collection):
             reverse.db_reverse_add(loaded_items, obj)
             return setdata
 
+        if cache.object_sites: cache._register_load(obj, attr)
         counter = cache.collection_statistics.setdefault(attr, 0)
         nplus1_threshold = attr.nplus1_threshold
         prefetching = not attr.lazy and nplus1_threshold is not None and counter >= nplus1_threshold
@@ -3590,6 +4115,8 @@ class SetInstance(object):
         return wrapper.select().limit(limit, offset)
     def page(wrapper, pagenum, pagesize=10):
         return wrapper.select().page(pagenum, pagesize)
+    def page_after(wrapper, key, pagesize=10):
+        return wrapper.select().page_after(key, pagesize)
     def order_by(wrapper, *args):
         return wrapper.select().order_by(*args)
     def sort_by(wrapper, *args):
@@ -3854,6 +4381,11 @@ class EntityMeta(type):
         entity._update_sql_cache_ = {}
         entity._delete_sql_cache_ = {}
 
+        if entity._root_ is entity:
+            entity._second_level_cache_ = get_entity_cache(entity.__dict__.get('_cache_'))
+        elif '_cache_' in entity.__dict__: throw(TypeError,
+            'Cannot redefine %s cache options in %s entity' % (entity._root_.__name__, entity.__name__))
+
         entity._propagation_mixin_ = None
         entity._set_wrapper_subclass_ = None
         entity._multiset_subclass_ = None
@@ -4008,6 +4540,12 @@ class EntityMeta(type):
         try: return entity._find_one_(kwargs)  # can throw MultipleObjectsFoundError
         except ObjectNotFound: return None
     @cut_traceback
+    def get_async(entity, *args, **kwargs):
+        if args:
+            query = entity._query_from_args_(args, kwargs, frame_depth=cut_traceback_depth+1)
+            return run_async(query.get)
+        return run_async(entity.get, **kwargs)
+    @cut_traceback
     def get_for_update(entity, *args, **kwargs):
         nowait = kwargs.pop('nowait', False)
         skip_locked = kwargs.pop('skip_locked', False)
@@ -4147,6 +4685,8 @@ class EntityMeta(type):
                 if reverse and not reverse.is_collection:
                     obj = reverse.__get__(val)
                     break
+        if obj is None and pkval is not None and not for_update and entity._second_level_cache_ is not None:
+            obj = entity._find_in_second_level_cache_(pkval)
         if obj is not None:
             if obj._discriminator_ is not None:
                 if obj._subclasses_:
@@ -4164,6 +4704,30 @@ class EntityMeta(type):
             entity._set_rbits((obj,), avdict)
             return obj, unique
         return None, unique
+    def _find_in_second_level_cache_(entity, pkval):
+        if not entity._pk_is_composite_: pkval = (pkval,)
+        raw_pkval = []
+        for attr, val in zip(entity._pk_attrs_, pkval):
+            if attr.reverse: raw_pkval.extend(val._get_raw_pkval_())
+            else: raw_pkval.append(val)
+        root = entity._root_
+        data = entity._second_level_cache_.get((root.__name__, tuple(raw_pkval)))
+        if data is None: return None
+        return root._parse_second_level_cache_data_(data)
+    def _parse_second_level_cache_data_(entity, data):
+        root = entity._root_
+        row = []
+        attr_offsets = {}
+        for name, values in data.items():
+            attr = root._adict_.get(name) or root._subclass_adict_.get(name)
+            if attr is None: return None
+            attr_offsets[attr] = list(range(len(row), len(row) + len(values)))
+            row.extend(values)
+        real_entity_subclass, pkval, avdict = root._parse_row_(row, attr_offsets)
+        obj = real_entity_subclass._get_from_identity_map_(pkval, 'loaded')
+        if obj._status_ in del_statuses: return None
+        obj._db_set_(avdict)
+        return obj
     def _find_in_db_(entity, avdict, unique=False, for_update=False, nowait=False, skip_locked=False):
         database = entity._database_
         query_attrs = {attr: value is None for attr, value in avdict.items()}
@@ -4288,6 +4852,8 @@ class EntityMeta(type):
         entity._find_sql_cache_[query_key] = cached_sql
         return cached_sql
     def _fetch_objects(entity, cursor, attr_offsets, max_fetch_count=None, for_update=False, used_attrs=()):
+        database = entity._database_
+        if database._hooks: start_time = time()
         if max_fetch_count is None: max_fetch_count = options.MAX_FETCH_COUNT
         if max_fetch_count is not None:
             rows = cursor.fetchmany(max_fetch_count + 1)
@@ -4297,19 +4863,375 @@ class EntityMeta(type):
                 throw(TooManyObjectsFoundError,
                     'Found more then pony.options.MAX_FETCH_COUNT=%d objects' % options.MAX_FETCH_COUNT)
         else: rows = cursor.fetchall()
+        if not database._hooks: return entity._objects_from_rows_(rows, attr_offsets, for_update, used_attrs)
+        sql = database.last_sql
+        database._fire_hooks('fetch', start_time, sql, row_count=len(rows), entity=entity)
+        start_time = time()
+        objects = entity._objects_from_rows_(rows, attr_offsets, for_update, used_attrs)
+        database._fire_hooks('materialize', start_time, sql, row_count=len(rows), entity=entity)
+        return objects
+    def _objects_from_rows_(entity, rows, attr_offsets, for_update=False, used_attrs=()):
         objects = []
         if attr_offsets is None:
             objects = [ entity._get_by_raw_pkval_(row, for_update) for row in rows ]
             entity._load_many_(objects)
         else:
+            entity_cache = entity._second_level_cache_
+            if entity_cache is not None:
+                cache = entity._database_._get_cache()
+                result_cache = entity._database_._result_cache
+                read_versions = cache.read_versions
+                # rows read inside of a transaction may contain uncommitted changes, and rows read
+                # before a concurrent commit of the table may be stale
+                if cache.in_transaction or read_versions is None \
+                        or not result_cache.is_unchanged(read_versions, entity._table_): entity_cache = None
+                else:
+                    root_name = entity._root_.__name__
+                    stored_keys = []
             for row in rows:
                 real_entity_subclass, pkval, avdict = entity._parse_row_(row, attr_offsets)
                 obj = real_entity_subclass._get_from_identity_map_(pkval, 'loaded', for_update)
                 if obj._status_ in del_statuses: continue
                 obj._db_set_(avdict)
                 objects.append(obj)
+                if entity_cache is not None:
+                    data = {attr.name: tuple(row[offset] for offset in offsets)
+                            for attr, offsets in attr_offsets.items()}
+                    key = root_name, obj._get_raw_pkval_()
+                    entity_cache.set(key, data)
+                    stored_keys.append(key)
+            if entity_cache is not None and not result_cache.is_unchanged(read_versions, entity._table_):
+                # a concurrent commit incremented the table version after the check above, but its
+                # invalidation of second-level cache keys could happen before the rows were stored
+                for key in stored_keys: entity_cache.delete(key)
         if used_attrs: entity._set_rbits(objects, used_attrs)
         return objects
+    def _batch_insert_supported_(entity, auto_pk):
+        provider = entity._database_.provider
+        if auto_pk: return provider.multi_row_insert_syntax and provider.insert_returning_syntax
+        return True
+    def _save_created_many_(entity, auto_pk, attrs, items):
+        if len(items) == 1:
+            obj = items[0][0]
+            return obj._save_()
+        provider = entity._database_.provider
+        columns = []
+        converters = []
+        for attr in attrs:
+            columns.extend(attr.columns)
+            converters.extend(attr.converters)
+        if not columns or not provider.multi_row_insert_syntax:
+            if auto_pk:
+                for obj, values, new_dbvals in items: obj._save_()
+                return
+            sql, adapter = entity._get_insert_sql_(attrs, columns, converters, 1)
+            arguments = [ adapter(values) for obj, values, new_dbvals in items ]
+            entity._exec_insert_many_(sql, arguments, items, False)
+            return
+        max_batch_size = provider.max_params_count // len(columns)
+        for batch in iter_batches(items, max_batch_size):
+            sql, adapter = entity._get_insert_sql_(attrs, columns, converters, len(batch), auto_pk)
+            values = []
+            for obj, obj_values, new_dbvals in batch: values.extend(obj_values)
+            entity._exec_insert_many_(sql, adapter(values), batch, auto_pk)
+    def _save_updated_many_(entity, sql, adapter, items):
+        if len(items) == 1:
+            obj = items[0][0]
+            return obj._save_()
+        database = entity._database_
+        cache = database._get_cache()
+        arguments = [ adapter(values) for obj, values, new_dbvals in items ]
+        cursor = database._exec_sql(sql, arguments, start_transaction=True)
+        if cursor.rowcount != -1 and cursor.rowcount < len(items) and cache.db_session.optimistic:
+            throw(OptimisticCheckError, '%d of %d %s objects were updated or deleted outside of current transaction'
+                                        % (len(items) - cursor.rowcount, len(items), entity.__name__))
+        for obj, values, new_dbvals in items:
+            obj._invalidate_second_level_cache_()
+            obj._set_updated_(new_dbvals)
+            obj._finish_save_()
+    def _save_deleted_many_(entity, objects):
+        if len(objects) == 1 or entity._has_self_references_():
+            for obj in objects: obj._save_()
+            return
+        database = entity._database_
+        pk_columns = entity._pk_columns_
+        max_batch_size = database.provider.max_params_count // len(pk_columns)
+        row_value_syntax = database.provider.translator_cls.row_value_syntax
+        for batch in iter_batches(objects, max_batch_size):
+            query_key = len(batch)
+            cached_sql = entity._delete_sql_cache_.get(query_key)
+            if cached_sql is None:
+                criteria_list = construct_batchload_criteria_list(
+                    None, pk_columns, entity._pk_converters_, len(batch), row_value_syntax)
+                from_ast = [ 'FROM', [ None, 'TABLE', entity._table_ ] ]
+                sql_ast = [ 'DELETE', None, from_ast, [ 'WHERE' ] + criteria_list ]
+                cached_sql = entity._delete_sql_cache_[query_key] = database._ast2sql(sql_ast)
+            sql, adapter = cached_sql
+            database._exec_sql(sql, adapter(batch), start_transaction=True)
+            for obj in batch:
+                obj._set_deleted_()
+                obj._finish_save_()
+    def _has_self_references_(entity):
+        root = entity._root_
+        for attr in chain(root._attrs_, root._subclass_attrs_):
+            if attr.columns and attr.reverse and attr.py_type._root_ is root: return True
+        return False
+    @cut_traceback
+    def upsert_many(entity, rows, conflict_keys=None, update=None):
+        # Inserts rows or updates the rows which have the same values of conflict_keys,
+        # without loading objects. Objects already loaded into the db_session are refreshed
+        if entity._database_.schema is None:
+            throw(ERDiagramError, 'Mapping is not generated for entity %r' % entity.__name__)
+        get_attrs = entity._get_attrs_by_names_
+        if conflict_keys is None: conflict_attrs = entity._pk_attrs_
+        else:
+            conflict_attrs = get_attrs(conflict_keys, 'conflict_keys')
+            if conflict_attrs != entity._pk_attrs_ and conflict_attrs not in entity._keys_: throw(TypeError,
+                'conflict_keys should be primary key or unique key of entity %s. Got: %s'
+                % (entity.__name__, ', '.join(attr.name for attr in conflict_attrs)))
+        rows = list(rows)
+        if not rows: return 0
+        for row in rows:
+            if not isinstance(row, dict): throw(TypeError, 'Each row should be a dict. Got: %r' % row)
+        names = sorted(rows[0])
+        attrs = get_attrs(names, 'rows')
+        for attr in conflict_attrs:
+            if attr not in attrs: throw(TypeError, 'Value of conflict key %s is not specified' % attr)
+        if update is None: update_attrs = tuple(attr for attr in attrs if attr not in conflict_attrs)
+        else:
+            update_attrs = get_attrs(update, 'update')
+            for attr in update_attrs:
+                if attr not in attrs: throw(TypeError, 'Value of attribute %s is not specified' % attr)
+                if attr in conflict_attrs: throw(TypeError, 'Conflict key %s cannot be updated' % attr)
+        insert_attrs = entity._get_insert_attrs_(attrs)
+
+        values_list = []
+        vals_list = []
+        for row in rows:
+            if sorted(row) != names: throw(TypeError, 'All rows should have the same set of attributes')
+            vals, values = entity._validate_row_(insert_attrs, [ row[name] for name in names ])
+            vals_list.append(vals)
+            values_list.append(values)
+
+        database = entity._database_
+        provider = database.provider
+        columns = []
+        converters = []
+        for attr in insert_attrs:
+            columns.extend(attr.columns)
+            converters.extend(attr.converters)
+        max_batch_size = max(1, provider.max_params_count // len(columns))
+        for batch in iter_batches(values_list, max_batch_size):
+            sql, adapter = entity._get_upsert_sql_(insert_attrs, columns, converters, conflict_attrs, update_attrs, len(batch))
+            arguments = []
+            for values in batch: arguments.extend(values)
+            database._exec_sql(sql, adapter(arguments), start_transaction=True)
+
+        cache = database._get_cache()
+        cache.query_results.clear()
+        cache.modified_tables.add(entity._table_)
+        entity._refresh_upserted_objects_(cache, conflict_attrs, update_attrs, vals_list)
+        return len(rows)
+    @cut_traceback
+    def bulk_insert(entity, rows, attrs=None, batch_size=None, return_ids=False):
+        # Inserts rows into the table of the entity without creating objects, the rows are validated by attribute
+        # converters and written in batches, so rows of an iterator are not kept in memory all at once.
+        # PostgreSQL uses COPY FROM STDIN, other databases use executemany() with single-row INSERT
+        database = entity._database_
+        if database.schema is None:
+            throw(ERDiagramError, 'Mapping is not generated for entity %r' % entity.__name__)
+        if batch_size is None: batch_size = options.BULK_INSERT_BATCH_SIZE
+        elif not isinstance(batch_size, int_types) or batch_size < 1:
+            throw(ValueError, 'batch_size must be positive integer. Got: %r' % batch_size)
+        rows = iter(rows)
+        first_row = next(rows, None)
+        if first_row is None: return [] if return_ids else 0
+        if attrs is not None: attrs = entity._get_attrs_by_names_(attrs, 'attrs')
+        elif isinstance(first_row, dict): attrs = entity._get_attrs_by_names_(sorted(first_row), 'rows')
+        else: throw(TypeError, 'Names of attributes should be specified in attrs option when rows are tuples')
+        names = tuple(attr.name for attr in attrs)
+        name_set = set(names)
+        pk_attrs = entity._pk_attrs_
+        auto_pk = pk_attrs[0] not in attrs and pk_attrs[0].auto
+        if return_ids and not auto_pk and not all(attr in attrs for attr in pk_attrs): throw(TypeError,
+            'Cannot return ids of %s objects: values of primary key are not specified' % entity.__name__)
+        insert_attrs = entity._get_insert_attrs_(attrs)
+
+        provider = database.provider
+        columns = []
+        converters = []
+        for attr in insert_attrs:
+            columns.extend(attr.columns)
+            converters.extend(attr.converters)
+        if not columns: throw(TypeError, 'Values of attributes are not specified')
+        use_returning = return_ids and auto_pk and entity._batch_insert_supported_(True)
+        if use_returning: batch_size = min(batch_size, max(1, provider.max_params_count // len(columns)))
+
+        def validate_row(row):
+            if isinstance(row, dict):
+                if len(row) != len(names) or not name_set.issuperset(row): throw(TypeError,
+                    'All rows should have the same set of attributes: %s. Got: %s' % (', '.join(names), ', '.join(row)))
+                row = [ row[name] for name in names ]
+            elif len(row) != len(names): throw(TypeError,
+                'Each row should contain %d values (%s). Got: %d' % (len(names), ', '.join(names), len(row)))
+            return entity._validate_row_(insert_attrs, row)
+
+        count = 0
+        ids = []
+        batch = []
+        for row in chain((first_row,), rows):
+            vals, values = validate_row(row)
+            batch.append(values)
+            if return_ids and not auto_pk: ids.append(entity._get_pkval_from_vals_(vals))
+            if len(batch) < batch_size: continue
+            new_ids = entity._bulk_insert_batch_(insert_attrs, columns, converters, batch, return_ids and auto_pk)
+            if new_ids is not None: ids.extend(new_ids)
+            count += len(batch)
+            batch = []
+        if batch:
+            # multi-row INSERT ... RETURNING statement is cached for a few sizes of the last batch only
+            for batch in iter_batches(batch, batch_size) if use_returning else [ batch ]:
+                new_ids = entity._bulk_insert_batch_(insert_attrs, columns, converters, batch, return_ids and auto_pk)
+                if new_ids is not None: ids.extend(new_ids)
+                count += len(batch)
+
+        cache = database._get_cache()
+        cache.query_results.clear()
+        cache.modified_tables.add(entity._table_)
+        return ids if return_ids else count
+    def _bulk_insert_batch_(entity, attrs, columns, converters, batch, auto_pk):
+        database = entity._database_
+        provider = database.provider
+        if auto_pk:
+            if entity._batch_insert_supported_(True):
+                sql, adapter = entity._get_insert_sql_(attrs, columns, converters, len(batch), auto_pk=True)
+                arguments = []
+                for values in batch: arguments.extend(values)
+                cursor = database._exec_sql(sql, adapter(arguments), start_transaction=True)
+                # auto-generated ids are increasing in the order of inserted rows
+                return sorted(row[0] for row in cursor.fetchall())
+            sql, adapter = entity._get_single_insert_sql_(attrs, True)
+            return [ database._exec_sql(sql, adapter(values), returning_id=True, start_transaction=True)
+                     for values in batch ]
+        if provider.copy_from_syntax: database._exec_copy(entity._table_, columns, converters, batch)
+        else:
+            sql, adapter = entity._get_insert_sql_(attrs, columns, converters, 1)
+            database._exec_sql(sql, [ adapter(values) for values in batch ], start_transaction=True)
+    def _get_single_insert_sql_(entity, attrs, auto_pk):
+        cached_sql = entity._insert_sql_cache_.get(attrs)
+        if cached_sql is not None: return cached_sql
+        database = entity._database_
+        columns = []
+        converters = []
+        for attr in attrs:
+            columns.extend(attr.columns)
+            converters.extend(attr.converters)
+        assert len(columns) == len(converters)
+        params = [ [ 'PARAM', (i, None, None),  converter ] for i, converter in enumerate(converters) ]
+        if not columns and database.provider.dialect == 'Oracle':
+            sql_ast = [ 'INSERT', entity._table_, entity._pk_columns_,
+                        [ [ 'DEFAULT' ] for column in entity._pk_columns_ ] ]
+        else: sql_ast = [ 'INSERT', entity._table_, columns, params ]
+        if auto_pk: sql_ast.append(entity._pk_columns_[0])
+        cached_sql = entity._insert_sql_cache_[attrs] = database._ast2sql(sql_ast)
+        return cached_sql
+    def _get_pkval_from_vals_(entity, vals):
+        pk_attrs = entity._pk_attrs_
+        if not entity._pk_is_composite_: return vals[pk_attrs[0]]
+        return tuple(vals[attr] for attr in pk_attrs)
+    def _get_attrs_by_names_(entity, names, option):
+        if isinstance(names, str): names = names.split()
+        get_attr = entity._adict_.get
+        attrs = []
+        for name in names:
+            attr = get_attr(name)
+            if attr is None: throw(AttributeError, 'Entity %s does not have attribute %s' % (entity.__name__, name))
+            if attr.is_collection: throw(TypeError,
+                '%s attribute %s cannot be used in %s option' % (attr.__class__.__name__, attr, option))
+            attrs.append(attr)
+        return tuple(attrs)
+    def _get_insert_attrs_(entity, attrs):
+        # specified attributes followed by attributes with default values and the discriminator
+        return attrs + tuple(attr for attr in entity._attrs_with_columns_ if attr not in attrs
+                             and (attr.default is not None or attr is entity._discriminator_attr_))
+    def _validate_row_(entity, insert_attrs, row):
+        # row contains values of the first len(row) insert_attrs, other attributes get default values
+        vals = {}
+        values = []
+        size = len(row)
+        for i, attr in enumerate(insert_attrs):
+            if i < size: val = attr.validate(row[i], None, entity, from_db=False)
+            elif attr is entity._discriminator_attr_: val = entity._discriminator_
+            else: val = attr.validate(DEFAULT, None, entity, from_db=False)
+            if val is None and attr.is_required: throw(ValueError, 'Attribute %s is required' % attr)
+            vals[attr] = val
+            if not attr.reverse: values.append(attr.converters[0].val2dbval(val))
+            else: values.extend(attr.get_raw_values(val))
+        return vals, values
+    def _get_upsert_sql_(entity, attrs, columns, converters, conflict_attrs, update_attrs, rows_count):
+        query_key = 'UPSERT', attrs, conflict_attrs, update_attrs, rows_count
+        cached_sql = entity._insert_sql_cache_.get(query_key)
+        if cached_sql is not None: return cached_sql
+        columns_count = len(columns)
+        rows = [ [ [ 'PARAM', (i * columns_count + j, None, None), converter ]
+                   for j, converter in enumerate(converters) ] for i in range(rows_count) ]
+        conflict_columns = [ column for attr in conflict_attrs for column in attr.columns ]
+        update_columns = [ column for attr in update_attrs for column in attr.columns ]
+        sql_ast = [ 'UPSERT', entity._table_, columns, rows, conflict_columns, update_columns ]
+        cached_sql = entity._database_._ast2sql(sql_ast)
+        entity._insert_sql_cache_[query_key] = cached_sql
+        return cached_sql
+    def _refresh_upserted_objects_(entity, cache, conflict_attrs, update_attrs, vals_list):
+        entity_cache = entity._second_level_cache_
+        if entity_cache is not None:
+            entity_cache.clear()
+            cache.invalidated_cache_keys.append((entity_cache, None))
+        if conflict_attrs == entity._pk_attrs_: index = cache.indexes.get(entity._pk_attrs_)
+        else: index = cache.indexes.get(conflict_attrs if len(conflict_attrs) > 1 else conflict_attrs[0])
+        if not index or not update_attrs: return
+        for vals in vals_list:
+            key = tuple(vals[attr] for attr in conflict_attrs)
+            obj = index.get(key if len(key) > 1 else key[0])
+            if obj is None or obj._status_ in created_or_deleted_statuses: continue
+            avdict = {}
+            for attr in update_attrs:
+                val = vals[attr]
+                avdict[attr] = attr.converters[0].val2dbval(val, obj) if not attr.reverse else val
+                obj._rbits_ &= ~obj._bits_except_volatile_[attr]
+            obj._db_set_(avdict)
+    def _get_insert_sql_(entity, attrs, columns, converters, rows_count, auto_pk=False):
+        query_key = attrs, rows_count, auto_pk
+        cached_sql = entity._insert_sql_cache_.get(query_key)
+        if cached_sql is not None: return cached_sql
+        columns_count = len(columns)
+        rows = [ [ [ 'PARAM', (i * columns_count + j, None, None), converter ]
+                   for j, converter in enumerate(converters) ] for i in range(rows_count) ]
+        sql_ast = [ 'INSERT_MANY', entity._table_, columns, rows ]
+        if auto_pk: sql_ast.append(entity._pk_columns_[0])
+        cached_sql = entity._database_._ast2sql(sql_ast)
+        entity._insert_sql_cache_[query_key] = cached_sql
+        return cached_sql
+    def _exec_insert_many_(entity, sql, arguments, items, auto_pk):
+        database = entity._database_
+        try:
+            cursor = database._exec_sql(sql, arguments, start_transaction=True)
+            # auto-generated ids are increasing in the order of inserted rows,
+            # but RETURNING clause does not guarantee the order of returned rows
+            if auto_pk: new_ids = sorted(row[0] for row in cursor.fetchall())
+        except IntegrityError as e:
+            msg = " ".join(tostring(arg) for arg in e.args)
+            throw(TransactionIntegrityError,
+                  'One of %d %s objects cannot be stored in the database. %s: %s'
+                  % (len(items), entity.__name__, e.__class__.__name__, msg), e)
+        except DatabaseError as e:
+            msg = " ".join(tostring(arg) for arg in e.args)
+            throw(UnexpectedError, 'One of %d %s objects cannot be stored in the database. %s: %s'
+                                   % (len(items), entity.__name__, e.__class__.__name__, msg), e)
+        if auto_pk and len(new_ids) != len(items): throw(UnexpectedError,
+            'Expected %d auto-generated ids for %s objects, got %d' % (len(items), entity.__name__, len(new_ids)))
+        for i, (obj, values, new_dbvals) in enumerate(items):
+            obj._set_inserted_(new_ids[i] if auto_pk else None, new_dbvals)
+            obj._finish_save_()
     def _set_rbits(entity, objects, attrs):
         rbits_dict = {}
         get_rbits = rbits_dict.get
@@ -4355,6 +5277,8 @@ class EntityMeta(type):
         seeds = cache.seeds[entity._pk_attrs_]
         if not seeds: return
         objects = {obj for obj in objects if obj in seeds}
+        if entity._second_level_cache_ is not None:
+            objects = {obj for obj in objects if not obj._load_from_second_level_cache_()}
         objects = sorted(objects, key=attrgetter('_pkval_'))
         max_batch_size = database.provider.max_params_count // len(entity._pk_columns_)
         while objects:
@@ -4376,7 +5300,7 @@ class EntityMeta(type):
 
         if type(func) is types.FunctionType:
             names = get_lambda_args(func)
-            code_key = id(func.__code__)
+            code_key = get_codeobject_id(func.__code__)
             cond_expr, external_names, cells = decompile(func)
         elif isinstance(func, str):
             code_key = func
@@ -4457,6 +5381,17 @@ class EntityMeta(type):
             assert cache.in_transaction
             cache.for_update.add(obj)
         return obj
+    def _validate_raw_pkval_(entity, raw_pkval):
+        i = 0
+        result = []
+        for attr in entity._pk_attrs_:
+            if not attr.reverse:
+                result.append(attr.validate(raw_pkval[i], None, entity, from_db=True))
+                i += 1
+            else:
+                result.extend(attr.py_type._validate_raw_pkval_(raw_pkval[i:i+len(attr.columns)]))
+                i += len(attr.columns)
+        return tuple(result)
     def _get_by_raw_pkval_(entity, raw_pkval, for_update=False, from_db=True, seed=True):
         i = 0
         pkval = []
@@ -4591,7 +5526,7 @@ def populate_criteria_list(criteria_list, columns, converters, operations,
         params_count += 1
     return params_count
 
-statuses = {'created', 'cancelled', 'loaded', 'modified', 'inserted', 'updated', 'marked_to_delete', 'deleted'}
+statuses = {'created', 'cancelled', 'loaded', 'modified', 'inserted', 'updated', 'marked_to_delete', 'deleted', 'evicted'}
 del_statuses = {'marked_to_delete', 'deleted', 'cancelled'}
 created_or_deleted_statuses = {'created'} | del_statuses
 saved_statuses = {'inserted', 'updated', 'deleted'}
@@ -4815,6 +5750,8 @@ class Entity(object, metaclass=EntityMeta):
         database = entity._database_
         if cache is not database._get_cache():
             throw(TransactionError, "Object %s doesn't belong to current transaction" % safe_repr(obj))
+        if entity._second_level_cache_ is not None and obj._load_from_second_level_cache_(): return
+        if cache.seed_origins: cache._register_load(obj, None)
         seeds = cache.seeds[entity._pk_attrs_]
         max_batch_size = database.provider.max_params_count // len(entity._pk_columns_)
         objects = [ obj ]
@@ -4827,6 +5764,17 @@ class Entity(object, metaclass=EntityMeta):
         objects = entity._fetch_objects(cursor, attr_offsets)
         if obj not in objects: throw(UnrepeatableReadError,
                                      'Phantom object %s disappeared' % safe_repr(obj))
+    def _load_from_second_level_cache_(obj):
+        entity = obj.__class__
+        root = entity._root_
+        data = entity._second_level_cache_.get((root.__name__, obj._get_raw_pkval_()))
+        return data is not None and root._parse_second_level_cache_data_(data) is obj
+    def _invalidate_second_level_cache_(obj):
+        entity_cache = obj._second_level_cache_
+        if entity_cache is None: return
+        key = obj._root_.__name__, obj._get_raw_pkval_()
+        entity_cache.delete(key)
+        obj._session_cache_.invalidated_cache_keys.append((entity_cache, key))
     @cut_traceback
     def load(obj, *attrs):
         cache = obj._session_cache_
@@ -5186,6 +6134,15 @@ class Entity(object, metaclass=EntityMeta):
             optimistic_values.extend(values)
             optimistic_operations.extend('IS_NULL' if dbval is None else converter.EQ for converter in converters)
         return optimistic_operations, optimistic_columns, optimistic_converters, optimistic_values
+    def _has_unsaved_principal_objects_(obj):
+        vals = obj._vals_
+        if obj._status_ == 'created': attrs = obj._attrs_with_columns_
+        else: attrs = obj._attrs_with_bit_(obj._attrs_with_columns_, obj._wbits_)
+        for attr in attrs:
+            if attr.reverse:
+                val = vals[attr]
+                if val is not None and val._status_ == 'created': return True
+        return False
     def _save_principal_objects_(obj, dependent_objects):
         if dependent_objects is None: dependent_objects = []
         elif obj in dependent_objects:
@@ -5227,7 +6184,7 @@ class Entity(object, metaclass=EntityMeta):
             del vals[attr]
             dbvals.pop(attr, None)
 
-    def _save_created_(obj):
+    def _prepare_insert_(obj):
         auto_pk = (obj._pkval_ is None)
         attrs = []
         values = []
@@ -5245,28 +6202,11 @@ class Entity(object, metaclass=EntityMeta):
                 else:
                     new_dbvals[attr] = val
                     values.extend(attr.get_raw_values(val))
-        attrs = tuple(attrs)
-
+        return auto_pk, tuple(attrs), values, new_dbvals
+    def _save_created_(obj):
+        auto_pk, attrs, values, new_dbvals = obj._prepare_insert_()
         database = obj._database_
-        cached_sql = obj._insert_sql_cache_.get(attrs)
-        if cached_sql is None:
-            columns = []
-            converters = []
-            for attr in attrs:
-                columns.extend(attr.columns)
-                converters.extend(attr.converters)
-            assert len(columns) == len(converters)
-            params = [ [ 'PARAM', (i, None, None),  converter ] for i, converter in enumerate(converters) ]
-            entity = obj.__class__
-            if not columns and database.provider.dialect == 'Oracle':
-                sql_ast = [ 'INSERT', entity._table_, obj._pk_columns_,
-                            [ [ 'DEFAULT' ] for column in obj._pk_columns_ ] ]
-            else: sql_ast = [ 'INSERT', entity._table_, columns, params ]
-            if auto_pk: sql_ast.append(entity._pk_columns_[0])
-            sql, adapter = database._ast2sql(sql_ast)
-            entity._insert_sql_cache_[attrs] = sql, adapter
-        else: sql, adapter = cached_sql
-
+        sql, adapter = obj.__class__._get_single_insert_sql_(attrs, auto_pk)
         arguments = adapter(values)
         try:
             if auto_pk: new_id = database._exec_sql(sql, arguments, returning_id=True,
@@ -5281,8 +6221,9 @@ class Entity(object, metaclass=EntityMeta):
             msg = " ".join(tostring(arg) for arg in e.args)
             throw(UnexpectedError, 'Object %r cannot be stored in the database. %s: %s'
                                    % (obj, e.__class__.__name__, msg), e)
-
-        if auto_pk:
+        obj._set_inserted_(new_id if auto_pk else None, new_dbvals)
+    def _set_inserted_(obj, new_id, new_dbvals):
+        if new_id is not None:
             pk_attrs = obj._pk_attrs_
             cache_index = obj._session_cache_.indexes[pk_attrs]
             obj2 = cache_index.setdefault(new_id, obj)
@@ -5295,7 +6236,7 @@ class Entity(object, metaclass=EntityMeta):
         obj._rbits_ = obj._all_bits_except_volatile_
         obj._wbits_ = 0
         obj._update_dbvals_(True, new_dbvals)
-    def _save_updated_(obj):
+    def _prepare_update_(obj):
         update_columns = []
         values = []
         new_dbvals = {}
@@ -5341,10 +6282,18 @@ class Entity(object, metaclass=EntityMeta):
                 sql, adapter = database._ast2sql(sql_ast)
                 obj._update_sql_cache_[query_key] = sql, adapter
             else: sql, adapter = cached_sql
+            return sql, adapter, values, new_dbvals
+        return None, None, values, new_dbvals
+    def _save_updated_(obj):
+        sql, adapter, values, new_dbvals = obj._prepare_update_()
+        if sql is not None:
             arguments = adapter(values)
-            cursor = database._exec_sql(sql, arguments, start_transaction=True)
-            if cursor.rowcount == 0 and cache.db_session.optimistic:
+            cursor = obj._database_._exec_sql(sql, arguments, start_transaction=True)
+            if cursor.rowcount == 0 and obj._session_cache_.db_session.optimistic:
                 throw(OptimisticCheckError, obj.find_updated_attributes())
+            obj._invalidate_second_level_cache_()
+        obj._set_updated_(new_dbvals)
+    def _set_updated_(obj, new_dbvals):
         obj._status_ = 'updated'
         obj._rbits_ |= obj._wbits_ & obj._all_bits_except_volatile_
         obj._wbits_ = 0
@@ -5366,8 +6315,11 @@ class Entity(object, metaclass=EntityMeta):
         else: sql, adapter = cached_sql
         arguments = adapter(values)
         cursor = database._exec_sql(sql, arguments, start_transaction=True)
+        obj._set_deleted_()
+    def _set_deleted_(obj):
+        obj._invalidate_second_level_cache_()
         obj._status_ = 'deleted'
-        cache.indexes[obj._pk_attrs_].pop(obj._pkval_)
+        obj._session_cache_.indexes[obj._pk_attrs_].pop(obj._pkval_)
 
     def find_updated_attributes(obj):
         entity = obj.__class__
@@ -5426,7 +6378,8 @@ class Entity(object, metaclass=EntityMeta):
         elif status == 'modified': obj._save_updated_()
         elif status == 'marked_to_delete': obj._save_deleted_()
         else: assert False, "_save_() called for object %r with incorrect status %s" % (obj, status)  # pragma: no cover
-
+        obj._finish_save_()
+    def _finish_save_(obj):
         assert obj._status_ in saved_statuses
         cache = obj._session_cache_
         assert cache is not None and cache.is_alive
@@ -5489,8 +6442,8 @@ class Entity(object, metaclass=EntityMeta):
                 if len(value) == 1: value = value[0]
             result[attr.name] = value
         return result
-    def to_json(obj, include=(), exclude=(), converter=None, with_schema=True, schema_hash=None):
-        return obj._database_.to_json(obj, include, exclude, converter, with_schema, schema_hash)
+    def to_json(obj, include=(), exclude=(), converter=None, with_schema=True, schema_hash=None, stream=None):
+        return obj._database_.to_json(obj, include, exclude, converter, with_schema, schema_hash, stream)
 
 def string2ast(s):
     result = string2ast_cache.get(s)
@@ -5545,7 +6498,7 @@ def make_query(args, frame_depth, left_join=False):
         args, kwargs=None, frame_depth=frame_depth+1 if frame_depth is not None else None, from_generator=True)
     if isinstance(gen, types.GeneratorType):
         tree, external_names, cells = decompile(gen)
-        code_key = id(gen.gi_frame.f_code)
+        code_key = get_codeobject_id(gen.gi_frame.f_code)
     elif isinstance(gen, str):
         tree = string2ast(gen)
         if not isinstance(tree, ast.GeneratorExp):
@@ -5664,11 +6617,112 @@ def extract_vars(code_key, filter_num, extractors, globals, locals, cells=None):
         vars[varkey] = value
     return vars, vartypes
 
+def pad_in_lists(provider, code_key, filter_num, in_list_srcs, vars, vartypes):
+    if not options.IN_LIST_PADDING or not in_list_srcs: return
+    max_size = provider.max_params_count
+    if provider.max_in_list_size is not None: max_size = min(max_size, provider.max_in_list_size)
+    for src in in_list_srcs:
+        varkey = filter_num, src, code_key
+        value = vars.get(varkey)
+        if type(value) is tuple: vartypes[varkey], vars[varkey] = pad_in_list(vartypes[varkey], value, max_size)
+
+def pad_in_list(item_types, items, max_size=None):
+    size = len(items)
+    if size < 3 or not size & (size - 1): return item_types, items  # empty or power of two
+    padded_size = 1 << size.bit_length()
+    if max_size is not None and padded_size > max_size: return item_types, items
+    padding = padded_size - size
+    return item_types + item_types[-1:] * padding, items + items[-1:] * padding
+
+def get_sql_tables(sql_ast, tables=None):
+    if tables is None: tables = set()
+    if len(sql_ast) >= 3 and sql_ast[1] == 'TABLE': tables.add(sql_ast[2])
+    for item in sql_ast:
+        if type(item) is list: get_sql_tables(item, tables)
+    return tables
+
+cursor_value_types = {
+    'decimal': (Decimal, str, Decimal),
+    'datetime': (datetime.datetime, str, converting.str2datetime),
+    'date': (datetime.date, str, converting.str2date),
+    'time': (datetime.time, str, converting.str2time),
+    'timedelta': (datetime.timedelta, converting.timedelta2str, converting.str2timedelta),
+    'uuid': (UUID, str, UUID),
+    'bytes': (bytes, lambda x: base64.b64encode(x).decode('ascii'), base64.b64decode)
+}
+
+def encode_cursor(seek_columns, values):
+    items = []
+    for value in values:
+        for name, (t, encode, decode) in cursor_value_types.items():
+            if type(value) is t:
+                value = [ name, encode(value) ]
+                break
+        items.append(value)
+    columns = [ [ attr.name, i, is_desc ] for attr, i, is_desc in seek_columns ]
+    data = json.dumps([ columns, items ], separators=(',', ':')).encode('utf8')
+    return base64.urlsafe_b64encode(data).decode('ascii').rstrip('=')
+
+def decode_cursor(seek_columns, cursor):
+    try:
+        data = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        columns, items = json.loads(data.decode('utf8'))
+        values = []
+        for item in items:
+            if type(item) is list:
+                name, value = item
+                item = cursor_value_types[name][2](value)
+            values.append(item)
+    except Exception: throw(ValueError, 'Invalid cursor: %r' % cursor)
+    if columns != [ [ attr.name, i, is_desc ] for attr, i, is_desc in seek_columns ]:
+        throw(ValueError, 'Cursor does not correspond to ordering of the query')
+    return values
+
 def unpickle_query(query_result):
     return query_result
 
+QueryColumn = namedtuple('QueryColumn', 'name py_type values mask')
+
+column_typecodes = { bool: 'b', int: 'q', float: 'd' }
+numpy_dtypes = { 'b': 'bool', 'q': 'int64', 'd': 'float64' }
+
+class ColumnBuilder(object):
+    # Collects values of one expression of the query from chunks of rows. Values of int, float and bool
+    # expressions are stored in typed array.array, NULLs are stored as zeros and marked in the mask
+    def __init__(builder, name, py_type, func, slice_or_offset, converter):
+        builder.name = name
+        builder.py_type = py_type
+        builder.func = func
+        builder.offset = slice_or_offset
+        builder.converter = converter
+        builder.typecode = column_typecodes.get(py_type) if converter is not None else None
+        builder.values = array(builder.typecode) if builder.typecode is not None else []
+        builder.mask = None
+        builder.size = 0
+    def extend(builder, rows):
+        offset = builder.offset
+        if builder.typecode is None:
+            func = builder.func
+            column = [ func(row[offset]) for row in rows ]
+        else: column = [ row[offset] for row in rows ]
+        if None in column:
+            if builder.mask is None: builder.mask = bytearray(builder.size)
+            builder.mask.extend([ value is None for value in column ])
+            if builder.typecode is not None: column = [ 0 if value is None else value for value in column ]
+        elif builder.mask is not None: builder.mask.extend(bytes(len(column)))
+        builder.size += len(column)
+        if builder.typecode is None: builder.values.extend(column)
+        else:
+            try: builder.values.fromlist(column)
+            except TypeError:  # the database driver returned values of another type, e.g. Decimal
+                sql2py = builder.converter.sql2py
+                builder.values.fromlist([ sql2py(value) for value in column ])
+    def get_column(builder):
+        return QueryColumn(builder.name, builder.py_type, builder.values, builder.mask)
+
 class Query(object):
     def __init__(query, code_key, tree, globals, locals, cells=None, left_join=False):
+        start_time = time()
         assert isinstance(tree, ast.GeneratorExp)
         tree, extractors = create_extractors(code_key, tree, globals, locals, special_functions, const_functions)
         filter_num = 0
@@ -5701,6 +6755,7 @@ class Query(object):
             vars, vartypes = extract_vars(code_key, filter_num, extractors, globals, locals, cells)
 
         query._filter_num = filter_num
+        pad_in_lists(database.provider, code_key, filter_num, tree.in_list_srcs, vars, vartypes)
         database.provider.normalize_vars(vars, vartypes)
 
         query._code_key = code_key
@@ -5709,6 +6764,7 @@ class Query(object):
 
         translator, vars = query._get_translator(query._key, vars)
         query._vars = vars
+        cached = translator is not None
 
         if translator is None:
             pickled_tree = pickle_ast(tree)
@@ -5739,6 +6795,13 @@ class Query(object):
         query._distinct = None
         query._prefetch = False
         query._prefetch_context = PrefetchContext(query._database)
+        query._cached = False
+        query._cache_ttl = None
+        if database._hooks: query._fire_translate_hooks(translator, start_time, cached)
+    def _fire_translate_hooks(query, translator, start_time, cached):
+        expr_type = translator.expr_type
+        entity = expr_type if isinstance(expr_type, EntityMeta) else None
+        query._database._fire_hooks('translate', start_time, entity=entity, cached=cached)
     def _get_query(query):
         return query
     def _get_type_(query):
@@ -5760,7 +6823,7 @@ class Query(object):
         if translator is not None:
             if translator.func_extractors_map:
                 for func, func_extractors in translator.func_extractors_map.items():
-                    func_id = id(func.__code__)
+                    func_id = get_codeobject_id(func.__code__)
                     func_filter_num = translator.filter_num, 'func', func_id
                     func_vars, func_vartypes = extract_vars(
                         func_id, func_filter_num, func_extractors, func.__globals__, {}, func.__closure__)  # todo closures
@@ -5772,10 +6835,23 @@ class Query(object):
             for key, val in translator.fixed_param_values.items():
                 assert key in new_vars
                 if val != new_vars[key]:
-                    del database._translator_cache[query_key]
+                    database._translator_cache.pop(query_key)
                     return None, vars.copy()
         return translator, new_vars
     def _construct_sql_and_arguments(query, limit=None, offset=None, range=None, aggr_func_name=None, aggr_func_distinct=None, sep=None):
+        sql, adapter, attr_offsets, tables, sql_key = query._construct_sql(
+            limit, offset, aggr_func_name, aggr_func_distinct, sep)
+        arguments = adapter(query._vars)
+        query_key = query._get_query_key(sql_key, arguments)
+        return sql, arguments, attr_offsets, tables, query_key
+    def _get_query_key(query, sql_key, arguments):
+        if not query._translator.query_result_is_cacheable: return None
+        arguments_key = HashableDict(arguments) if type(arguments) is dict else arguments
+        try: hash(arguments_key)
+        except: return None  # arguments are unhashable
+        return HashableDict(sql_key, arguments_key=arguments_key)
+    def _construct_sql(query, limit=None, offset=None, aggr_func_name=None, aggr_func_distinct=None, sep=None):
+        start_time = time()
         translator = query._translator
         expr_type = translator.expr_type
         attrs_to_prefetch_dict = query._prefetch_context.attrs_to_prefetch_dict
@@ -5805,52 +6881,179 @@ class Query(object):
                 query._for_update, query._nowait, query._skip_locked)
             cache = database._get_cache()
             sql, adapter = database.provider.ast2sql(sql_ast)
-            cache_entry = sql, adapter, attr_offsets
+            tables = tuple(get_sql_tables(sql_ast))
+            cache_entry = sql, adapter, attr_offsets, tables
             database._constructed_sql_cache[sql_key] = cache_entry
-        else: sql, adapter, attr_offsets = cache_entry
-        arguments = adapter(query._vars)
-        if query._translator.query_result_is_cacheable:
-            arguments_key = HashableDict(arguments) if type(arguments) is dict else arguments
-            try: hash(arguments_key)
-            except: query_key = None  # arguments are unhashable
-            else: query_key = HashableDict(sql_key, arguments_key=arguments_key)
-        else: query_key = None
-        return sql, arguments, attr_offsets, query_key
+            cached = False
+        else:
+            sql, adapter, attr_offsets, tables = cache_entry
+            cached = True
+        if database._hooks: query._fire_build_hooks(sql, start_time, cached)
+        return sql, adapter, attr_offsets, tables, sql_key
+    def _fire_build_hooks(query, sql, start_time, cached):
+        expr_type = query._translator.expr_type
+        entity = expr_type if isinstance(expr_type, EntityMeta) else None
+        query._database._fire_hooks('build', start_time, sql, entity=entity, cached=cached)
     def get_sql(query):
-        sql, arguments, attr_offsets, query_key = query._construct_sql_and_arguments()
+        sql, arguments, attr_offsets, tables, query_key = query._construct_sql_and_arguments()
         return sql
     def _actual_fetch(query, limit=None, offset=None):
+        planner = query._database._prefetch_planner
+        if planner is not None: query = planner.plan(query)
+        with query._prefetch_context:
+            sql, arguments, attr_offsets, tables, query_key = query._construct_sql_and_arguments(limit, offset)
+        return query._fetch_sql(sql, arguments, attr_offsets, tables, query_key)
+    def _fetch_sql(query, sql, arguments, attr_offsets, tables, query_key):
+        planner = query._database._prefetch_planner
         translator = query._translator
         with query._prefetch_context:
-            sql, arguments, attr_offsets, query_key = query._construct_sql_and_arguments(limit, offset)
             database = query._database
             cache = database._get_cache()
             if query._for_update: cache.immediate = True
             cache.prepare_connection_for_query_execution()  # may clear cache.query_results
             items = cache.query_results.get(query_key)
-            if items is None:
+            if items is None and query._cached and query_key is not None \
+                    and not query._for_update and not cache.in_transaction:
+                items = query._fetch_shared(sql, arguments, attr_offsets, tables, query_key)
+                cache.query_results[query_key] = items
+            elif items is None:
                 cursor = database._exec_sql(sql, arguments)
                 if isinstance(translator.expr_type, EntityMeta):
                     entity = translator.expr_type
                     items = entity._fetch_objects(cursor, attr_offsets, for_update=query._for_update,
                                                    used_attrs=translator.get_used_attrs())
-                elif len(translator.row_layout) == 1:
-                    func, slice_or_offset, src = translator.row_layout[0]
-                    items = list(starmap(func, cursor.fetchall()))
-                else:
-                    items = [ tuple(func(sql_row[slice_or_offset])
-                                     for func, slice_or_offset, src in translator.row_layout)
-                               for sql_row in cursor.fetchall() ]
-                    for i, t in enumerate(translator.expr_type):
-                        if isinstance(t, EntityMeta) and t._subclasses_: t._load_many_(row[i] for row in items)
+                else: items = query._parse_cursor(cursor, attr_offsets)
                 if query_key is not None: cache.query_results[query_key] = items
-            else:
-                stats = database._dblocal.stats
-                stat = stats.get(sql)
-                if stat is not None: stat.cache_count += 1
-                else: stats[sql] = QueryStat(sql)
+            else: database._update_cache_stat(sql)
             if query._prefetch: query._do_prefetch(items)
+        if planner is not None: planner.register_objects(cache, query, items)
+        return items
+    def _fetch_shared(query, sql, arguments, attr_offsets, tables, query_key):
+        # Rows are kept in the shared cache instead of objects, because objects belong to a single db_session
+        database = query._database
+        result_cache = database._result_cache
+        rows = result_cache.get(query_key)
+        if rows is not None:
+            database._update_cache_stat(sql)
+            return query._parse_rows(rows, attr_offsets)
+        versions = result_cache.get_versions(tables)
+        rows = database._exec_sql(sql, arguments).fetchall()
+        result_cache.set(query_key, rows, tables, versions, query._cache_ttl)
+        return query._parse_rows(rows, attr_offsets)
+    def _parse_cursor(query, cursor, attr_offsets):
+        database = query._database
+        if not database._hooks: return query._parse_rows(cursor.fetchall(), attr_offsets)
+        start_time = time()
+        rows = cursor.fetchall()
+        sql = database.last_sql
+        database._fire_hooks('fetch', start_time, sql, row_count=len(rows))
+        start_time = time()
+        items = query._parse_rows(rows, attr_offsets)
+        database._fire_hooks('materialize', start_time, sql, row_count=len(rows))
         return items
+    def _parse_rows(query, rows, attr_offsets):
+        translator = query._translator
+        if isinstance(translator.expr_type, EntityMeta):
+            entity = translator.expr_type
+            return entity._objects_from_rows_(rows, attr_offsets, for_update=query._for_update,
+                                              used_attrs=translator.get_used_attrs())
+        if len(translator.row_layout) == 1:
+            func, slice_or_offset, src = translator.row_layout[0]
+            return list(starmap(func, rows))
+        items = [ tuple(func(sql_row[slice_or_offset])
+                        for func, slice_or_offset, src in translator.row_layout)
+                  for sql_row in rows ]
+        for i, t in enumerate(translator.expr_type):
+            if isinstance(t, EntityMeta) and t._subclasses_: t._load_many_(row[i] for row in items)
+        return items
+    def _get_objects(query, items):
+        expr_type = query._translator.expr_type
+        if isinstance(expr_type, EntityMeta): return items
+        if type(expr_type) is not tuple: return []
+        positions = [ i for i, t in enumerate(expr_type) if isinstance(t, EntityMeta) ]
+        return [ row[i] for row in items for i in positions if row[i] is not None ]
+    @cut_traceback
+    def stream(query, batch_size=1000, evict=False):
+        # With evict=True unmodified objects of each batch are removed from the session cache after the batch
+        # is consumed. Evicted objects are read-only: modify them inside the loop or fetch them again via Entity[pk]
+        if not isinstance(batch_size, int_types) or batch_size < 1:
+            throw(TypeError, 'batch_size must be positive integer. Got: %r' % batch_size)
+        return query._stream(batch_size, evict)
+    def _stream(query, batch_size, evict):
+        database = query._database
+        with query._prefetch_context:
+            sql, arguments, attr_offsets, tables, query_key = query._construct_sql_and_arguments()
+        cache = database._get_cache()
+        if query._for_update: cache.immediate = True
+        cursor = database._exec_sql(sql, arguments, stream_batch_size=batch_size)
+        try:
+            while True:
+                if not cache.is_alive: throw(DatabaseSessionIsOver,
+                    'Cannot continue query streaming: the database session is over')
+                rows = cursor.fetchmany(batch_size)
+                if not rows: break
+                with query._prefetch_context:
+                    items = query._parse_rows(rows, attr_offsets)
+                    if query._prefetch: query._do_prefetch(items)
+                for item in items: yield item
+                if evict: cache._evict_objects(query._get_objects(items))
+                if len(rows) < batch_size: break
+        finally:
+            try: cursor.close()
+            except Exception: pass  # cursor may be already closed together with the transaction
+    @cut_traceback
+    def to_columns(query, batch_size=10000):
+        # Returns QueryColumn(name, py_type, values, mask) for each expression of the query. Rows are fetched
+        # by chunks and are not converted to tuples; mask is None if the column does not contain NULLs,
+        # otherwise it is bytearray with 1 for each NULL
+        if not isinstance(batch_size, int_types) or batch_size < 1:
+            throw(TypeError, 'batch_size must be positive integer. Got: %r' % batch_size)
+        return query._fetch_columns(batch_size)
+    @cut_traceback
+    def to_numpy(query, batch_size=10000):
+        # Returns numpy array for each expression of the query; columns which contain NULLs are masked arrays
+        try: import numpy
+        except ImportError: throw(ImportError, 'numpy package is required for to_numpy() query method')
+        if not isinstance(batch_size, int_types) or batch_size < 1:
+            throw(TypeError, 'batch_size must be positive integer. Got: %r' % batch_size)
+        result = []
+        for column in query._fetch_columns(batch_size):
+            values = column.values
+            if isinstance(values, array): arr = numpy.frombuffer(values, dtype=numpy_dtypes[values.typecode])
+            elif column.py_type is datetime.datetime: arr = numpy.array(values, dtype='datetime64[us]')
+            elif column.py_type is datetime.date: arr = numpy.array(values, dtype='datetime64[D]')
+            else:
+                arr = numpy.empty(len(values), dtype=object)
+                arr[:] = values
+            if column.mask is not None:
+                arr = numpy.ma.masked_array(arr, mask=numpy.frombuffer(column.mask, dtype=bool))
+            result.append(arr)
+        return result
+    def _fetch_columns(query, batch_size):
+        translator = query._translator
+        if isinstance(translator.expr_type, EntityMeta): throw(TypeError,
+            'Columns can be fetched only from query which selects attributes or expressions. Got: %s'
+            % ast2src(translator.tree.elt))
+        expr_types = translator.expr_type if type(translator.expr_type) is tuple else (translator.expr_type,)
+        provider = query._database.provider
+        builders = []
+        for py_type, (func, slice_or_offset, src) in zip(expr_types, translator.row_layout):
+            converter = provider.get_converter_by_py_type(py_type) if type(slice_or_offset) is int else None
+            builders.append(ColumnBuilder(src, py_type, func, slice_or_offset, converter))
+        database = query._database
+        with query._prefetch_context:
+            sql, arguments, attr_offsets, tables, query_key = query._construct_sql_and_arguments()
+        cursor = database._exec_sql(sql, arguments, stream_batch_size=batch_size)
+        try:
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows: break
+                for builder in builders: builder.extend(rows)
+                if len(rows) < batch_size: break
+        finally:
+            try: cursor.close()
+            except Exception: pass
+        return [ builder.get_column() for builder in builders ]
     @cut_traceback
     def prefetch(query, *args):
         query = query._clone(_prefetch_context=query._prefetch_context.copy())
@@ -5980,6 +7183,12 @@ class Query(object):
         cache.prepare_connection_for_query_execution()  # may clear cache.query_results
         cursor = database._exec_sql(sql, arguments)
         cache.query_results.clear()
+        expr_type = translator.expr_type
+        cache.modified_tables.add(expr_type._table_)
+        entity_cache = expr_type._second_level_cache_ if isinstance(expr_type, EntityMeta) else None
+        if entity_cache is not None:
+            entity_cache.clear()
+            cache.invalidated_cache_keys.append((entity_cache, None))
         return cursor.rowcount
     @cut_traceback
     def __len__(query):
@@ -6034,6 +7243,7 @@ class Query(object):
             query._database._translator_cache[new_key] = new_translator
         return query._clone(_key=new_key, _filters=new_filters, _translator=new_translator)
     def _process_lambda(query, func, globals, locals, order_by=False, original_names=False):
+        start_time = time()
         prev_translator = query._translator
         argnames = ()
         if isinstance(func, str):
@@ -6045,7 +7255,7 @@ class Query(object):
             cells = None
         elif type(func) is types.FunctionType:
             argnames = get_lambda_args(func)
-            func_id = id(func.__code__)
+            func_id = get_codeobject_id(func.__code__)
             func_ast, external_names, cells = decompile(func)
         elif not order_by: throw(TypeError,
             'Argument of filter() method must be a lambda functon or its text. Got: %r' % func)
@@ -6070,7 +7280,9 @@ class Query(object):
             func_id, func_ast, globals, locals, special_functions, const_functions, argnames or prev_translator.namespace)
         if extractors:
             vars, vartypes = extract_vars(func_id, new_filter_num, extractors, globals, locals, cells)
-            query._database.provider.normalize_vars(vars, vartypes)
+            provider = query._database.provider
+            pad_in_lists(provider, func_id, new_filter_num, func_ast.in_list_srcs, vars, vartypes)
+            provider.normalize_vars(vars, vartypes)
             new_vars = query._vars.copy()
             new_vars.update(vars)
         else: new_vars, vartypes = query._vars, HashableDict()
@@ -6079,6 +7291,7 @@ class Query(object):
         new_filters = query._filters + (('apply_lambda', func_id, new_filter_num, order_by, func_ast, argnames, original_names, extractors, None, vartypes),)
 
         new_translator, new_vars = query._get_translator(new_key, new_vars)
+        cached = new_translator is not None
         if new_translator is None:
             prev_optimized = prev_translator.optimize
             new_translator = prev_translator.apply_lambda(func_id, new_filter_num, order_by, func_ast, argnames, original_names, extractors, new_vars, vartypes)
@@ -6097,6 +7310,7 @@ class Query(object):
                     new_translator = query._reapply_filters(new_translator)
                     new_translator = new_translator.apply_lambda(func_id, new_filter_num, order_by, func_ast, argnames, original_names, extractors, new_vars, vartypes)
             query._database._translator_cache[new_key] = new_translator
+        if query._database._hooks: query._fire_translate_hooks(new_translator, start_time, cached)
         return query._clone(_filter_num=new_filter_num, _vars=new_vars, _key=new_key, _filters=new_filters,
                             _translator=new_translator)
     def _reapply_filters(query, translator):
@@ -6200,17 +7414,147 @@ class Query(object):
     def limit(query, limit=None, offset=None):
         return query._fetch(limit, offset, lazy=True)
     @cut_traceback
+    def fetch_in_executor(query, limit=None, offset=None):
+        return query._database.run_in_executor(query._fetch, limit, offset)
+    @cut_traceback
+    def fetch_async(query, limit=None, offset=None):
+        return run_async(query._fetch, limit, offset)
+    @cut_traceback
+    def as_rows(query, limit=None, offset=None):
+        col_names, rows = query._fetch_rows(limit, offset)
+        return rows
+    @cut_traceback
+    def as_dicts(query, limit=None, offset=None):
+        col_names, rows = query._fetch_rows(limit, offset)
+        return [ dict(zip(col_names, row)) for row in rows ]
+    @cut_traceback
+    def as_namedtuples(query, limit=None, offset=None):
+        col_names, rows = query._fetch_rows(limit, offset)
+        field_names = [ re.sub(r'\W+', '_', name).strip('_') for name in col_names ]
+        row_cls = namedtuple('Row', field_names, rename=True)
+        return [ row_cls._make(row) for row in rows ]
+    def _fetch_rows(query, limit=None, offset=None):
+        # Rows are returned as plain tuples of values without creating objects in the identity map,
+        # objects are represented by their primary key values, the same way as in to_dict()
+        translator = query._translator
+        expr_type = translator.expr_type
+        sql, arguments, attr_offsets, tables, query_key = query._construct_sql_and_arguments(limit, offset)
+        database = query._database
+        cache = database._get_cache()
+        if query._for_update: cache.immediate = True
+        cursor = database._exec_sql(sql, arguments)
+        if isinstance(expr_type, EntityMeta):
+            if attr_offsets is None:
+                attr_offsets, db_rows = query._load_entity_rows(expr_type, cursor.fetchall())
+            else: db_rows = cursor.fetchall()
+            col_names = [ attr.name for attr in attr_offsets ]
+            layout = list(attr_offsets.items())
+            rows = [ tuple(attr.parse_raw_value(row, offsets) for attr, offsets in layout) for row in db_rows ]
+            return col_names, rows
+        layout = []
+        for i, (func, slice_or_offset, src) in enumerate(translator.row_layout):
+            t = expr_type[i] if type(expr_type) is tuple else expr_type
+            if isinstance(t, SetType): t = t.item_type
+            if isinstance(t, EntityMeta):
+                def func(dbvals, entity=t):
+                    if None in dbvals: return None
+                    raw_pkval = entity._validate_raw_pkval_(dbvals)
+                    return raw_pkval[0] if len(raw_pkval) == 1 else raw_pkval
+            layout.append((func, slice_or_offset))
+        rows = [ tuple(func(row[slice_or_offset]) for func, slice_or_offset in layout) for row in cursor.fetchall() ]
+        return translator.col_names, rows
+    def _load_entity_rows(query, entity, pk_rows):
+        # Aggregated and optimized queries select primary key columns only,
+        # other columns are loaded by primary keys in batches, as objects are loaded from seeds
+        database = query._database
+        pk_rows = [ tuple(row) for row in pk_rows ]
+        max_batch_size = database.provider.max_params_count // len(entity._pk_columns_)
+        rows_dict = {}
+        for i in range(0, len(pk_rows), max_batch_size):
+            batch = pk_rows[i:i+max_batch_size]
+            sql, adapter, batch_attr_offsets = entity._construct_batchload_sql_(len(batch), from_seeds=False)
+            pk_offsets = [ offset for attr in entity._pk_attrs_ for offset in batch_attr_offsets[attr] ]
+            cursor = database._exec_sql(sql, adapter(batch))
+            for row in cursor.fetchall(): rows_dict[tuple(row[offset] for offset in pk_offsets)] = row
+        select_list, attr_offsets = entity._construct_select_clause_()
+        if rows_dict:
+            attr_offsets = { attr: batch_attr_offsets[attr] for attr in attr_offsets }
+        rows = [ rows_dict[pk_row] for pk_row in pk_rows if pk_row in rows_dict ]
+        return attr_offsets, rows
+    @cut_traceback
     def page(query, pagenum, pagesize=10):
         offset = (pagenum - 1) * pagesize
         return query._fetch(pagesize, offset, lazy=True)
+    @cut_traceback
+    def page_after(query, key, pagesize=10):
+        return query._seek(key)._fetch(pagesize, lazy=True)
+    @cut_traceback
+    def seek(query, key):
+        return query._seek(key)
+    @cut_traceback
+    def get_cursor(query, obj):
+        seek_columns = query._translator.get_seek_columns()
+        return encode_cursor(seek_columns, query._get_seek_values(seek_columns, obj))
+    def _seek(query, key):
+        # Keyset pagination: instead of OFFSET, rows are filtered by the condition
+        # (ordering columns) > (values of ordering columns in the last row of the previous page)
+        translator = query._translator
+        seek_columns = translator.get_seek_columns()
+        next_id = query._next_kwarg_id
+        new_vars = query._vars.copy()
+        if key is None: param_ids = None
+        else:
+            values = query._get_seek_values(seek_columns, key)
+            param_ids = tuple(range(next_id, next_id + len(values)))
+            next_id += len(values)
+            new_vars.update(zip(param_ids, values))
+        tup = (('apply_seek', seek_columns, param_ids),)
+        new_key = HashableDict(query._key, filters=query._key['filters'] + tup)
+        new_filters = query._filters + tup
+        new_translator, new_vars = query._get_translator(new_key, new_vars)
+        if new_translator is None:
+            new_translator = translator.apply_seek(seek_columns, param_ids)
+            query._database._translator_cache[new_key] = new_translator
+        return query._clone(_key=new_key, _filters=new_filters, _translator=new_translator,
+                            _next_kwarg_id=next_id, _vars=new_vars)
+    def _get_seek_values(query, seek_columns, key):
+        if isinstance(key, str): values = decode_cursor(seek_columns, key)
+        elif isinstance(key, Entity):
+            entity = query._translator.expr_type
+            if not isinstance(key, entity): throw(TypeError,
+                'Seek key should be an instance of %s. Got: %r' % (entity.__name__, key))
+            values = [ attr.get_raw_values(attr.get(key))[i] for attr, i, is_desc in seek_columns ]
+        elif isinstance(key, (tuple, list)):
+            if len(key) != len(seek_columns): throw(TypeError,
+                'Seek key should contain %d values (%s). Got: %d' % (len(seek_columns),
+                ', '.join(attr.name for attr, i, is_desc in seek_columns), len(key)))
+            values = list(key)
+        else: throw(TypeError, 'Seek key should be an object, a tuple of values or a cursor. Got: %r' % key)
+        for value, (attr, i, is_desc) in zip(values, seek_columns):
+            if value is None: throw(ValueError,
+                'Keyset pagination cannot be used when attribute %s of the last row is None' % attr)
+        return values
     def _aggregate(query, aggr_func_name, distinct=None, sep=None):
         translator = query._translator
-        sql, arguments, attr_offsets, query_key = query._construct_sql_and_arguments(
+        sql, arguments, attr_offsets, tables, query_key = query._construct_sql_and_arguments(
             aggr_func_name=aggr_func_name, aggr_func_distinct=distinct, sep=sep)
-        cache = query._database._get_cache()
+        database = query._database
+        cache = database._get_cache()
+        shared = query._cached and query_key is not None
+        if shared:
+            cache.prepare_connection_for_query_execution()
+            shared = not cache.in_transaction
         try: result = cache.query_results[query_key]
         except KeyError:
-            cursor = query._database._exec_sql(sql, arguments)
+            result_cache = database._result_cache
+            if shared:
+                entry = result_cache.get(query_key)
+                if entry is not None:
+                    database._update_cache_stat(sql)
+                    result = cache.query_results[query_key] = entry[0]
+                    return result
+                versions = result_cache.get_versions(tables)
+            cursor = database._exec_sql(sql, arguments)
             row = cursor.fetchone()
             if row is not None: result = row[0]
             else: result = None
@@ -6228,6 +7572,7 @@ class Query(object):
                 converter = provider.get_converter_by_py_type(expr_type)
                 result = converter.sql2py(result)
             if query_key is not None: cache.query_results[query_key] = result
+            if shared: result_cache.set(query_key, (result,), tables, versions, query._cache_ttl)
         return result
     @cut_traceback
     def sum(query, distinct=None):
@@ -6251,14 +7596,63 @@ class Query(object):
     def count(query, distinct=None):
         return query._aggregate('COUNT', distinct)
     @cut_traceback
+    def cache(query, ttl=None):
+        if ttl is not None and (not isinstance(ttl, (int, float)) or isinstance(ttl, bool) or ttl <= 0):
+            throw(ValueError, 'Cache ttl must be positive number or None. Got: %r' % ttl)
+        return query._clone(_cached=True, _cache_ttl=ttl)
+    @cut_traceback
     def for_update(query, nowait=False, skip_locked=False):
         if nowait and skip_locked:
             throw(TypeError, 'nowait and skip_locked options are mutually exclusive')
         return query._clone(_for_update=True, _nowait=nowait, _skip_locked=skip_locked)
     def random(query, limit):
         return query.order_by('random()')[:limit]
-    def to_json(query, include=(), exclude=(), converter=None, with_schema=True, schema_hash=None):
-        return query._database.to_json(query[:], include, exclude, converter, with_schema, schema_hash)
+    def to_json(query, include=(), exclude=(), converter=None, with_schema=True, schema_hash=None, stream=None):
+        return query._database.to_json(query[:], include, exclude, converter, with_schema, schema_hash, stream)
+
+
+class CompiledQuery(object):
+    # Keeps translated SQL for each shape of the query returned by the function. The function is called
+    # on each call, because it may build different queries depending on its arguments, but a query
+    # of known shape is executed without SQL construction
+    def __init__(compiled, database, func):
+        if type(func) is not types.FunctionType:
+            throw(TypeError, 'Function or lambda expected. Got: %r' % func)
+        compiled._database = database
+        compiled._func = func
+        compiled._plans = LRUCache(options.COMPILED_QUERY_PLANS_SIZE)
+        compiled.__name__ = func.__name__
+        compiled.__doc__ = func.__doc__
+    def __repr__(compiled):
+        return '<CompiledQuery %s>' % compiled.__name__
+    @cut_traceback
+    def __call__(compiled, *args, **kwargs):
+        query = compiled._func(*args, **kwargs)
+        if not isinstance(query, Query): throw(TypeError,
+            'Compiled function should return query object. Got: %s' % type(query).__name__)
+        if query._database is not compiled._database: throw(TranslationError,
+            'Compiled query belongs to another database')
+        translator = query._translator
+        if not translator.can_be_cached: return QueryResult(query, None, None, lazy=False)
+        planner = compiled._database._prefetch_planner
+        if planner is not None: query = planner.plan(query)
+        plan_key = compiled._get_plan_key(query)
+        plan = compiled._plans.get(plan_key)
+        # translator is replaced if values of fixed parameters or types of function parameters are changed
+        if plan is None or plan[0] is not translator:
+            with query._prefetch_context:
+                sql, adapter, attr_offsets, tables, sql_key = query._construct_sql()
+            plan = compiled._plans[plan_key] = translator, sql, adapter, attr_offsets, tables, sql_key
+        translator, sql, adapter, attr_offsets, tables, sql_key = plan
+        arguments = adapter(query._vars)
+        query_key = query._get_query_key(sql_key, arguments)
+        result = QueryResult(query, None, None, lazy=True)
+        result._items = query._fetch_sql(sql, arguments, attr_offsets, tables, query_key)
+        return result
+    def _get_plan_key(compiled, query):
+        prefetch_key = tuple((entity, tuple(sorted(attrs)))
+                             for entity, attrs in query._prefetch_context.attrs_to_prefetch_dict.items())
+        return query._key, query._distinct, query._for_update, query._nowait, query._skip_locked, prefetch_key
 
 
 class QueryResultIterator(object):
@@ -6426,8 +7820,8 @@ class QueryResult(object):
         for row in rows:
             writeln(strjoin('|', (strcut(item, width_dict[i]) for i, item in enumerate(row))))
         stream.flush()
-    def to_json(self, include=(), exclude=(), converter=None, with_schema=True, schema_hash=None):
-        return self._query._database.to_json(self, include, exclude, converter, with_schema, schema_hash)
+    def to_json(self, include=(), exclude=(), converter=None, with_schema=True, schema_hash=None, stream=None):
+        return self._query._database.to_json(self, include, exclude, converter, with_schema, schema_hash, stream)
 
     def __add__(self, other):
         result = []
@@ -2,6 +2,8 @@ from __future__ import absolute_import, print_function, division
 from pony.py23compat import buffer, int_types
 
 import os, re, json
+from time import monotonic
+from threading import Condition, Lock
 from decimal import Decimal, InvalidOperation
 from datetime import datetime, date, time, timedelta
 from uuid import uuid4, UUID
@@ -42,6 +44,8 @@ class     InternalError(DatabaseError): pass
 class     ProgrammingError(DatabaseError): pass
 class     NotSupportedError(DatabaseError): pass
 
+class PoolTimeoutError(OperationalError): pass
+
 @decorator
 def wrap_dbapi_exceptions(func, provider, *args, **kwargs):
     dbapi_module = provider.dbapi_module
@@ -97,15 +101,40 @@ def get_version_tuple(s):
         return tuple(int(component) for component in components)
     return None
 
+param_re = re.compile(r'%\((\w+)\)s|%s|%%')
+
+def convert_to_prepared(name, sql, has_arguments):
+    if not has_arguments: return 'PREPARE %s AS %s' % (name, sql), 'EXECUTE %s' % name
+    params = []
+    numbers = {}
+    def replace(match):
+        param = match.group()
+        if param == '%%': return '%'
+        key = match.group(1)
+        number = numbers.get(key)
+        if number is None:
+            params.append(param)
+            number = len(params)
+            if key is not None: numbers[key] = number
+        return '$%d' % number
+    body = param_re.sub(replace, sql)
+    execute_sql = 'EXECUTE %s' % name
+    if params: execute_sql += ' (%s)' % ', '.join(params)
+    return 'PREPARE %s AS %s' % (name, body), execute_sql
+
 class DBAPIProvider(object):
     paramstyle = 'qmark'
     quote_char = '"'
     max_params_count = 999
+    max_in_list_size = None
     max_name_len = 128
     table_if_not_exists_syntax = True
     index_if_not_exists_syntax = True
     max_time_precision = default_time_precision = 6
     uint64_support = False
+    multi_row_insert_syntax = True
+    copy_from_syntax = False  # COPY ... FROM STDIN is used by Entity.bulk_insert()
+    insert_returning_syntax = False
 
     # SQLite and PostgreSQL does not limit varchar max length.
     varchar_default_max_len = None
@@ -122,12 +151,24 @@ class DBAPIProvider(object):
 
     fk_types = { 'SERIAL' : 'INTEGER', 'BIGSERIAL' : 'BIGINT' }
 
+    shared_pool_options = {
+        'pool_size': 'size', 'pool_min_size': 'min_size', 'pool_timeout': 'timeout',
+        'pool_max_idle_time': 'max_idle_time', 'pool_max_lifetime': 'max_lifetime', 'pool_pre_ping': 'pre_ping'
+    }
+
     def __init__(provider, _database, *args, **kwargs):
         provider.database = _database
         pool_mockup = kwargs.pop('pony_pool_mockup', None)
         call_on_connect = kwargs.pop('pony_call_on_connect', None)
+        pool_options = {}
+        for name, option in provider.shared_pool_options.items():
+            if name in kwargs: pool_options[option] = kwargs.pop(name)
+        if pool_options and 'size' not in pool_options:
+            throw(TypeError, 'pool_size must be specified in order to use shared connection pool')
         if pool_mockup: provider.pool = pool_mockup
-        else: provider.pool = provider.get_pool(*args, **kwargs)
+        else:
+            provider.pool = provider.get_pool(*args, **kwargs)
+            if pool_options: provider.pool = provider.get_shared_pool(provider.pool, **pool_options)
         connection, is_new_connection = provider.connect()
         if call_on_connect:
             call_on_connect(connection)
@@ -227,7 +268,7 @@ class DBAPIProvider(object):
         return False
 
     @wrap_dbapi_exceptions
-    def connect(provider):
+    def connect(provider, cache=None):
         return provider.pool.connect()
 
     @wrap_dbapi_exceptions
@@ -270,6 +311,11 @@ class DBAPIProvider(object):
         if core.local.debug: core.log_orm('DISCONNECT')
         provider.pool.disconnect()
 
+    @wrap_dbapi_exceptions
+    def get_streaming_cursor(provider, connection, batch_size):
+        # Cursor which is used by Query.stream(); rows are retrieved from it by fetchmany() calls
+        return connection.cursor()
+
     @wrap_dbapi_exceptions
     def execute(provider, cursor, sql, arguments=None, returning_id=False):
         if type(arguments) is list:
@@ -280,6 +326,13 @@ class DBAPIProvider(object):
             else: cursor.execute(sql, arguments)
             if returning_id: return cursor.lastrowid
 
+    def get_copy_sql(provider, table_name, columns):
+        quote_name = provider.quote_name
+        return 'COPY %s (%s) FROM STDIN' % (quote_name(table_name), ', '.join(map(quote_name, columns)))
+
+    def copy_from(provider, cursor, sql, converters, rows):
+        throw(NotImplementedError)
+
     converter_classes = []
 
     def _get_converter_type_by_py_type(provider, py_type):
@@ -307,6 +360,9 @@ class DBAPIProvider(object):
     def get_pool(provider, *args, **kwargs):
         return Pool(provider.dbapi_module, *args, **kwargs)
 
+    def get_shared_pool(provider, local_pool, size, **kwargs):
+        return SharedPool(local_pool, size, **kwargs)
+
     def table_exists(provider, connection, table_name, case_sensitive=True):
         throw(NotImplementedError)
 
@@ -316,6 +372,11 @@ class DBAPIProvider(object):
     def fk_exists(provider, connection, table_name, fk_name, case_sensitive=True):
         throw(NotImplementedError)
 
+    def get_catalog(provider, connection, schema_names):
+        # returns (kind, schema_name, table_name, name) rows for tables, columns, indexes and foreign keys
+        # of the given schemata, or None if each object should be checked separately
+        return None
+
     def table_has_data(provider, connection, table_name):
         cursor = connection.cursor()
         cursor.execute('SELECT 1 FROM %s LIMIT 1' % provider.quote_name(table_name))
@@ -371,6 +432,203 @@ class Pool(localbase):
         pool.con = None
         if con is not None: con.close()
 
+class SharedPool(object):
+    # Bounded pool of connections shared between all threads. Dialect-specific
+    # logic of opening and resetting connections is delegated to the thread-local
+    # pool which is used as a connection factory only
+    forked_connections = []
+    def __init__(pool, local_pool, size, min_size=0, timeout=None,
+                 max_idle_time=None, max_lifetime=None, pre_ping=False):
+        if not isinstance(size, int) or size < 1:
+            throw(ValueError, 'pool_size must be positive integer. Got: %r' % size)
+        if not isinstance(min_size, int) or not 0 <= min_size <= size:
+            throw(ValueError, 'pool_min_size must be integer in range 0..%d. Got: %r' % (size, min_size))
+        for name, value in (('pool_timeout', timeout), ('pool_max_idle_time', max_idle_time),
+                            ('pool_max_lifetime', max_lifetime)):
+            if value is not None and (not isinstance(value, (int, float)) or value < 0):
+                throw(ValueError, '%s must be non-negative number. Got: %r' % (name, value))
+        pool.local_pool = local_pool
+        pool.max_size = size
+        pool.min_size = min_size
+        pool.timeout = timeout
+        pool.max_idle_time = max_idle_time
+        pool.max_lifetime = max_lifetime
+        pool.pre_ping = pre_ping
+        pool.pid = os.getpid()
+        pool.cond = Condition(Lock())
+        pool.idle = []  # entries [con, created_at, last_used_at, is_new], the most recently used at the end
+        pool.in_use = {}  # id(con) -> entry
+        pool.opening = 0
+        pool._stats = dict.fromkeys(('checkouts', 'waits', 'timeouts', 'created', 'closed',
+                                     'idle_evictions', 'lifetime_evictions', 'failed_pings'), 0)
+        pool._stats.update(wait_time=0.0, max_wait_time=0.0)
+        for i in range(min_size):
+            entry = pool._open()
+            pool._put_back(entry)
+    @property
+    def size(pool):
+        return len(pool.idle) + len(pool.in_use) + pool.opening
+    @property
+    def stats(pool):
+        with pool.cond:
+            result = dict(pool._stats)
+            result.update(size=pool.size, idle=len(pool.idle), in_use=len(pool.in_use), max_size=pool.max_size)
+        return result
+    def connect(pool):
+        core = pony.orm.core
+        start = monotonic()
+        while True:
+            entry = pool._acquire(start)
+            if entry is None:
+                if core.local.debug: core.log_orm('GET NEW CONNECTION')
+                entry = pool._open(checkout=True)
+            elif pool.pre_ping and not pool._ping(entry[0]):
+                pool._discard(entry[0], 'failed_pings')
+                continue
+            elif core.local.debug: core.log_orm('GET CONNECTION FROM THE SHARED POOL')
+            break
+        is_new_connection = entry[3]
+        entry[3] = False
+        return entry[0], is_new_connection
+    def _acquire(pool, start):
+        cond = pool.cond
+        to_close = []
+        waited = False
+        try:
+            with cond:
+                if pool.pid != os.getpid(): pool._forget_after_fork()
+                timeout = pool.timeout
+                while True:
+                    now = monotonic()
+                    pool._evict(now, to_close)
+                    if pool.idle:
+                        entry = pool.idle.pop()
+                        pool.in_use[id(entry[0])] = entry
+                        break
+                    if pool.size < pool.max_size:
+                        entry = None
+                        pool.opening += 1
+                        break
+                    if timeout is not None and now - start >= timeout:
+                        pool._stats['timeouts'] += 1
+                        throw(PoolTimeoutError, None, 'Timed out after %.2f seconds waiting for a connection '
+                                                      'from the pool of size %d' % (now - start, pool.max_size))
+                    waited = True
+                    cond.wait(None if timeout is None else timeout - (now - start))
+                stats = pool._stats
+                stats['checkouts'] += 1
+                if waited:
+                    wait_time = now - start
+                    stats['waits'] += 1
+                    stats['wait_time'] += wait_time
+                    stats['max_wait_time'] = max(stats['max_wait_time'], wait_time)
+                return entry
+        finally:
+            for con in to_close: pool._close(con)
+    def _open(pool, checkout=False):
+        local_pool = pool.local_pool
+        if not checkout:
+            with pool.cond: pool.opening += 1
+        try:
+            local_pool._connect()
+            con = local_pool.con
+        except:
+            with pool.cond:
+                pool.opening -= 1
+                pool.cond.notify()
+            raise
+        finally: local_pool.con = None
+        now = monotonic()
+        entry = [ con, now, now, True ]
+        with pool.cond:
+            pool.opening -= 1
+            pool.in_use[id(con)] = entry
+            pool._stats['created'] += 1
+        return entry
+    def _ping(pool, con):
+        try:
+            cursor = con.cursor()
+            cursor.execute('SELECT 1')
+            cursor.fetchone()
+        except Exception: return False
+        return True
+    def _evict(pool, now, to_close):
+        max_idle_time = pool.max_idle_time
+        max_lifetime = pool.max_lifetime
+        if max_idle_time is None and max_lifetime is None: return
+        idle = pool.idle
+        stats = pool._stats
+        i = 0
+        while i < len(idle):
+            con, created_at, last_used_at, is_new = idle[i]
+            if max_lifetime is not None and now - created_at >= max_lifetime: stats['lifetime_evictions'] += 1
+            elif max_idle_time is not None and now - last_used_at >= max_idle_time \
+                    and pool.size > pool.min_size: stats['idle_evictions'] += 1
+            else:
+                i += 1
+                continue
+            del idle[i]
+            to_close.append(con)
+    def _put_back(pool, entry):
+        con = entry[0]
+        now = monotonic()
+        with pool.cond:
+            if pool.in_use.pop(id(con), None) is None: return
+            if pool.max_lifetime is not None and now - entry[1] >= pool.max_lifetime:
+                pool._stats['lifetime_evictions'] += 1
+            else:
+                entry[2] = now
+                pool.idle.append(entry)
+                con = None
+            pool.cond.notify()
+        if con is not None: pool._close(con)
+    def _discard(pool, con, reason=None):
+        with pool.cond:
+            pool.in_use.pop(id(con), None)
+            if reason is not None: pool._stats[reason] += 1
+            pool.cond.notify()
+        pool._close(con)
+    def _close(pool, con):
+        with pool.cond: pool._stats['closed'] += 1
+        try: con.close()
+        except Exception: pass
+    def _forget_after_fork(pool):
+        pool.forked_connections.extend((entry[0], pool.pid) for entry in pool.idle)
+        pool.forked_connections.extend((entry[0], pool.pid) for entry in pool.in_use.values())
+        pool.idle = []
+        pool.in_use = {}
+        pool.opening = 0
+        pool.pid = os.getpid()
+    def release(pool, con):
+        entry = pool.in_use.get(id(con))
+        if entry is None: return  # connection was opened before fork
+        local_pool = pool.local_pool
+        local_pool.con = con
+        try: local_pool.release(con)  # closes connection if it cannot be reset
+        except:
+            with pool.cond:
+                pool.in_use.pop(id(con), None)
+                pool._stats['closed'] += 1
+                pool.cond.notify()
+            raise
+        finally: local_pool.con = None
+        pool._put_back(entry)
+    def drop(pool, con):
+        with pool.cond:
+            pool.in_use.pop(id(con), None)
+            pool._stats['closed'] += 1
+            pool.cond.notify()
+        local_pool = pool.local_pool
+        local_pool.con = con
+        try: local_pool.drop(con)
+        finally: local_pool.con = None
+    def disconnect(pool):
+        with pool.cond:
+            idle = pool.idle
+            pool.idle = []
+            pool.cond.notify_all()
+        for entry in idle: pool._close(entry[0])
+
 class Converter(object):
     EQ = 'EQ'
     NE = 'NE'
@@ -25,6 +25,7 @@ from pony.orm.dbproviders.postgres import (
 from pony.orm import core, dbapiprovider, ormtypes
 from pony.orm.core import log_orm
 from pony.orm.dbapiprovider import wrap_dbapi_exceptions
+from pony.utils import throw
 
 NoneType = type(None)
 
@@ -72,12 +73,22 @@ class CRProvider(PGProvider):
     array_converter_cls = CRArrayConverter
 
     default_schema_name = 'public'
+    insert_returning_syntax = False  # unique_rowid() values do not follow the order of inserted rows
 
     fk_types = { 'SERIAL' : 'INT8' }
 
+    def __init__(provider, *args, **kwargs):
+        if kwargs.get('prepare_threshold') is not None:
+            throw(TypeError, 'CockroachDB does not support prepared statements, prepare_threshold must be None')
+        PGProvider.__init__(provider, *args, **kwargs)
+
     def normalize_name(provider, name):
         return name[:provider.max_name_len].lower()
 
+    @wrap_dbapi_exceptions
+    def get_streaming_cursor(provider, connection, batch_size):
+        return connection.cursor()  # CockroachDB does not support WITH HOLD cursors
+
     @wrap_dbapi_exceptions
     def set_transaction_mode(provider, connection, cache):
         assert not cache.in_transaction
@@ -60,6 +60,13 @@ class MySQLValue(Value):
 class MySQLBuilder(SQLBuilder):
     dialect = 'MySQL'
     value_class = MySQLValue
+    def UPSERT(builder, table_name, columns, rows, conflict_columns, update_columns):
+        quote_name = builder.quote_name
+        # MySQL uses any unique key for conflict detection; when nothing should be updated,
+        # no-op assignment is used instead of INSERT IGNORE, which suppresses other errors too
+        if not update_columns: assignments = [ (quote_name(conflict_columns[0]), ' = ', quote_name(conflict_columns[0])) ]
+        else: assignments = [ (quote_name(column), ' = VALUES(', quote_name(column), ')') for column in update_columns ]
+        return builder.INSERT_MANY(table_name, columns, rows), ' ON DUPLICATE KEY UPDATE ', join(', ', assignments)
     def CONCAT(builder, *args):
         return 'concat(',  join(', ', map(builder, args)), ')'
     def TRIM(builder, expr, chars=None):
@@ -335,6 +342,23 @@ class MySQLProvider(DBAPIProvider):
         row = cursor.fetchone()
         return row[0] if row is not None else None
 
+    def get_catalog(provider, connection, schema_names):
+        if None in schema_names: return None
+        schema_names = sorted(schema_names)
+        cond = 'table_schema IN (%s)' % ', '.join(['%s'] * len(schema_names))
+        sql = "SELECT 'table', table_schema, table_name, table_name FROM information_schema.tables " \
+              'WHERE ' + cond + ' ' \
+              "UNION ALL SELECT 'column', table_schema, table_name, column_name FROM information_schema.columns " \
+              'WHERE ' + cond + ' ' \
+              "UNION ALL SELECT 'index', table_schema, table_name, index_name FROM information_schema.statistics " \
+              'WHERE ' + cond + ' ' \
+              "UNION ALL SELECT 'fk', table_schema, table_name, constraint_name " \
+              'FROM information_schema.table_constraints ' \
+              "WHERE " + cond + " and constraint_type='FOREIGN KEY'"
+        cursor = connection.cursor()
+        cursor.execute(sql, schema_names * 4)
+        return cursor.fetchall()
+
 provider_cls = MySQLProvider
 
 def str2datetime(s):
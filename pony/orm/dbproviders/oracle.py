@@ -15,7 +15,7 @@ from pony.orm import core, dbapiprovider, sqltranslation
 from pony.orm.core import log_orm, log_sql, DatabaseError, TranslationError
 from pony.orm.dbschema import DBSchema, DBObject, Table, Column
 from pony.orm.ormtypes import Json
-from pony.orm.sqlbuilding import SQLBuilder
+from pony.orm.sqlbuilding import SQLBuilder, join
 from pony.orm.dbapiprovider import DBAPIProvider, wrap_dbapi_exceptions, get_version_tuple
 from pony.utils import throw, is_ident
 
@@ -125,6 +125,20 @@ class OraTranslator(sqltranslation.SQLTranslator):
 
 class OraBuilder(SQLBuilder):
     dialect = 'Oracle'
+    def UPSERT(builder, table_name, columns, rows, conflict_columns, update_columns):
+        quote_name = builder.quote_name
+        source = join(' UNION ALL ', [ ('SELECT ', join(', ', [ (builder(value), ' ', quote_name(column))
+                                                                for value, column in zip(row, columns) ]), ' FROM DUAL')
+                                       for row in rows ])
+        result = [ 'MERGE INTO ', quote_name(table_name), ' t USING (', source, ') s ON (',
+                   join(' AND ', [ ('t.', quote_name(column), ' = s.', quote_name(column))
+                                   for column in conflict_columns ]), ')' ]
+        if update_columns:
+            result.extend([ ' WHEN MATCHED THEN UPDATE SET ', join(', ', [ ('t.', quote_name(column), ' = s.', quote_name(column))
+                                                                          for column in update_columns ]) ])
+        result.extend([ ' WHEN NOT MATCHED THEN INSERT (', join(', ', [ quote_name(column) for column in columns ]),
+                        ') VALUES (', join(', ', [ ('s.', quote_name(column)) for column in columns ]), ')' ])
+        return result
     def INSERT(builder, table_name, columns, values, returning=None):
         result = SQLBuilder.INSERT(builder, table_name, columns, values)
         if returning is not None:
@@ -387,10 +401,12 @@ class OraProvider(DBAPIProvider):
     dialect = 'Oracle'
     paramstyle = 'named'
     max_name_len = 30
+    max_in_list_size = 1000  # ORA-01795
     table_if_not_exists_syntax = False
     index_if_not_exists_syntax = False
     varchar_default_max_len = 1000
     uint64_support = True
+    multi_row_insert_syntax = False
 
     dbapi_module = cx_Oracle
     dbschema_cls = OraSchema
@@ -504,6 +520,10 @@ class OraProvider(DBAPIProvider):
         kwargs.setdefault('increment', 1)
         return OraPool(**kwargs)
 
+    def get_shared_pool(provider, local_pool, size, **kwargs):
+        throw(TypeError, 'Oracle provider always uses cx_Oracle.SessionPool. '
+                         'Specify its `min` and `max` parameters instead of pool_size')
+
     def table_exists(provider, connection, table_name, case_sensitive=True):
         owner_name, table_name = provider.split_table_name(table_name)
         cursor = connection.cursor()
@@ -538,6 +558,21 @@ class OraProvider(DBAPIProvider):
         row = cursor.fetchone()
         return row[0] if row is not None else None
 
+    def get_catalog(provider, connection, schema_names):
+        if None in schema_names: return None
+        params = dict(('o%d' % i, name) for i, name in enumerate(sorted(schema_names)))
+        cond = 'IN (%s)' % ', '.join(':' + key for key in sorted(params))
+        sql = "SELECT 'table', owner, table_name, table_name FROM all_tables WHERE owner " + cond + ' ' \
+              "UNION ALL SELECT 'column', owner, table_name, column_name FROM all_tab_columns " \
+              'WHERE owner ' + cond + ' ' \
+              "UNION ALL SELECT 'index', table_owner, table_name, index_name FROM all_indexes " \
+              'WHERE owner ' + cond + ' AND table_owner = owner ' \
+              "UNION ALL SELECT 'fk', owner, table_name, constraint_name FROM all_constraints " \
+              "WHERE constraint_type = 'R' AND owner " + cond
+        cursor = connection.cursor()
+        cursor.execute(sql, params)
+        return [ (kind.rstrip(), owner, table_name, name) for kind, owner, table_name, name in cursor.fetchall() ]
+
     def table_has_data(provider, connection, table_name):
         cursor = connection.cursor()
         cursor.execute('SELECT 1 FROM %s WHERE ROWNUM = 1' % provider.quote_name(table_name))
@@ -1,9 +1,15 @@
 from __future__ import absolute_import
 from pony.py23compat import buffer, int_types
 
+import itertools
+from binascii import hexlify
+from collections import OrderedDict
+from io import StringIO
 from decimal import Decimal
 from datetime import datetime, date, time, timedelta
+from threading import Lock
 from uuid import UUID
+from weakref import WeakKeyDictionary
 
 try:
     import psycopg2
@@ -25,11 +31,11 @@ psycopg2.extras.register_default_jsonb(loads=lambda x: x)
 
 from pony.orm import core, dbschema, dbapiprovider, sqltranslation, ormtypes
 from pony.orm.core import log_orm
-from pony.orm.dbapiprovider import DBAPIProvider, Pool, wrap_dbapi_exceptions
+from pony.orm.dbapiprovider import DBAPIProvider, Pool, wrap_dbapi_exceptions, convert_to_prepared
 from pony.orm.sqltranslation import SQLTranslator
 from pony.orm.sqlbuilding import Value, SQLBuilder, join
 from pony.converting import timedelta2str
-from pony.utils import is_ident
+from pony.utils import is_ident, throw
 
 NoneType = type(None)
 
@@ -59,6 +65,10 @@ class PGSQLBuilder(SQLBuilder):
         else: result = SQLBuilder.INSERT(builder, table_name, columns, values)
         if returning is not None: result.extend([' RETURNING ', builder.quote_name(returning) ])
         return result
+    def INSERT_MANY(builder, table_name, columns, rows, returning=None):
+        result = SQLBuilder.INSERT_MANY(builder, table_name, columns, rows)
+        if returning is not None: result.extend([' RETURNING ', builder.quote_name(returning) ])
+        return result
     def TO_INT(builder, expr):
         return '(', builder(expr), ')::int'
     def TO_STR(builder, expr):
@@ -170,6 +180,9 @@ class PGArrayConverter(dbapiprovider.ArrayConverter):
     }
 
 class PGPool(Pool):
+    def __init__(pool, dbapi_module, reset_sql, *args, **kwargs): # called separately in each thread
+        Pool.__init__(pool, dbapi_module, *args, **kwargs)
+        pool.reset_sql = reset_sql
     def _connect(pool):
         pool.con = pool.dbapi_module.connect(*pool.args, **pool.kwargs)
         if 'client_encoding' not in pool.kwargs:
@@ -180,7 +193,7 @@ class PGPool(Pool):
             con.rollback()
             con.autocommit = True
             cursor = con.cursor()
-            cursor.execute('DISCARD ALL')
+            cursor.execute(pool.reset_sql)
             con.autocommit = False
         except:
             pool.drop(con)
@@ -189,6 +202,29 @@ class PGPool(Pool):
 
 ADMIN_SHUTDOWN = '57P01'
 
+# The same as DISCARD ALL, but keeps prepared statements and cached plans of the connection
+LIGHT_RESET_SQL = 'CLOSE ALL; SET SESSION AUTHORIZATION DEFAULT; RESET ALL; UNLISTEN *; ' \
+                  'SELECT pg_advisory_unlock_all(); DISCARD TEMP; DISCARD SEQUENCES'
+
+copy_escapes = { ord('\\'): '\\\\', ord('\n'): '\\n', ord('\r'): '\\r', ord('\t'): '\\t' }
+
+def copy_array_item(item):
+    if item is None: return 'NULL'
+    if isinstance(item, str): return '"%s"' % item.replace('\\', '\\\\').replace('"', '\\"')
+    return str(item)
+
+def copy_value(value):
+    # text format of COPY ... FROM STDIN
+    if value is None: return '\\N'
+    if isinstance(value, str): return value.translate(copy_escapes)
+    if isinstance(value, bool): return 't' if value else 'f'
+    if isinstance(value, (bytes, bytearray, memoryview)): return '\\\\x' + hexlify(value).decode('ascii')
+    if isinstance(value, timedelta): return timedelta2str(value)
+    if isinstance(value, (datetime, date, time)): return value.isoformat()
+    if isinstance(value, (list, tuple)):
+        return ('{%s}' % ','.join(map(copy_array_item, value))).translate(copy_escapes)
+    return str(value).translate(copy_escapes)
+
 
 class PGProvider(DBAPIProvider):
     dialect = 'PostgreSQL'
@@ -196,6 +232,8 @@ class PGProvider(DBAPIProvider):
     max_name_len = 63
     max_params_count = 10000
     index_if_not_exists_syntax = False
+    insert_returning_syntax = True
+    copy_from_syntax = True
 
     dbapi_module = psycopg2
     dbschema_cls = PGSchema
@@ -204,9 +242,25 @@ class PGProvider(DBAPIProvider):
     array_converter_cls = PGArrayConverter
 
     default_schema_name = 'public'
+    stream_counter = itertools.count(1)
+    prepared_statement_counter = itertools.count(1)
+    preparable_commands = 'SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH'
 
     fk_types = { 'SERIAL' : 'INTEGER', 'BIGSERIAL' : 'BIGINT' }
 
+    def __init__(provider, *args, **kwargs):
+        prepare_threshold = kwargs.pop('prepare_threshold', None)
+        max_prepared_statements = kwargs.pop('max_prepared_statements', 100)
+        if prepare_threshold is not None and (not isinstance(prepare_threshold, int_types) or prepare_threshold < 0):
+            throw(ValueError, 'prepare_threshold must be non-negative integer or None. Got: %r' % prepare_threshold)
+        if not isinstance(max_prepared_statements, int_types) or max_prepared_statements < 1:
+            throw(ValueError, 'max_prepared_statements must be positive integer. Got: %r' % max_prepared_statements)
+        provider.prepare_threshold = prepare_threshold
+        provider.max_prepared_statements = max_prepared_statements
+        provider.prepared_statements = WeakKeyDictionary()  # connection -> OrderedDict(sql -> execute_sql)
+        provider.prepared_statements_lock = Lock()
+        DBAPIProvider.__init__(provider, *args, **kwargs)
+
     def normalize_name(provider, name):
         return name[:provider.max_name_len].lower()
 
@@ -220,7 +274,8 @@ class PGProvider(DBAPIProvider):
                and exc.pgcode in (None, ADMIN_SHUTDOWN)
 
     def get_pool(provider, *args, **kwargs):
-        return PGPool(provider.dbapi_module, *args, **kwargs)
+        reset_sql = 'DISCARD ALL' if provider.prepare_threshold is None else LIGHT_RESET_SQL
+        return PGPool(provider.dbapi_module, reset_sql, *args, **kwargs)
 
     @wrap_dbapi_exceptions
     def set_transaction_mode(provider, connection, cache):
@@ -240,16 +295,71 @@ class PGProvider(DBAPIProvider):
         if db_session is not None and (db_session.serializable or db_session.ddl):
             cache.in_transaction = True
 
+    @wrap_dbapi_exceptions
+    def get_streaming_cursor(provider, connection, batch_size):
+        # Named cursor is a server-side cursor, so rows are transferred from the server in batches.
+        # In autocommit mode the cursor should be declared WITH HOLD in order to outlive the implicit transaction
+        name = 'pony_stream_%d' % next(provider.stream_counter)
+        cursor = connection.cursor(name=name, withhold=connection.autocommit)
+        cursor.itersize = batch_size
+        return cursor
+
     @wrap_dbapi_exceptions
     def execute(provider, cursor, sql, arguments=None, returning_id=False):
         if type(arguments) is list:
             assert arguments and not returning_id
             cursor.executemany(sql, arguments)
         else:
+            if provider.prepare_threshold is not None and not cursor.name:
+                sql = provider._get_prepared_sql(cursor, sql, arguments is not None)
             if arguments is None: cursor.execute(sql)
             else: cursor.execute(sql, arguments)
             if returning_id: return cursor.fetchone()[0]
 
+    @wrap_dbapi_exceptions
+    def copy_from(provider, cursor, sql, converters, rows):
+        data = StringIO()
+        for row in rows:
+            data.write('\t'.join([ copy_value(converter.py2sql(value) if value is not None else None)
+                                   for converter, value in zip(converters, row) ]))
+            data.write('\n')
+        data.seek(0)
+        cursor.copy_expert(sql, data)
+
+    def _get_prepared_sql(provider, cursor, sql, has_arguments):
+        # Statements which were executed at least prepare_threshold times in the current thread
+        # are prepared once per physical connection and then executed by name
+        stat = provider.database._dblocal.stats.get(sql)
+        if stat is None or stat.db_count < provider.prepare_threshold: return sql
+        connection = cursor.connection
+        with provider.prepared_statements_lock:
+            statements = provider.prepared_statements.get(connection)
+            if statements is None: statements = provider.prepared_statements[connection] = OrderedDict()
+        execute_sql = statements.get(sql, False)
+        if execute_sql is not False:
+            statements.move_to_end(sql)
+            return execute_sql or sql
+        if not sql.lstrip()[:6].upper().startswith(provider.preparable_commands):
+            statements[sql] = None
+            return sql
+        name = 'pony_stmt_%d' % next(provider.prepared_statement_counter)
+        prepare_sql, execute_sql = convert_to_prepared(name, sql, has_arguments)
+        if len(statements) >= provider.max_prepared_statements:
+            old_sql, old_execute_sql = statements.popitem(last=False)
+            if old_execute_sql is not None: cursor.execute('DEALLOCATE %s' % old_execute_sql.split()[1])
+        # PREPARE is not transactional, but its failure aborts the current transaction
+        in_transaction = not connection.autocommit
+        if in_transaction: cursor.execute('SAVEPOINT pony_prepare')
+        try: cursor.execute(prepare_sql)
+        except psycopg2.Error:
+            if in_transaction: cursor.execute('ROLLBACK TO SAVEPOINT pony_prepare')
+            statements[sql] = None  # the statement cannot be prepared, e.g. type of parameter is ambiguous
+            return sql
+        if in_transaction: cursor.execute('RELEASE SAVEPOINT pony_prepare')
+        if core.local.debug: log_orm(prepare_sql)
+        statements[sql] = execute_sql
+        return execute_sql
+
     def table_exists(provider, connection, table_name, case_sensitive=True):
         schema_name, table_name = provider.split_table_name(table_name)
         cursor = connection.cursor()
@@ -289,6 +399,25 @@ class PGProvider(DBAPIProvider):
         row = cursor.fetchone()
         return row[0] if row is not None else None
 
+    def get_catalog(provider, connection, schema_names):
+        if None in schema_names: return None
+        sql = "SELECT 'table', schemaname, tablename, tablename FROM pg_catalog.pg_tables " \
+              'WHERE schemaname = ANY(%(s)s) ' \
+              "UNION ALL SELECT 'column', ns.nspname, cls.relname, att.attname FROM pg_catalog.pg_attribute att " \
+              'JOIN pg_catalog.pg_class cls ON att.attrelid = cls.oid ' \
+              'JOIN pg_catalog.pg_namespace ns ON cls.relnamespace = ns.oid ' \
+              "WHERE ns.nspname = ANY(%(s)s) AND cls.relkind IN ('r', 'p') " \
+              'AND att.attnum > 0 AND NOT att.attisdropped ' \
+              "UNION ALL SELECT 'index', schemaname, tablename, indexname FROM pg_catalog.pg_indexes " \
+              'WHERE schemaname = ANY(%(s)s) ' \
+              "UNION ALL SELECT 'fk', ns.nspname, cls.relname, con.conname FROM pg_catalog.pg_class cls " \
+              'JOIN pg_catalog.pg_namespace ns ON cls.relnamespace = ns.oid ' \
+              'JOIN pg_catalog.pg_constraint con ON con.conrelid = cls.oid ' \
+              "WHERE ns.nspname = ANY(%(s)s) AND con.contype = 'f'"
+        cursor = connection.cursor()
+        cursor.execute(sql, dict(s=sorted(schema_names)))
+        return cursor.fetchall()
+
     def drop_table(provider, connection, table_name):
         cursor = connection.cursor()
         sql = 'DROP TABLE %s CASCADE' % provider.quote_name(table_name)
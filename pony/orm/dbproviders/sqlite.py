@@ -78,6 +78,10 @@ class SQLiteBuilder(SQLBuilder):
     def INSERT(builder, table_name, columns, values, returning=None):
         if not values: return 'INSERT INTO %s DEFAULT VALUES' % builder.quote_name(table_name)
         return SQLBuilder.INSERT(builder, table_name, columns, values, returning)
+    def INSERT_MANY(builder, table_name, columns, rows, returning=None):
+        result = SQLBuilder.INSERT_MANY(builder, table_name, columns, rows)
+        if returning is not None: result.extend([' RETURNING ', builder.quote_name(returning) ])
+        return result
     def STRING_SLICE(builder, expr, start, stop):
         if start is None:
             start = [ 'VALUE', None ]
@@ -318,8 +322,10 @@ class SQLiteProvider(DBAPIProvider):
     array_converter_cls = SQLiteArrayConverter
 
     name_before_table = 'db_name'
+    read_pool = None
 
     server_version = sqlite.sqlite_version_info
+    insert_returning_syntax = sqlite.sqlite_version_info >= (3, 35)
 
     converter_classes = [
         (NoneType, dbapiprovider.NoneConverter),
@@ -342,6 +348,8 @@ class SQLiteProvider(DBAPIProvider):
         if is_shared_memory_db:
             filename = "file:memdb%d_%s?mode=memory&cache=shared" % (database.id, os.urandom(8).hex())
             kwargs["uri"] = True
+        if 'pool_size' in kwargs:
+            kwargs.setdefault('check_same_thread', False)
         DBAPIProvider.__init__(provider, database, is_shared_memory_db, filename, **kwargs)
         provider.pre_transaction_lock = Lock()
         provider.transaction_lock = Lock()
@@ -356,6 +364,20 @@ class SQLiteProvider(DBAPIProvider):
             try: reraise(*provider.local_exceptions.exc_info)
             finally: provider.local_exceptions.exc_info = None
 
+    @wrap_dbapi_exceptions
+    def connect(provider, cache=None):
+        # In WAL mode read-only db_sessions use separate connections, so they neither wait
+        # for the transaction lock nor keep connection which is used by writing db_sessions
+        read_pool = provider.read_pool
+        if read_pool is not None and cache is not None and not cache.immediate:
+            db_session = cache.db_session
+            if db_session is not None and db_session.readonly: return read_pool.connect()
+        return provider.pool.connect()
+
+    def is_read_connection(provider, connection):
+        read_pool = provider.read_pool
+        return read_pool is not None and read_pool.con is connection
+
     def acquire_lock(provider):
         provider.pre_transaction_lock.acquire()
         try:
@@ -369,6 +391,8 @@ class SQLiteProvider(DBAPIProvider):
     @wrap_dbapi_exceptions
     def set_transaction_mode(provider, connection, cache):
         assert not cache.in_transaction
+        if cache.immediate and provider.is_read_connection(connection):
+            throw(core.TransactionError, 'Transaction cannot be started inside of read-only db_session')
         if cache.immediate:
             provider.acquire_lock()
         try:
@@ -415,6 +439,11 @@ class SQLiteProvider(DBAPIProvider):
                 provider.release_lock()
 
     def drop(provider, connection, cache=None):
+        if provider.is_read_connection(connection):
+            if core.local.debug: log_orm('CLOSE CONNECTION')
+            provider.read_pool.drop(connection)
+            if cache is not None: cache.in_transaction = False
+            return
         in_transaction = cache is not None and cache.in_transaction
         try:
             DBAPIProvider.drop(provider, connection, cache)
@@ -425,6 +454,9 @@ class SQLiteProvider(DBAPIProvider):
 
     @wrap_dbapi_exceptions
     def release(provider, connection, cache=None):
+        if provider.is_read_connection(connection):
+            if core.local.debug: log_orm('RELEASE CONNECTION')
+            return provider.read_pool.release(connection)
         if cache is not None:
             db_session = cache.db_session
             if db_session is not None and db_session.ddl and cache.saved_fk_state:
@@ -456,7 +488,24 @@ class SQLiteProvider(DBAPIProvider):
             # 1 - SQLiteProvider.__init__()
             # 0 - pony.dbproviders.sqlite.get_pool()
             filename = absolutize_path(filename, frame_depth=cut_traceback_depth+5)
-        return SQLitePool(is_shared_memory_db, filename, create_db, **kwargs)
+        wal = kwargs.get('wal', False)
+        if wal and (is_shared_memory_db or filename == ':memory:'):
+            throw(TypeError, 'WAL mode cannot be used with in-memory SQLite database')
+        busy_timeout = kwargs.get('busy_timeout')
+        if busy_timeout is not None and (not isinstance(busy_timeout, int) or busy_timeout < 0):
+            throw(ValueError, 'busy_timeout must be non-negative number of milliseconds. Got: %r' % busy_timeout)
+        pool = SQLitePool(is_shared_memory_db, filename, create_db, **kwargs)
+        if wal: provider.read_pool = SQLitePool(is_shared_memory_db, filename, create_db, query_only=True, **kwargs)
+        return pool
+
+    def disconnect(provider):
+        DBAPIProvider.disconnect(provider)
+        if provider.read_pool is not None: provider.read_pool.disconnect()
+
+    def get_shared_pool(provider, local_pool, size, **kwargs):
+        if local_pool.is_shared_memory_db or local_pool.filename == ':memory:':
+            throw(TypeError, 'Shared connection pool cannot be used with in-memory SQLite database')
+        return DBAPIProvider.get_shared_pool(provider, local_pool, size, **kwargs)
 
     def table_exists(provider, connection, table_name, case_sensitive=True):
         return provider._exists(connection, table_name, None, case_sensitive)
@@ -486,6 +535,21 @@ class SQLiteProvider(DBAPIProvider):
     def fk_exists(provider, connection, table_name, fk_name):
         assert False  # pragma: no cover
 
+    def get_catalog(provider, connection, schema_names):
+        if sqlite.sqlite_version_info < (3, 16): return None  # table-valued pragma functions are not supported
+        result = []
+        cursor = connection.cursor()
+        for db_name in schema_names:
+            if db_name is None: catalog_name = 'sqlite_master'
+            else: catalog_name = (db_name, 'sqlite_master')
+            catalog_name = provider.quote_name(catalog_name)
+            sql = "SELECT type, tbl_name, name FROM %s WHERE type IN ('table', 'index') " \
+                  "UNION ALL SELECT 'column', m.name, p.name FROM %s m, pragma_table_info(m.name, ?) p " \
+                  "WHERE m.type = 'table'" % (catalog_name, catalog_name)
+            cursor.execute(sql, [ db_name or 'main' ])
+            result.extend((kind, db_name, table_name, name) for kind, table_name, name in cursor.fetchall())
+        return result
+
     def check_json1(provider, connection):
         cursor = connection.cursor()
         sql = '''
@@ -651,10 +715,14 @@ def py_string_slice(s, start, end):
     return s[start:end]
 
 class SQLitePool(Pool):
-    def __init__(pool, is_shared_memory_db, filename, create_db, **kwargs): # called separately in each thread
+    def __init__(pool, is_shared_memory_db, filename, create_db, wal=False, busy_timeout=None, query_only=False,
+                 **kwargs): # called separately in each thread
         pool.is_shared_memory_db = is_shared_memory_db
         pool.filename = filename
         pool.create_db = create_db
+        pool.wal = wal
+        pool.busy_timeout = busy_timeout
+        pool.query_only = query_only
         pool.kwargs = kwargs
         pool.con = None
     def _connect(pool):
@@ -694,6 +762,12 @@ class SQLitePool(Pool):
             con.execute('PRAGMA foreign_keys = true')
 
         con.execute('PRAGMA case_sensitive_like = true')
+        if pool.busy_timeout is not None:
+            con.execute('PRAGMA busy_timeout = %d' % pool.busy_timeout)
+        if pool.wal and not pool.query_only:
+            con.execute('PRAGMA journal_mode = WAL')
+        if pool.query_only:
+            con.execute('PRAGMA query_only = true')
     def disconnect(pool):
         if pool.is_shared_memory_db or pool.filename == ':memory:':
             pass
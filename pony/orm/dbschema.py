@@ -1,8 +1,10 @@
 from __future__ import absolute_import, print_function, division
 from pony.py23compat import int_types
 
+from hashlib import sha1
 from operator import attrgetter
 
+from pony import options
 from pony.orm import core
 from pony.orm.core import log_sql, DBSchemaError, MappingError
 from pony.utils import throw
@@ -50,12 +52,19 @@ class DBSchema(object):
                 commands.append(db_object.get_create_command())
         return schema.command_separator.join(commands)
     def create_tables(schema, provider, connection):
+        catalog = schema.load_catalog(provider, connection)
         created_tables = set()
+        new_tables = set()
         for table in schema.order_tables_to_create():
             for db_object in table.get_objects_to_create(created_tables):
                 base_name = provider.base_name(db_object.name)
-                name = db_object.exists(provider, connection, case_sensitive=False)
-                if name is None: db_object.create(provider, connection)
+                key = db_object.get_catalog_key(provider)
+                if catalog is None or key is None or key[1:3] in new_tables:
+                    name = db_object.exists(provider, connection, case_sensitive=False)
+                else: name = catalog.get(key)
+                if name is None:
+                    db_object.create(provider, connection)
+                    if key is not None and key[0] == 'table': new_tables.add(key[1:3])
                 elif name != base_name:
                     quote_name = schema.provider.quote_name
                     n1, n2 = quote_name(db_object.name), quote_name(name)
@@ -64,9 +73,11 @@ class DBSchema(object):
                                          '(with a different letter case) already exists in the database. ' \
                                          'Try to delete %s %s first.' % (tn1, n1, tn2, n2, n2, tn2))
     def check_tables(schema, provider, connection):
+        catalog = schema.load_catalog(provider, connection)
         cursor = connection.cursor()
         split = provider.split_table_name
         for table in sorted(schema.tables.values(), key=lambda table: split(table.name)):
+            if catalog is not None and table.is_in_catalog(provider, catalog): continue
             alias = provider.base_name(table.name)
             sql_ast = [ 'SELECT',
                         [ 'ALL', ] + [ [ 'COLUMN', alias, column.name ] for column in table.column_list ],
@@ -76,8 +87,57 @@ class DBSchema(object):
             sql, adapter = provider.ast2sql(sql_ast)
             if core.local.debug: log_sql(sql)
             provider.execute(cursor, sql)
+    def load_catalog(schema, provider, connection):
+        schema_names = { provider.split_table_name(table.name)[0] for table in schema.tables.values() }
+        if not schema_names: return {}
+        rows = provider.get_catalog(connection, schema_names)
+        if rows is None: return None
+        catalog = {}
+        for kind, schema_name, table_name, name in rows:
+            catalog[kind, schema_name, table_name.lower(), name.lower()] = name
+        return catalog
+    def get_fingerprint(schema):
+        created_tables = set()
+        commands = []
+        for table in schema.order_tables_to_create():
+            for db_object in table.get_objects_to_create(created_tables):
+                commands.append(db_object.get_create_command())
+        data = '\n'.join([ schema.provider.dialect ] + sorted(commands))
+        return sha1(data.encode('utf-8')).hexdigest()
+    def check_fingerprint(schema, provider, connection):
+        table_name = options.SCHEMA_FINGERPRINT_TABLE
+        if provider.table_exists(connection, table_name) is None: return False
+        sql_ast = [ 'SELECT', [ 'ALL', [ 'VALUE', 1 ] ], [ 'FROM', [ None, 'TABLE', table_name ] ],
+                    [ 'WHERE', [ 'EQ', [ 'COLUMN', None, 'fingerprint' ], [ 'VALUE', schema.get_fingerprint() ] ] ] ]
+        sql, adapter = provider.ast2sql(sql_ast)
+        if core.local.debug: log_sql(sql)
+        cursor = connection.cursor()
+        provider.execute(cursor, sql)
+        return cursor.fetchone() is not None
+    def store_fingerprint(schema, provider, connection):
+        table_name = options.SCHEMA_FINGERPRINT_TABLE
+        quote_name = provider.quote_name
+        cursor = connection.cursor()
+        if provider.table_exists(connection, table_name) is None:
+            sql = schema.case('CREATE TABLE %s (%s VARCHAR(40) NOT NULL)') \
+                  % (quote_name(table_name), quote_name('fingerprint'))
+            if core.local.debug: log_sql(sql)
+            provider.execute(cursor, sql)
+        elif schema.check_fingerprint(provider, connection): return
+        else: schema.clear_fingerprint(provider, connection)
+        sql, adapter = provider.ast2sql([ 'INSERT', table_name, [ 'fingerprint' ], [ [ 'VALUE', schema.get_fingerprint() ] ] ])
+        if core.local.debug: log_sql(sql)
+        provider.execute(cursor, sql)
+    def clear_fingerprint(schema, provider, connection):
+        table_name = options.SCHEMA_FINGERPRINT_TABLE
+        if provider.table_exists(connection, table_name) is None: return
+        sql, adapter = provider.ast2sql([ 'DELETE', None, [ 'FROM', [ None, 'TABLE', table_name ] ] ])
+        if core.local.debug: log_sql(sql)
+        provider.execute(connection.cursor(), sql)
 
 class DBObject(object):
+    def get_catalog_key(db_object, provider):
+        return None
     def create(table, provider, connection):
         sql = table.get_create_command()
         if core.local.debug: log_sql(sql)
@@ -120,6 +180,15 @@ class Table(DBObject):
         table.entities.add(entity)
     def exists(table, provider, connection, case_sensitive=True):
         return provider.table_exists(connection, table.name, case_sensitive)
+    def get_catalog_key(table, provider):
+        schema_name, table_name = provider.split_table_name(table.name)
+        return 'table', schema_name, table_name.lower(), table_name.lower()
+    def is_in_catalog(table, provider, catalog):
+        kind, schema_name, table_name, name = table.get_catalog_key(provider)
+        if catalog.get((kind, schema_name, table_name, name)) != provider.base_name(table.name): return False
+        for column in table.column_list:
+            if catalog.get(('column', schema_name, table_name, column.name.lower())) != column.name: return False
+        return True
     def get_create_command(table):
         schema = table.schema
         case = schema.case
@@ -314,6 +383,10 @@ class DBIndex(Constraint):
         index.is_unique = is_unique
     def exists(index, provider, connection, case_sensitive=True):
         return provider.index_exists(connection, index.table.name, index.name, case_sensitive)
+    def get_catalog_key(index, provider):
+        if not isinstance(index.name, str): return None
+        schema_name, table_name = provider.split_table_name(index.table.name)
+        return 'index', schema_name, table_name.lower(), index.name.lower()
     def get_sql(index):
         return index._get_create_sql(inside_table=True)
     def get_create_command(index):
@@ -388,6 +461,10 @@ class ForeignKey(Constraint):
 
     def exists(foreign_key, provider, connection, case_sensitive=True):
         return provider.fk_exists(connection, foreign_key.child_table.name, foreign_key.name, case_sensitive)
+    def get_catalog_key(foreign_key, provider):
+        if not isinstance(foreign_key.name, str): return None
+        schema_name, table_name = provider.split_table_name(foreign_key.child_table.name)
+        return 'fk', schema_name, table_name.lower(), foreign_key.name.lower()
     def get_sql(foreign_key):
         return foreign_key._get_create_sql(inside_table=True)
     def get_create_command(foreign_key):
@@ -9,7 +9,8 @@ from collections import defaultdict
 #from pony.thirdparty.compiler import ast, parse
 import ast
 
-from pony.utils import throw, get_codeobject_id
+from pony import options
+from pony.utils import throw, get_codeobject_id, LRUCache
 
 ##ast.And.__repr__ = lambda self: "And(%s: %s)" % (getattr(self, 'endpos', '?'), repr(self.nodes),)
 ##ast.Or.__repr__ = lambda self: "Or(%s: %s)" % (getattr(self, 'endpos', '?'), repr(self.nodes),)
@@ -17,7 +18,7 @@ from pony.utils import throw, get_codeobject_id
 class DecompileError(NotImplementedError):
     pass
 
-ast_cache = {}
+ast_cache = LRUCache(options.DECOMPILER_CACHE_SIZE)
 
 def decompile(x):
     cells = {}
@@ -0,0 +1,131 @@
+from __future__ import absolute_import, print_function, division
+
+from time import monotonic
+from threading import Lock
+from collections import defaultdict
+
+from pony.utils import throw, LRUCache
+
+class EntityCache(object):
+    # Interface of the second-level cache which keeps loaded rows between db_sessions.
+    # Keys are tuples (root_entity_name, raw_pkval), values are dicts {attr_name: column_values}
+    # consisting of plain database values only, so they can be pickled by a shared cache implementation
+    def get(entity_cache, key):
+        throw(NotImplementedError)
+    def set(entity_cache, key, data):
+        throw(NotImplementedError)
+    def delete(entity_cache, key):
+        throw(NotImplementedError)
+    def clear(entity_cache):
+        throw(NotImplementedError)
+
+class LocalEntityCache(EntityCache):
+    def __init__(entity_cache, ttl=None, max_size=1000):
+        if ttl is not None and (not isinstance(ttl, (int, float)) or ttl <= 0):
+            throw(ValueError, 'Cache ttl must be positive number or None. Got: %r' % ttl)
+        entity_cache.ttl = ttl
+        entity_cache.data = LRUCache(max_size)
+        entity_cache.lock = Lock()
+        entity_cache.hits = entity_cache.misses = entity_cache.expired = 0
+        entity_cache.stores = entity_cache.invalidations = 0
+    def get(entity_cache, key):
+        entry = entity_cache.data.get(key)
+        with entity_cache.lock:
+            if entry is None:
+                entity_cache.misses += 1
+                return None
+            expires_at, data = entry
+            if expires_at is not None and expires_at <= monotonic():
+                entity_cache.expired += 1
+                entity_cache.misses += 1
+                entity_cache.data.pop(key)
+                return None
+            entity_cache.hits += 1
+            return data
+    def set(entity_cache, key, data):
+        ttl = entity_cache.ttl
+        entity_cache.data[key] = (None if ttl is None else monotonic() + ttl), data
+        with entity_cache.lock: entity_cache.stores += 1
+    def delete(entity_cache, key):
+        entity_cache.data.pop(key)
+        with entity_cache.lock: entity_cache.invalidations += 1
+    def clear(entity_cache):
+        entity_cache.data.clear()
+        with entity_cache.lock: entity_cache.invalidations += 1
+    @property
+    def stats(entity_cache):
+        with entity_cache.lock:
+            return dict(size=len(entity_cache.data), maxsize=entity_cache.data.maxsize,
+                        hits=entity_cache.hits, misses=entity_cache.misses, expired=entity_cache.expired,
+                        evictions=entity_cache.data.evictions, stores=entity_cache.stores,
+                        invalidations=entity_cache.invalidations)
+
+def get_entity_cache(cache_option):
+    if cache_option is None or cache_option is False: return None
+    if cache_option is True: return LocalEntityCache()
+    if isinstance(cache_option, dict): return LocalEntityCache(**cache_option)
+    if isinstance(cache_option, EntityCache): return cache_option
+    throw(TypeError, '_cache_ option must be bool, dict or EntityCache instance. Got: %r' % cache_option)
+
+class QueryResultCache(object):
+    # Query results shared between db_sessions. Each entry is tagged with versions of the tables
+    # which were read by the query. Committing changes to some table increments its version,
+    # so all entries which depend on the table become stale
+    def __init__(result_cache, max_size=1000):
+        result_cache.data = LRUCache(max_size)
+        result_cache.versions = defaultdict(int)
+        result_cache.epoch = 0  # incremented when all tables are invalidated
+        result_cache.lock = Lock()
+        result_cache.hits = result_cache.misses = result_cache.expired = 0
+        result_cache.stores = result_cache.invalidations = 0
+    def get_versions(result_cache, tables):
+        versions = result_cache.versions
+        with result_cache.lock: return tuple(versions[table] for table in tables)
+    def get_versions_snapshot(result_cache):
+        with result_cache.lock: return result_cache.epoch, dict(result_cache.versions)
+    def is_unchanged(result_cache, snapshot, table):
+        epoch, versions = snapshot
+        with result_cache.lock:
+            return result_cache.epoch == epoch and result_cache.versions.get(table, 0) == versions.get(table, 0)
+    def get(result_cache, key):
+        entry = result_cache.data.get(key)
+        with result_cache.lock:
+            if entry is None:
+                result_cache.misses += 1
+                return None
+            expires_at, tables, versions, value = entry
+            if expires_at is not None and expires_at <= monotonic():
+                result_cache.expired += 1
+            elif any(result_cache.versions[table] != version for table, version in zip(tables, versions)):
+                result_cache.invalidations += 1
+            else:
+                result_cache.hits += 1
+                return value
+            result_cache.misses += 1
+        result_cache.data.pop(key)
+        return None
+    def set(result_cache, key, value, tables, versions, ttl=None):
+        # versions should be taken before the query execution, so the result of the query
+        # which was executed concurrently with the commit of modified tables is never returned
+        expires_at = None if ttl is None else monotonic() + ttl
+        result_cache.data[key] = expires_at, tables, versions, value
+        with result_cache.lock: result_cache.stores += 1
+    def invalidate(result_cache, tables=None):
+        if tables is None:
+            result_cache.data.clear()
+            with result_cache.lock:
+                for table in result_cache.versions: result_cache.versions[table] += 1
+                result_cache.epoch += 1
+                result_cache.invalidations += 1
+            return
+        with result_cache.lock:
+            for table in tables: result_cache.versions[table] += 1
+    def clear(result_cache):
+        result_cache.data.clear()
+    @property
+    def stats(result_cache):
+        with result_cache.lock:
+            return dict(size=len(result_cache.data), maxsize=result_cache.data.maxsize,
+                        hits=result_cache.hits, misses=result_cache.misses, expired=result_cache.expired,
+                        evictions=result_cache.data.evictions, stores=result_cache.stores,
+                        invalidations=result_cache.invalidations)
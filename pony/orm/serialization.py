@@ -2,8 +2,10 @@ import json
 from datetime import date, datetime
 from decimal import Decimal
 from collections import defaultdict
+from itertools import groupby
+from operator import itemgetter
 
-from pony.orm.core import Entity, TransactionError
+from pony.orm.core import Entity, TransactionError, created_or_deleted_statuses, del_statuses
 from pony.utils import cut_traceback, throw
 
 class Bag(object):
@@ -21,6 +23,9 @@ class Bag(object):
         attrs = entity._get_attrs_(only, exclude, with_collections, with_lazy)
         bag.entity_configs[entity] = attrs, related_objects
         return attrs, related_objects
+    def _get_config(bag, entity):
+        try: return bag.entity_configs[entity]
+        except KeyError: return bag.config(entity)
     @cut_traceback
     def put(bag, x):
         if isinstance(x, Entity):
@@ -43,9 +48,25 @@ class Bag(object):
         bag.objects[entity].add(obj)
     def _reduce_composite_pk(bag, pk):
         return ','.join(str(item).replace('*', '**').replace(',', '*,') for item in pk)
+    def _load_objects(bag):
+        objects = [ obj for objects in bag.objects.values() for obj in objects ]
+        load_objects(objects, lambda entity: [ attr for attr in bag._get_config(entity)[0] if attr.is_collection ])
+        related = set()
+        for entity, objects in bag.objects.items():
+            attrs, related_objects = bag._get_config(entity)
+            if not related_objects: continue
+            for attr in attrs:
+                if not attr.is_relation: continue
+                for obj in objects:
+                    if obj._status_ in del_statuses: continue
+                    value = attr.__get__(obj)
+                    if attr.is_collection: related.update(value)
+                    elif value is not None: related.add(value)
+        load_objects(related)
     @cut_traceback
     def to_dict(bag):
         bag.dicts.clear()
+        bag._load_objects()
         for entity, objects in bag.objects.items():
             for obj in objects:
                 dicts = bag.dicts[entity]
@@ -62,8 +83,7 @@ class Bag(object):
         return result
     def _process_object(bag, obj, process_related=True):
         entity = obj.__class__
-        try: attrs, related_objects = bag.entity_configs[entity]
-        except KeyError: attrs, related_objects = bag.config(entity)
+        attrs, related_objects = bag._get_config(entity)
         process_related_objects = process_related and related_objects
         d = {}
         for attr in attrs:
@@ -87,8 +107,9 @@ class Bag(object):
             d[attr.name] = value
         bag.dicts[entity][obj] = d
     @cut_traceback
-    def to_json(bag):
-        return json.dumps(bag.to_dict(), default=json_converter, indent=2, sort_keys=True)
+    def to_json(bag, stream=None):
+        if stream is None: return json.dumps(bag.to_dict(), default=json_converter, indent=2, sort_keys=True)
+        json.dump(bag.to_dict(), stream, default=json_converter, indent=2, sort_keys=True)
 
 def to_dict(objects):
     if isinstance(objects, Entity): objects = [ objects ]
@@ -106,6 +127,52 @@ def to_dict(objects):
 def to_json(objects):
     return json.dumps(to_dict(objects), default=json_converter, indent=2, sort_keys=True)
 
+def load_objects(objects, get_collections=None):
+    # one query per batch of objects instead of one query per object or per collection
+    objects_by_entity = defaultdict(list)
+    for obj in objects: objects_by_entity[obj.__class__._root_].append(obj)
+    for entity, entity_objects in objects_by_entity.items():
+        entity._load_many_(entity_objects)
+    if get_collections is None: return
+    objects_by_collection = defaultdict(list)
+    for entity_objects in objects_by_entity.values():
+        for obj in entity_objects:
+            if obj._status_ in created_or_deleted_statuses: continue
+            for attr in get_collections(obj.__class__):
+                setdata = obj._vals_.get(attr)
+                if setdata is None or not setdata.is_fully_loaded: objects_by_collection[attr].append(obj)
+    for attr, attr_objects in objects_by_collection.items():
+        attr.prefetch_load_all(attr_objects)
+
+def iter_objects_json(objects, get_dict, converter, chunk_size=1000):
+    # objects are encoded by chunks, so the whole document is never kept in memory
+    objects_by_name = defaultdict(list)
+    for obj in objects: objects_by_name[obj.__class__.__name__].append(obj)
+    yield '{'
+    for i, name in enumerate(sorted(objects_by_name)):
+        yield '%s%s: {' % (', ' if i else '', json.dumps(name))
+        separator = ''
+        for chunk in _iter_chunks(objects_by_name[name], get_dict, chunk_size):
+            yield separator + json.dumps(chunk, default=converter)[1:-1]
+            separator = ', '
+        yield '}'
+    yield '}'
+
+def _iter_chunks(objects, get_dict, chunk_size):
+    items = sorted(((obj._get_raw_pkval_(), obj) for obj in objects), key=itemgetter(0))
+    chunk, size = {}, 0
+    # objects with the same first component of composite primary key should get into the same chunk
+    for key, group in groupby(items, lambda item: item[0][0]):
+        for pkval, obj in group:
+            d = chunk
+            for val in pkval[:-1]: d = d.setdefault(val, {})
+            d[pkval[-1]] = get_dict(obj)
+            size += 1
+        if size >= chunk_size:
+            yield chunk
+            chunk, size = {}, 0
+    if chunk: yield chunk
+
 def json_converter(x):
     if isinstance(x, (datetime, date, Decimal)):
         return str(x)
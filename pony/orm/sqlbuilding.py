@@ -222,6 +222,18 @@ class SQLBuilder(object):
         return [ 'INSERT INTO ', builder.quote_name(table_name), ' (',
                  join(', ', [builder.quote_name(column) for column in columns ]),
                  ') VALUES (', join(', ', [builder(value) for value in values]), ')' ]
+    def INSERT_MANY(builder, table_name, columns, rows, returning=None):
+        return [ 'INSERT INTO ', builder.quote_name(table_name), ' (',
+                 join(', ', [builder.quote_name(column) for column in columns ]),
+                 ') VALUES ', join(', ', [ ('(', join(', ', [builder(value) for value in row]), ')') for row in rows ]) ]
+    def UPSERT(builder, table_name, columns, rows, conflict_columns, update_columns):
+        quote_name = builder.quote_name
+        result = [ builder.INSERT_MANY(table_name, columns, rows), ' ON CONFLICT (',
+                   join(', ', [ quote_name(column) for column in conflict_columns ]), ')' ]
+        if not update_columns: result.append(' DO NOTHING')
+        else: result.extend([ ' DO UPDATE SET ', join(', ', [ (quote_name(column), ' = EXCLUDED.', quote_name(column))
+                                                               for column in update_columns ]) ])
+        return result
     def DEFAULT(builder):
         return 'DEFAULT'
     def UPDATE(builder, table_name, pairs, where=None):
@@ -877,6 +877,56 @@ class SQLTranslator(ASTTranslator):
                 new_order.append(desc_wrapper([ 'COLUMN', alias, column]))
         order[:0] = new_order
         return translator
+    def get_seek_columns(translator):
+        # Returns ordering of the query as a list of (attr, column_index, is_desc) items. Ordering is extended
+        # by primary key columns in order to make it unambiguous, as keyset pagination requires
+        entity = translator.expr_type
+        if not isinstance(entity, EntityMeta) or translator.aggregated: throw(TypeError,
+            'Keyset pagination is limited to queries which return simple list of objects')
+        alias = translator.alias
+        column_dict = {}
+        for attr in entity._attrs_:
+            if attr.is_collection or not attr.columns: continue
+            for i, column in enumerate(attr.columns): column_dict.setdefault(column, (attr, i))
+        seek_columns = []
+        for item in translator.order:
+            is_desc = item[0] == 'DESC'
+            if is_desc: item = item[1]
+            if item[0] != 'COLUMN' or item[1] != alias or item[2] not in column_dict: throw(TypeError,
+                'Keyset pagination requires query to be ordered by attributes of %s entity' % entity.__name__)
+            attr, i = column_dict[item[2]]
+            if attr.nullable: throw(TypeError,  # NULL values do not satisfy seek conditions like column > value
+                'Keyset pagination cannot use nullable attribute %s for ordering' % attr)
+            if (attr, i) not in [ (attr2, i2) for attr2, i2, is_desc2 in seek_columns ]:
+                seek_columns.append((attr, i, is_desc))
+        for column in entity._pk_columns_:
+            attr, i = column_dict[column]
+            if (attr, i) not in [ (attr2, i2) for attr2, i2, is_desc2 in seek_columns ]:
+                seek_columns.append((attr, i, False))
+        return tuple(seek_columns)
+    def apply_seek(translator, seek_columns, param_ids):
+        translator = translator.deepcopy()
+        alias = translator.alias
+        columns = [ [ 'COLUMN', alias, attr.columns[i] ] for attr, i, is_desc in seek_columns ]
+        translator.order = [ [ 'DESC', column ] if is_desc else column
+                             for column, (attr, i, is_desc) in zip(columns, seek_columns) ]
+        if param_ids is None: return translator
+        params = [ [ 'PARAM', (id, None, None), attr.converters[i] ]
+                   for id, (attr, i, is_desc) in zip(param_ids, seek_columns) ]
+        directions = { is_desc for attr, i, is_desc in seek_columns }
+        if len(columns) == 1:
+            condition = [ 'LT' if seek_columns[0][2] else 'GT', columns[0], params[0] ]
+        elif len(directions) == 1 and translator.row_value_syntax:
+            condition = [ 'LT' if directions.pop() else 'GT', [ 'ROW' ] + columns, [ 'ROW' ] + params ]
+        else:
+            # (a, b, c) > (x, y, z) is expanded to a > x OR a = x AND b > y OR a = x AND b = y AND c > z
+            condition = [ 'OR' ]
+            for k, (attr, i, is_desc) in enumerate(seek_columns):
+                operands = [ [ 'EQ', columns[j], params[j] ] for j in range(k) ]
+                operands.append([ 'LT' if is_desc else 'GT', columns[k], params[k] ])
+                condition.append([ 'AND' ] + operands if k else operands[0])
+        translator.conditions = translator.conditions + [ condition ]
+        return translator
     def apply_kwfilters(translator, filterattrs, original_names=False):
         translator = translator.deepcopy()
         with translator:
@@ -0,0 +1,174 @@
+from __future__ import absolute_import, print_function, division
+
+import asyncio, os, shutil, tempfile, threading
+from contextlib import contextmanager
+import unittest
+
+from pony import options
+from pony.orm import aio
+from pony.orm.core import *
+from pony.orm.tests.testutils import *
+
+db = Database()
+
+
+class Person(db.Entity):
+    name = Required(str)
+    age = Required(int)
+    bio = Optional(str, lazy=True)
+
+
+class TestAsync(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.dirname = tempfile.mkdtemp()
+        db.bind('sqlite', os.path.join(cls.dirname, 'test.sqlite'), create_db=True)
+        db.generate_mapping(create_tables=True)
+
+    @classmethod
+    def tearDownClass(cls):
+        db.disconnect()
+        shutil.rmtree(cls.dirname, ignore_errors=True)
+
+    def setUp(self):
+        with db_session:
+            Person.select().delete(bulk=True)
+            Person(name='John', age=20)
+            Person(name='Mike', age=30)
+
+    def run_async(self, coroutine):
+        loop = asyncio.new_event_loop()
+        try: return loop.run_until_complete(coroutine)
+        finally: loop.close()
+
+    @contextmanager
+    def max_workers(self, max_workers):
+        with aio.workers_lock:
+            while aio.idle_workers:
+                aio.idle_workers.pop().shutdown()
+                aio.workers_count -= 1
+        prev_max_workers = options.ASYNC_MAX_WORKERS
+        options.ASYNC_MAX_WORKERS = max_workers
+        try: yield
+        finally: options.ASYNC_MAX_WORKERS = prev_max_workers
+
+    def test_fetch(self):
+        async def main():
+            async with db_session:
+                persons = await select(p for p in Person if p.age > 25).fetch_async()
+                return [ p.name for p in persons ]
+        self.assertEqual(self.run_async(main()), ['Mike'])
+
+    def test_get(self):
+        async def main():
+            async with db_session:
+                p1 = await Person.get_async(name='John')
+                x = 25
+                p2 = await Person.get_async(lambda p: p.age > x)
+                return p1.age, p2.name
+        self.assertEqual(self.run_async(main()), (20, 'Mike'))
+
+    def test_event_loop_is_not_blocked(self):
+        async def main():
+            loop_thread = threading.current_thread()
+            async with db_session:
+                thread = await run_async(threading.current_thread)
+            return thread is not loop_thread
+        self.assertTrue(self.run_async(main()))
+
+    def test_commit(self):
+        async def main():
+            async with db_session:
+                await run_async(Person, name='Kate', age=40)
+                await flush_async()
+                await commit_async()
+        self.run_async(main())
+        with db_session:
+            self.assertEqual(Person.get(name='Kate').age, 40)
+
+    def test_rollback_on_exception(self):
+        async def main():
+            async with db_session:
+                await run_async(Person, name='Kate', age=40)
+                raise ZeroDivisionError
+        with self.assertRaises(ZeroDivisionError):
+            self.run_async(main())
+        with db_session:
+            self.assertFalse(Person.exists(name='Kate'))
+
+    def test_concurrent_sessions(self):
+        async def task(name):
+            async with db_session:
+                await run_async(Person, name=name, age=50)
+                await asyncio.sleep(0.01)
+                return await select(p.name for p in Person if p.age == 50).fetch_async()
+        async def main():
+            return await asyncio.gather(task('A'), task('B'))
+        result = self.run_async(main())
+        self.assertEqual(sorted(len(names) for names in result), [1, 2])
+
+    def test_nested_sessions(self):
+        async def main():
+            async with db_session:
+                async with db_session:
+                    await run_async(Person, name='Kate', age=40)
+                return await Person.get_async(name='Kate')
+        self.assertEqual(self.run_async(main()).age, 40)
+
+    def test_max_workers(self):
+        threads = set()
+        active = []
+        max_active = []
+        async def task(i):
+            async with db_session:
+                active.append(i)
+                max_active.append(len(active))
+                threads.add(await run_async(threading.current_thread))
+                await asyncio.sleep(0.01)
+                active.remove(i)
+        async def main():
+            await asyncio.gather(*[ task(i) for i in range(20) ])
+        with self.max_workers(3):
+            self.run_async(main())
+            self.assertEqual(max(max_active), 3)
+            self.assertEqual(len(threads), 3)
+            self.assertEqual(aio.workers_count, 3)
+
+    def test_cancelled_waiter(self):
+        async def task():
+            async with db_session:
+                await asyncio.sleep(0.01)
+        async def main():
+            tasks = [ asyncio.ensure_future(task()) for i in range(3) ]
+            await asyncio.sleep(0)
+            tasks[-1].cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            async with db_session:
+                return await Person.get_async(name='John')
+        with self.max_workers(1):
+            self.assertEqual(self.run_async(main()).age, 20)
+            self.assertEqual(aio.workers_count, 1)
+
+    def test_lazy_attribute(self):
+        async def main():
+            async with db_session:
+                person = await Person.get_async(name='John')
+                return person.name, await run_async(getattr, person, 'bio')
+        self.assertEqual(self.run_async(main()), ('John', ''))
+
+    @raises_exception(TransactionError, 'Database cannot be accessed directly from async code. Lazy attributes '
+                      'and collections of objects should be loaded inside async db_session with run_async() or prefetch()')
+    def test_lazy_attribute_in_event_loop_thread(self):
+        async def main():
+            async with db_session:
+                person = await Person.get_async(name='John')
+                return person.bio
+        self.run_async(main())
+
+    @raises_exception(TransactionError, 'async db_session is required when working with the database asynchronously')
+    def test_no_session(self):
+        self.run_async(select(p for p in Person).fetch_async())
+
+
+if __name__ == '__main__':
+    unittest.main()
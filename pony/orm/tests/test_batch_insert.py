@@ -0,0 +1,132 @@
+from __future__ import absolute_import, print_function, division
+
+import unittest
+
+from pony.orm.core import *
+from pony.orm.tests.testutils import *
+from pony.orm.tests import setup_database, teardown_database
+
+db = Database()
+
+
+class Group(db.Entity):
+    name = Required(str, unique=True)
+    students = Set('Student')
+
+
+class Student(db.Entity):
+    name = Required(str)
+    group = Required(Group)
+    mentor = Optional('Student', reverse='mentees')
+    mentees = Set('Student', reverse='mentor')
+
+
+class Subject(db.Entity):
+    code = PrimaryKey(str)
+    hours = Optional(int)
+    inserted = []
+    def after_insert(self):
+        Subject.inserted.append(self.code)
+
+
+class TestBatchInsert(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        setup_database(db)
+
+    @classmethod
+    def tearDownClass(cls):
+        teardown_database(db)
+
+    def setUp(self):
+        with db_session:
+            Student.select().delete(bulk=True)
+            Group.select().delete(bulk=True)
+            Subject.select().delete(bulk=True)
+        Subject.inserted = []
+        db.merge_local_stats()
+
+    def insert_count(self):
+        return sum(stat.db_count for sql, stat in db.local_stats.items() if sql and sql.startswith('INSERT'))
+
+    def test_auto_pk(self):
+        if not db.provider.insert_returning_syntax: return
+        with db_session:
+            groups = [ Group(name='G%d' % i) for i in range(5) ]
+            flush()
+            self.assertEqual(self.insert_count(), 1)
+            ids = [ g.id for g in groups ]
+            self.assertEqual(ids, sorted(ids))
+            self.assertEqual(len(set(ids)), 5)
+        with db_session:
+            self.assertEqual([ Group[id].name for id in ids ], [ 'G%d' % i for i in range(5) ])
+
+    def test_explicit_pk(self):
+        with db_session:
+            for i in range(10): Subject(code='S%d' % i, hours=i)
+        self.assertEqual(self.insert_count(), 1)
+        self.assertEqual(Subject.inserted, [ 'S%d' % i for i in range(10) ])
+        with db_session:
+            self.assertEqual(select(s.hours for s in Subject).sum(), 45)
+
+    def test_different_attrs(self):
+        with db_session:
+            Subject(code='A', hours=1)
+            Subject(code='B', hours=2)
+            Subject(code='C')
+            Subject(code='D')
+        self.assertEqual(self.insert_count(), 2)
+
+    def test_principal_objects(self):
+        with db_session:
+            g1 = Group(name='G1')
+            s1 = Student(name='S1', group=g1)
+            s2 = Student(name='S2', group=g1, mentor=s1)
+            g2 = Group(name='G2')
+            s3 = Student(name='S3', group=g2, mentor=s2)
+        with db_session:
+            s3 = Student.get(name='S3')
+            self.assertEqual(s3.group.name, 'G2')
+            self.assertEqual(s3.mentor.name, 'S2')
+            self.assertEqual(s3.mentor.mentor.name, 'S1')
+
+    def test_chunks(self):
+        prev_max_params_count = db.provider.max_params_count
+        db.provider.max_params_count = 10
+        try:
+            with db_session:
+                for i in range(12): Subject(code='S%d' % i, hours=i)
+        finally:
+            db.provider.max_params_count = prev_max_params_count
+        self.assertEqual(self.insert_count(), 3)
+        with db_session:
+            self.assertEqual(count(s for s in Subject), 12)
+
+    def test_cached_batch_sizes(self):
+        Subject._insert_sql_cache_.clear()
+        for i in range(2, 80):
+            with db_session:
+                for j in range(i): Subject(code='S%d_%d' % (i, j))
+        rows_counts = { key[1] for key in Subject._insert_sql_cache_ if isinstance(key[0], tuple) }
+        self.assertEqual(rows_counts, set(range(1, 17)) | {32, 64})
+        with db_session:
+            self.assertEqual(count(s for s in Subject), 3159)
+
+    @raises_exception(TransactionIntegrityError, 'One of 2 Group objects cannot be stored in the database...')
+    def test_integrity_error(self):
+        with db_session:
+            Group(id=1, name='X')
+        with db_session:
+            Group(id=2, name='Y')
+            Group(id=3, name='X')
+
+    @raises_exception(TransactionIntegrityError, "Object Group[2] cannot be stored in the database...")
+    def test_single_object_integrity_error(self):
+        with db_session:
+            Group(id=1, name='X')
+        with db_session:
+            Group(id=2, name='X')
+
+
+if __name__ == '__main__':
+    unittest.main()
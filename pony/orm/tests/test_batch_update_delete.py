@@ -0,0 +1,123 @@
+from __future__ import absolute_import, print_function, division
+
+import unittest
+
+from pony.orm.core import *
+from pony.orm.tests.testutils import *
+from pony.orm.tests import setup_database, teardown_database
+
+db = Database()
+
+
+class Product(db.Entity):
+    name = Required(str)
+    price = Required(int)
+    tags = Set('Tag')
+
+
+class Tag(db.Entity):
+    name = Required(str)
+    product = Optional(Product)
+
+
+class Edge(db.Entity):
+    a = Required(int)
+    b = Required(int)
+    weight = Optional(int)
+    PrimaryKey(a, b)
+
+
+class TestBatchUpdateDelete(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        setup_database(db)
+
+    @classmethod
+    def tearDownClass(cls):
+        teardown_database(db)
+
+    def setUp(self):
+        with db_session:
+            Tag.select().delete(bulk=True)
+            Product.select().delete(bulk=True)
+            Edge.select().delete(bulk=True)
+            for i in range(10): Product(id=i+1, name='P%d' % i, price=i)
+            for i in range(4): Edge(a=i, b=i+1, weight=i)
+        db.merge_local_stats()
+
+    def statements_count(self, prefix):
+        return sum(stat.db_count for sql, stat in db.local_stats.items() if sql and sql.startswith(prefix))
+
+    def test_update(self):
+        with db_session:
+            for p in Product.select(): p.price += 100
+        self.assertEqual(self.statements_count('UPDATE'), 1)
+        with db_session:
+            self.assertEqual(select(p.price for p in Product).sum(), 1045)
+
+    def test_update_different_columns(self):
+        with db_session:
+            for p in Product.select().order_by(Product.id):
+                if p.id % 2: p.price = 0
+                else: p.name = 'X'
+        self.assertEqual(self.statements_count('UPDATE'), 10)
+        with db_session:
+            self.assertEqual(count(p for p in Product if p.price == 0), 5)
+            self.assertEqual(count(p for p in Product if p.name == 'X'), 5)
+
+    @raises_exception(OptimisticCheckError, '1 of 10 Product objects were updated or deleted outside of current transaction')
+    def test_optimistic_check(self):
+        with db_session:
+            products = Product.select()[:]
+            db.execute('update Product set price = 1000 where id = 5')
+            for p in products: p.price += 1
+
+    def test_delete(self):
+        with db_session:
+            for p in Product.select(lambda p: p.id > 3): p.delete()
+        self.assertEqual(self.statements_count('DELETE'), 1)
+        with db_session:
+            self.assertEqual(select(p.id for p in Product)[:], [1, 2, 3])
+
+    def test_delete_chunks(self):
+        prev_max_params_count = db.provider.max_params_count
+        db.provider.max_params_count = 4
+        try:
+            with db_session:
+                for p in Product.select(): p.delete()
+        finally:
+            db.provider.max_params_count = prev_max_params_count
+        self.assertEqual(self.statements_count('DELETE'), 3)
+        with db_session:
+            self.assertEqual(count(p for p in Product), 0)
+
+    def test_cached_batch_sizes(self):
+        Product._delete_sql_cache_.clear()
+        with db_session:
+            for i in range(11, 51): Product(id=i, name='P%d' % i, price=i)
+        with db_session:
+            for p in Product.select(): p.delete()
+        # 50 objects are deleted by batches of 32, 16 and 2 objects
+        self.assertEqual(sorted(key for key in Product._delete_sql_cache_ if isinstance(key, int)), [2, 16, 32])
+        with db_session:
+            self.assertEqual(count(p for p in Product), 0)
+
+    def test_delete_composite_pk(self):
+        with db_session:
+            for e in Edge.select(lambda e: e.a < 3): e.delete()
+        self.assertEqual(self.statements_count('DELETE'), 1)
+        with db_session:
+            self.assertEqual(select((e.a, e.b) for e in Edge)[:], [(3, 4)])
+
+    def test_delete_with_dependent_objects(self):
+        with db_session:
+            for i in range(3): Tag(name='T%d' % i, product=Product[i+1])
+        with db_session:
+            for p in Product.select(): p.delete()
+        with db_session:
+            self.assertEqual(count(p for p in Product), 0)
+            self.assertEqual(count(t for t in Tag if t.product is None), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
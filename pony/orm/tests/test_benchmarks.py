@@ -0,0 +1,93 @@
+from __future__ import absolute_import, print_function, division
+
+import io, json, os, shutil, tempfile
+import unittest
+from contextlib import redirect_stdout, redirect_stderr
+
+from pony.orm.benchmarks import (
+    BASELINE_FILENAME, get_benchmark_names, run_benchmarks, save_results, load_results, compare_results, format_results)
+from pony.orm.benchmarks.__main__ import main
+from pony.orm.tests.testutils import *
+
+
+class TestBenchmarks(unittest.TestCase):
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dirname, ignore_errors=True)
+
+    def test_names(self):
+        names = get_benchmark_names()
+        for name in ('pk_lookup', 'wide_select', 'n_plus_one', 'bulk_create', 'bulk_update', 'bulk_delete',
+                     'translation_cold', 'translation_warm', 'to_dict', 'to_json', 'concurrent_sessions'):
+            self.assertIn(name, names)
+
+    def test_run_all(self):
+        results = run_benchmarks(repeat=1, warmup=0, scale=0.02)
+        self.assertEqual(set(results['benchmarks']), set(get_benchmark_names()))
+        for name, stats in results['benchmarks'].items():
+            self.assertGreater(stats['median'], 0)
+            self.assertGreaterEqual(stats['max'], stats['min'])
+            self.assertGreater(stats['operations'], 0)
+        self.assertEqual(results['benchmarks']['pk_lookup']['operations'], 4)
+        self.assertEqual(results['benchmarks']['translation_cold']['operations'], 50)
+        json.dumps(results)
+
+    def test_save_and_compare(self):
+        results = run_benchmarks(['pk_lookup'], repeat=3, scale=0.05)
+        filename = os.path.join(self.dirname, 'results.json')
+        save_results(results, filename)
+        baseline = load_results(filename)
+        self.assertEqual(baseline, results)
+        baseline['benchmarks']['pk_lookup']['median'] *= 2
+        [ (name, base_median, median, ratio, status) ] = compare_results(results, baseline)
+        self.assertEqual((name, ratio, status), ('pk_lookup', 0.5, 'faster'))
+        baseline['benchmarks']['pk_lookup']['median'] /= 4
+        [ (name, base_median, median, ratio, status) ] = compare_results(results, baseline)
+        self.assertEqual((ratio, status), (2.0, 'slower'))
+        self.assertIn('slower', format_results(results, compare_results(results, baseline)))
+
+    def test_command_line(self):
+        filename = os.path.join(self.dirname, 'results.json')
+        output = io.StringIO()
+        with redirect_stdout(output), redirect_stderr(io.StringIO()):
+            self.assertEqual(main(['translation_warm', '--repeat', '1', '--output', filename]), 0)
+        self.assertIn('translation_warm', output.getvalue())
+        self.assertIn('translation_warm', load_results(filename)['benchmarks'])
+
+    def test_command_line_compare(self):
+        filename = os.path.join(self.dirname, 'results.json')
+        results = run_benchmarks(['translation_warm'], repeat=1, warmup=0)
+        results['benchmarks']['translation_warm']['median'] *= 1000
+        save_results(results, filename)
+        output = io.StringIO()
+        with redirect_stdout(output), redirect_stderr(io.StringIO()):
+            self.assertEqual(main(['translation_warm', '--repeat', '1', '--compare', filename]), 0)
+        self.assertIn('faster', output.getvalue())
+
+    def test_stored_baseline(self):
+        baseline = load_results(BASELINE_FILENAME)
+        self.assertEqual(set(baseline['benchmarks']), set(get_benchmark_names()))
+        self.assertEqual(baseline['scale'], 1.0)
+
+    def test_compare_different_scale(self):
+        results = run_benchmarks(['pk_lookup'], repeat=1, warmup=0, scale=0.05)
+        with self.assertRaises(ValueError) as cm:
+            compare_results(results, load_results(BASELINE_FILENAME))
+        self.assertEqual(str(cm.exception), 'Baseline results were measured with scale 1.0, current scale is 0.05')
+
+    @raises_exception(ValueError, 'Unknown benchmark: foo')
+    def test_unknown_benchmark(self):
+        run_benchmarks(['foo'])
+
+    def test_incorrect_results_file(self):
+        filename = os.path.join(self.dirname, 'results.json')
+        with open(filename, 'w') as f: f.write('[]')
+        with self.assertRaises(ValueError) as cm:
+            load_results(filename)
+        self.assertEqual(str(cm.exception), 'File %s does not contain benchmark results' % filename)
+
+
+if __name__ == '__main__':
+    unittest.main()
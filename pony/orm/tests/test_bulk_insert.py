@@ -0,0 +1,144 @@
+from __future__ import absolute_import, print_function, division
+
+import unittest
+from datetime import date
+
+from pony.orm.core import *
+from pony.orm.tests.testutils import *
+from pony.orm.tests import setup_database, teardown_database
+
+db = Database()
+
+
+class Group(db.Entity):
+    number = Required(int)
+    students = Set('Student')
+
+
+class Student(db.Entity):
+    name = Required(str)
+    birth_date = Optional(date)
+    score = Required(int, default=0)
+    group = Optional(Group)
+
+
+class Tag(db.Entity):
+    name = PrimaryKey(str)
+
+
+class TestBulkInsert(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        setup_database(db)
+
+    @classmethod
+    def tearDownClass(cls):
+        teardown_database(db)
+
+    def setUp(self):
+        with db_session:
+            Student.select().delete(bulk=True)
+            Group.select().delete(bulk=True)
+            Tag.select().delete(bulk=True)
+            Group(id=1, number=101)
+        db.merge_local_stats()
+
+    def test_dicts(self):
+        with db_session:
+            count = Student.bulk_insert([ dict(name='John', birth_date=date(2000, 1, 1), group=1),
+                                          dict(name='Mike', birth_date=None, group=Group[1]) ])
+            self.assertEqual(count, 2)
+            self.assertFalse(any(isinstance(obj, Student) for obj in db._get_cache().objects))
+        with db_session:
+            self.assertEqual(select((s.name, s.birth_date, s.score, s.group.number) for s in Student).order_by(1)[:],
+                             [('John', date(2000, 1, 1), 0, 101), ('Mike', None, 0, 101)])
+
+    def test_tuples(self):
+        with db_session:
+            count = Student.bulk_insert(iter([ ('John', 10), ('Mike', 20) ]), attrs='name score')
+            self.assertEqual(count, 2)
+        with db_session:
+            self.assertEqual(select((s.name, s.score) for s in Student).order_by(1)[:], [('John', 10), ('Mike', 20)])
+
+    def test_batches(self):
+        with db_session:
+            rows = ( dict(name='Student %d' % i, score=i) for i in range(25) )
+            self.assertEqual(Student.bulk_insert(rows, batch_size=10), 25)
+        inserts = [ stat.db_count for sql, stat in db.local_stats.items() if sql and sql.startswith('INSERT') ]
+        self.assertEqual(inserts, [3])
+        with db_session:
+            self.assertEqual(count(s for s in Student), 25)
+
+    def test_return_generated_ids(self):
+        with db_session:
+            ids = Student.bulk_insert([ dict(name='Student %d' % i) for i in range(5) ], return_ids=True)
+            self.assertEqual(len(ids), 5)
+            self.assertEqual([ Student[id].name for id in ids ], [ 'Student %d' % i for i in range(5) ])
+
+    def test_return_generated_ids_without_returning_syntax(self):
+        db.provider.insert_returning_syntax = False
+        try:
+            with db_session:
+                ids = Student.bulk_insert([ ('A',), ('B',), ('C',) ], attrs=['name'], return_ids=True)
+                self.assertEqual([ Student[id].name for id in ids ], [ 'A', 'B', 'C' ])
+        finally:
+            del db.provider.insert_returning_syntax
+
+    def test_plain_and_returning_inserts(self):
+        Student._insert_sql_cache_.clear()
+        with db_session:
+            Student.bulk_insert([ dict(name='A') ])
+            ids = Student.bulk_insert([ dict(name='B') ], return_ids=True)
+            self.assertEqual([ Student[id].name for id in ids ], [ 'B' ])
+            Student.bulk_insert([ dict(name='C') ])
+        with db_session:
+            self.assertEqual(select(s.name for s in Student).order_by(1)[:], [ 'A', 'B', 'C' ])
+
+    def test_cached_batch_sizes(self):
+        Student._insert_sql_cache_.clear()
+        with db_session:
+            for i in range(1, 40):
+                ids = Student.bulk_insert([ dict(name='S%d' % j) for j in range(i) ], batch_size=32, return_ids=True)
+                self.assertEqual(len(set(ids)), i)
+        rows_counts = { key[1] for key in Student._insert_sql_cache_ if isinstance(key[0], tuple) }
+        self.assertEqual(rows_counts, set(range(1, 17)) | {32})
+
+    def test_return_specified_ids(self):
+        with db_session:
+            self.assertEqual(Tag.bulk_insert([ ('x',), ('y',) ], attrs='name', return_ids=True), ['x', 'y'])
+        with db_session:
+            self.assertEqual(select(t.name for t in Tag).order_by(1)[:], ['x', 'y'])
+
+    def test_empty(self):
+        with db_session:
+            self.assertEqual(Student.bulk_insert([]), 0)
+            self.assertEqual(Student.bulk_insert([], return_ids=True), [])
+
+    @raises_exception(TypeError, 'Names of attributes should be specified in attrs option when rows are tuples')
+    def test_tuples_without_attrs(self):
+        with db_session:
+            Student.bulk_insert([ ('John', 10) ])
+
+    @raises_exception(TypeError, 'Each row should contain 2 values (name, score). Got: 1')
+    def test_incorrect_tuple(self):
+        with db_session:
+            Student.bulk_insert([ ('John', 10), ('Mike',) ], attrs='name score')
+
+    @raises_exception(TypeError, 'All rows should have the same set of attributes: name. Got: name, score')
+    def test_different_attributes(self):
+        with db_session:
+            Student.bulk_insert([ dict(name='John'), dict(name='Mike', score=1) ])
+
+    @raises_exception(ValueError, 'Attribute Student.name is required')
+    def test_required(self):
+        with db_session:
+            Student.bulk_insert([ dict(name=None) ])
+
+    @raises_exception(ValueError, 'batch_size must be positive integer. Got: 0')
+    def test_incorrect_batch_size(self):
+        with db_session:
+            Student.bulk_insert([ dict(name='John') ], batch_size=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
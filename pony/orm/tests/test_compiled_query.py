@@ -0,0 +1,188 @@
+from __future__ import absolute_import, print_function, division
+
+import unittest
+
+from pony import options
+from pony.orm.core import *
+from pony.orm.tests.testutils import *
+from pony.orm.tests import setup_database, teardown_database
+
+db = Database()
+
+
+class Group(db.Entity):
+    number = Required(int)
+    students = Set('Student')
+
+
+class Student(db.Entity):
+    name = Required(str)
+    age = Required(int)
+    group = Required(Group)
+
+
+class TestCompiledQuery(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        setup_database(db)
+        with db_session:
+            g1 = Group(id=1, number=101)
+            g2 = Group(id=2, number=102)
+            Student(id=1, name='John', age=20, group=g1)
+            Student(id=2, name='Mike', age=22, group=g1)
+            Student(id=3, name='Mary', age=25, group=g2)
+            Student(id=4, name='Kate', age=30, group=g2)
+
+    @classmethod
+    def tearDownClass(cls):
+        teardown_database(db)
+
+    def setUp(self):
+        rollback()
+        db_session.__enter__()
+
+    def tearDown(self):
+        rollback()
+        db_session.__exit__()
+
+    def test_generator(self):
+        calls = []
+        def func(min_age, max_age):
+            calls.append(1)
+            return select(s.name for s in Student if s.age >= min_age and s.age <= max_age).order_by(1)
+        query = db.compile(func)
+        self.assertEqual(query(20, 22), ['John', 'Mike'])
+        self.assertEqual(query(21, 30), ['Kate', 'Mary', 'Mike'])
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(len(query._plans), 1)
+
+    def test_reuse(self):
+        calls = []
+        def func(min_age):
+            calls.append(1)
+            return select(s for s in Student if s.age > min_age)
+        query = db.compile(func)
+        self.assertEqual(set(query(21)), {Student[2], Student[3], Student[4]})
+        self.assertEqual(set(query(24)), {Student[3], Student[4]})
+        self.assertEqual(set(query(100)), set())
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(len(query._plans), 1)
+
+    def test_decorator(self):
+        @db.prepared_query
+        def students_of_group(number):
+            return select(s.name for s in Student if s.group.number == number).order_by(1)
+        self.assertEqual(students_of_group(101), ['John', 'Mike'])
+        self.assertEqual(students_of_group(number=102), ['Kate', 'Mary'])
+        self.assertEqual(students_of_group.__name__, 'students_of_group')
+
+    def test_entity_select_with_filters(self):
+        query = db.compile(lambda a, b: Student.select(lambda s: s.age > a).filter(lambda s: s.name != b))
+        self.assertEqual(set(query(20, 'Kate')), {Student[2], Student[3]})
+        self.assertEqual(set(query(21, 'Mary')), {Student[2], Student[4]})
+        self.assertEqual(len(query._plans), 1)
+
+    def test_sql_executed_once_per_call(self):
+        query = db.compile(lambda a: select(s.name for s in Student if s.age == a))
+        query(20)
+        db.merge_local_stats()
+        self.assertEqual(query(25), ['Mary'])
+        self.assertEqual(db.local_stats[None].db_count, 1)
+
+    def test_arguments_of_another_type(self):
+        query = db.compile(lambda x: select(s.id for s in Student if s.name in x))
+        self.assertEqual(query(('John',)), [1])
+        self.assertEqual(set(query(('John', 'Mike', 'Kate'))), {1, 2, 4})
+        self.assertEqual(len(query._plans), 2)
+
+    def test_entity_argument(self):
+        query = db.compile(lambda g: select(s.name for s in Student if s.group == g).order_by(1))
+        self.assertEqual(query(Group[1]), ['John', 'Mike'])
+        self.assertEqual(query(Group[2]), ['Kate', 'Mary'])
+
+    def test_default_argument(self):
+        query = db.compile(lambda min_age=25: select(s.name for s in Student if s.age >= min_age).order_by(1))
+        self.assertEqual(query(), ['Kate', 'Mary'])
+        self.assertEqual(query(30), ['Kate'])
+
+    def test_local_variables(self):
+        def func(age):
+            age2 = age + 1
+            return select(s.name for s in Student if s.age == age2)
+        query = db.compile(func)
+        self.assertEqual(query(19), ['John'])
+        self.assertEqual(query(21), ['Mike'])
+        self.assertEqual(len(query._plans), 1)
+
+    def test_branching_on_ordering(self):
+        def func(min_age, reverse):
+            query = select(s for s in Student if s.age > min_age)
+            return query.order_by(desc(Student.age)) if reverse else query.order_by(Student.age)
+        query = db.compile(func)
+        self.assertEqual([ s.id for s in query(20, False) ], [2, 3, 4])
+        self.assertEqual([ s.id for s in query(20, True) ], [4, 3, 2])
+        self.assertEqual([ s.id for s in query(21, False) ], [2, 3, 4])
+        self.assertEqual(len(query._plans), 2)
+
+    def test_branching_on_expression(self):
+        def func(min_age, names_only):
+            if names_only: return select(s.name for s in Student if s.age > min_age).order_by(1)
+            return select(s.age for s in Student if s.age > min_age).order_by(1)
+        query = db.compile(func)
+        self.assertEqual(query(21, True), ['Kate', 'Mary', 'Mike'])
+        self.assertEqual(query(21, False), [22, 25, 30])
+        self.assertEqual(query(24, True), ['Kate', 'Mary'])
+
+    def test_sees_unflushed_changes(self):
+        query = db.compile(lambda a: select(s.name for s in Student if s.age == a))
+        query(20)
+        Student[4].age = 40
+        self.assertEqual(query(40), ['Kate'])
+
+    def test_result_cache(self):
+        query = db.compile(lambda a: select(s.name for s in Student if s.age == a).cache())
+        self.assertEqual(query(22), ['Mike'])
+        rollback()
+        db.merge_local_stats()
+        self.assertEqual(query(22), ['Mike'])
+        self.assertEqual(db.local_stats[None].db_count, 0)
+
+    def test_query_results_of_session(self):
+        query = db.compile(lambda a: select(s for s in Student if s.age == a))
+        query(25)
+        db.merge_local_stats()
+        self.assertEqual(list(query(25)), [Student[3]])
+        self.assertEqual(db.local_stats[None].db_count, 0)
+
+    def test_prefetch(self):
+        query = db.compile(lambda a: select(s for s in Student if s.age > a).prefetch(Student.group))
+        query(20)
+        rollback()
+        students = list(query(20))
+        db.merge_local_stats()
+        self.assertEqual({ s.group.number for s in students }, {101, 102})
+        self.assertEqual(db.local_stats[None].db_count, 0)
+
+    def test_plans_limit(self):
+        def func(n):
+            query = select(s for s in Student)
+            for i in range(n): query = query.filter(lambda s: s.age > 0)
+            return query
+        size = options.COMPILED_QUERY_PLANS_SIZE
+        options.COMPILED_QUERY_PLANS_SIZE = 3
+        try: query = db.compile(func)
+        finally: options.COMPILED_QUERY_PLANS_SIZE = size
+        for n in range(5): self.assertEqual(len(query(n)), 4)
+        self.assertEqual(len(query._plans), 3)
+
+    @raises_exception(TypeError, 'Compiled function should return query object. Got: int')
+    def test_not_query(self):
+        db.compile(lambda a: count(s for s in Student if s.age > a))(20)
+
+    @raises_exception(TypeError, 'Function or lambda expected. Got: 1')
+    def test_not_function(self):
+        db.compile(1)
+
+
+if __name__ == '__main__':
+    unittest.main()
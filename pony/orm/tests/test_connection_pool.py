@@ -0,0 +1,171 @@
+from __future__ import absolute_import, print_function, division
+
+import os, shutil, tempfile, threading, time
+import unittest
+
+from pony.orm.core import *
+from pony.orm.dbapiprovider import SharedPool
+from pony.orm.tests.testutils import *
+
+
+class TestConnectionPool(unittest.TestCase):
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp()
+        self.filename = os.path.join(self.dirname, 'test.sqlite')
+
+    def tearDown(self):
+        shutil.rmtree(self.dirname, ignore_errors=True)
+
+    def make_db(self, **kwargs):
+        db = Database('sqlite', self.filename, create_db=True, **kwargs)
+        class Person(db.Entity):
+            name = Required(str)
+        db.generate_mapping(create_tables=True)
+        self.addCleanup(db.disconnect)
+        return db
+
+    def test_thread_local_pool_by_default(self):
+        db = self.make_db()
+        self.assertFalse(isinstance(db.provider.pool, SharedPool))
+        self.assertEqual(db.pool_stats, None)
+
+    def test_shared_connections(self):
+        db = self.make_db(pool_size=2)
+        pool = db.provider.pool
+        self.assertTrue(isinstance(pool, SharedPool))
+        with db_session:
+            db.Person(name='John')
+        created = db.pool_stats['created']
+        errors = []
+        barrier = threading.Barrier(6)
+        def run():
+            try:
+                barrier.wait()
+                for i in range(10):
+                    with db_session:
+                        self.assertEqual(select(p.name for p in db.Person)[:], ['John'])
+            except Exception as e:
+                errors.append(e)
+        threads = [ threading.Thread(target=run) for i in range(6) ]
+        for thread in threads: thread.start()
+        for thread in threads: thread.join()
+        self.assertEqual(errors, [])
+        stats = db.pool_stats
+        self.assertLessEqual(stats['created'] - created, 2)
+        self.assertEqual(stats['size'], stats['idle'])
+        self.assertEqual(stats['in_use'], 0)
+        self.assertGreaterEqual(stats['checkouts'], 60)
+
+    def test_on_connect_called_once_per_connection(self):
+        db = Database()
+        class Person(db.Entity):
+            name = Required(str)
+        connections = []
+        @db.on_connect(provider='sqlite')
+        def on_connect(db, connection):
+            connections.append(connection)
+        db.bind('sqlite', self.filename, create_db=True, pool_size=1)
+        db.generate_mapping(create_tables=True)
+        self.addCleanup(db.disconnect)
+        with db_session:
+            select(p for p in Person)[:]
+        count = len(connections)
+        for i in range(3):
+            with db_session:
+                select(p for p in Person)[:]
+        self.assertEqual(len(connections), count)
+        self.assertEqual(db.pool_stats['size'], 1)
+
+    def test_timeout(self):
+        db = self.make_db(pool_size=1, pool_timeout=0.05)
+        provider = db.provider
+        con, is_new = provider.connect()
+        try:
+            with self.assertRaises(PoolTimeoutError):
+                provider.connect()
+        finally:
+            provider.release(con)
+        stats = db.pool_stats
+        self.assertEqual(stats['timeouts'], 1)
+        self.assertEqual(stats['waits'], 0)
+        con2, is_new = provider.connect()
+        self.assertTrue(con2 is con)
+        provider.release(con2)
+
+    def test_wait_for_released_connection(self):
+        db = self.make_db(pool_size=1, pool_timeout=5)
+        provider = db.provider
+        con, is_new = provider.connect()
+        def release():
+            time.sleep(0.05)
+            provider.release(con)
+        thread = threading.Thread(target=release)
+        thread.start()
+        con2, is_new = provider.connect()
+        thread.join()
+        self.assertTrue(con2 is con)
+        provider.release(con2)
+        stats = db.pool_stats
+        self.assertEqual(stats['waits'], 1)
+        self.assertGreater(stats['wait_time'], 0)
+
+    def test_idle_eviction(self):
+        db = self.make_db(pool_size=3, pool_min_size=1, pool_max_idle_time=0.05)
+        provider = db.provider
+        connections = [ provider.connect()[0] for i in range(3) ]
+        for con in connections: provider.release(con)
+        self.assertEqual(db.pool_stats['idle'], 3)
+        time.sleep(0.1)
+        con, is_new = provider.connect()
+        stats = db.pool_stats
+        self.assertEqual(stats['idle_evictions'], 2)
+        self.assertEqual(stats['size'], 1)
+        provider.release(con)
+
+    def test_max_lifetime(self):
+        db = self.make_db(pool_size=2, pool_max_lifetime=0.05)
+        provider = db.provider
+        con, is_new = provider.connect()
+        time.sleep(0.1)
+        provider.release(con)
+        stats = db.pool_stats
+        self.assertEqual(stats['lifetime_evictions'], 1)
+        self.assertEqual(stats['size'], 0)
+        con2, is_new = provider.connect()
+        self.assertTrue(is_new)
+        self.assertFalse(con2 is con)
+        provider.release(con2)
+
+    def test_pre_ping(self):
+        db = self.make_db(pool_size=1, pool_pre_ping=True)
+        provider = db.provider
+        con, is_new = provider.connect()
+        provider.release(con)
+        con.close()
+        con2, is_new = provider.connect()
+        self.assertFalse(con2 is con)
+        self.assertTrue(is_new)
+        provider.release(con2)
+        self.assertEqual(db.pool_stats['failed_pings'], 1)
+
+    def test_drop(self):
+        db = self.make_db(pool_size=1)
+        provider = db.provider
+        closed = db.pool_stats['closed']
+        con, is_new = provider.connect()
+        provider.drop(con)
+        stats = db.pool_stats
+        self.assertEqual(stats['size'], 0)
+        self.assertEqual(stats['closed'] - closed, 1)
+
+    @raises_exception(ValueError, 'pool_min_size must be integer in range 0..1. Got: 2')
+    def test_incorrect_min_size(self):
+        self.make_db(pool_size=1, pool_min_size=2)
+
+    @raises_exception(TypeError, 'Shared connection pool cannot be used with in-memory SQLite database')
+    def test_in_memory_db(self):
+        Database('sqlite', ':memory:', pool_size=2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,161 @@
+from __future__ import absolute_import, print_function, division
+
+import time
+import unittest
+
+from pony.orm.core import *
+from pony.orm.tests.testutils import *
+from pony.orm.tests import setup_database, teardown_database
+
+db = Database()
+
+
+class Country(db.Entity):
+    _cache_ = dict(ttl=60, max_size=100)
+    code = PrimaryKey(str)
+    name = Required(str)
+    cities = Set('City')
+
+
+class City(db.Entity):
+    name = Required(str)
+    country = Required(Country)
+
+
+class TestEntityCache(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        setup_database(db)
+        with db_session:
+            Country(code='NL', name='Netherlands')
+            Country(code='DE', name='Germany')
+            City(name='Amsterdam', country='NL')
+
+    @classmethod
+    def tearDownClass(cls):
+        teardown_database(db)
+
+    def setUp(self):
+        Country._second_level_cache_.clear()
+
+    def count_queries(self, func):
+        with db_session:
+            db.merge_local_stats()
+            result = func()
+            return result, db.local_stats[None].db_count
+
+    def test_get_by_pk(self):
+        name, count = self.count_queries(lambda: Country['NL'].name)
+        self.assertEqual((name, count), ('Netherlands', 1))
+        name, count = self.count_queries(lambda: Country['NL'].name)
+        self.assertEqual((name, count), ('Netherlands', 0))
+        stats = Country._second_level_cache_.stats
+        self.assertEqual(stats['hits'], 1)
+
+    def test_query_populates_cache(self):
+        with db_session:
+            select(c for c in Country)[:]
+        name, count = self.count_queries(lambda: Country.get(code='DE').name)
+        self.assertEqual((name, count), ('Germany', 0))
+
+    def test_seed_loading(self):
+        self.count_queries(lambda: Country['NL'])
+        name, count = self.count_queries(lambda: City.get(name='Amsterdam').country.name)
+        self.assertEqual((name, count), ('Netherlands', 1))
+
+    def test_invalidation_on_update(self):
+        with db_session:
+            Country['NL'].name = 'Holland'
+        with db_session:
+            self.assertEqual(Country['NL'].name, 'Holland')
+            Country['NL'].name = 'Netherlands'
+        name, count = self.count_queries(lambda: Country['NL'].name)
+        self.assertEqual((name, count), ('Netherlands', 1))
+
+    def test_invalidation_on_delete(self):
+        with db_session:
+            Country(code='FR', name='France')
+        with db_session:
+            Country['FR'].name
+        with db_session:
+            Country['FR'].delete()
+        with db_session:
+            self.assertFalse(Country.exists(code='FR'))
+
+    def test_invalidation_on_bulk_delete(self):
+        with db_session:
+            Country(code='BE', name='Belgium')
+        with db_session:
+            Country['BE'].name
+        with db_session:
+            delete(c for c in Country if c.code == 'BE')
+        self.assertEqual(len(Country._second_level_cache_.data), 0)
+
+    def test_no_caching_inside_transaction(self):
+        with db_session:
+            Country['NL'].name = 'Holland'
+            flush()
+            select(c for c in Country)[:]
+            rollback()
+        with db_session:
+            self.assertEqual(Country['NL'].name, 'Netherlands')
+
+    def test_concurrent_commit_during_fetch(self):
+        def hook(event):
+            if event.phase == 'fetch' and event.entity is Country:
+                # the same as a commit of the Country table by a concurrent db_session after the rows were read
+                db._result_cache.invalidate([ Country._table_ ])
+        db.add_hook(hook)
+        try:
+            with db_session:
+                select(c for c in Country)[:]
+        finally:
+            db.remove_hook(hook)
+        self.assertEqual(len(Country._second_level_cache_.data), 0)
+        with db_session:
+            select(c for c in Country)[:]
+        self.assertEqual(len(Country._second_level_cache_.data), 2)
+
+    def test_ttl(self):
+        Country._second_level_cache_.ttl = 0.01
+        try:
+            self.count_queries(lambda: Country['NL'])
+            time.sleep(0.02)
+            name, count = self.count_queries(lambda: Country['NL'].name)
+            self.assertEqual(count, 1)
+            self.assertGreaterEqual(Country._second_level_cache_.stats['expired'], 1)
+        finally:
+            Country._second_level_cache_.ttl = 60
+
+    def test_not_cached_entity(self):
+        self.assertEqual(City._second_level_cache_, None)
+
+    def test_custom_backend(self):
+        class Backend(EntityCache):
+            def __init__(self): self.data = {}
+            def get(self, key): return self.data.get(key)
+            def set(self, key, data): self.data[key] = data
+            def delete(self, key): self.data.pop(key, None)
+            def clear(self): self.data.clear()
+        backend = Backend()
+        db2 = Database()
+        class Plan(db2.Entity):
+            _cache_ = backend
+            name = Required(str)
+        setup_database(db2)
+        with db_session:
+            Plan(id=1, name='free')
+        with db_session:
+            Plan[1].name
+        self.assertEqual(backend.data, {('Plan', (1,)): {'id': (1,), 'name': ('free',)}})
+        teardown_database(db2)
+
+    @raises_exception(TypeError, '_cache_ option must be bool, dict or EntityCache instance. Got: 10')
+    def test_incorrect_option(self):
+        db2 = Database()
+        class Plan(db2.Entity):
+            _cache_ = 10
+
+
+if __name__ == '__main__':
+    unittest.main()
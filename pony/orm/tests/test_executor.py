@@ -0,0 +1,85 @@
+from __future__ import absolute_import, print_function, division
+
+import asyncio, os, shutil, tempfile, threading
+import unittest
+
+from pony.orm.core import *
+from pony.orm.tests.testutils import *
+
+db = Database()
+
+
+class Person(db.Entity):
+    name = Required(str)
+    age = Required(int)
+
+
+class TestExecutor(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.dirname = tempfile.mkdtemp()
+        db.bind('sqlite', os.path.join(cls.dirname, 'test.sqlite'), create_db=True)
+        db.generate_mapping(create_tables=True)
+
+    @classmethod
+    def tearDownClass(cls):
+        db.shutdown_executor()
+        db.disconnect()
+        shutil.rmtree(cls.dirname, ignore_errors=True)
+
+    def setUp(self):
+        with db_session:
+            Person.select().delete(bulk=True)
+            Person(name='John', age=20)
+            Person(name='Mike', age=30)
+
+    def run_async(self, coroutine):
+        loop = asyncio.new_event_loop()
+        try: return loop.run_until_complete(coroutine)
+        finally: loop.close()
+
+    def test_submit(self):
+        def add_person(name, age):
+            Person(name=name, age=age)
+            return threading.current_thread()
+        thread = db.submit(add_person, 'Kate', age=40).result()
+        self.assertFalse(thread is threading.current_thread())
+        with db_session:
+            self.assertEqual(Person.get(name='Kate').age, 40)
+
+    def test_rollback_on_exception(self):
+        def add_person():
+            Person(name='Kate', age=40)
+            1 / 0
+        with self.assertRaises(ZeroDivisionError):
+            db.submit(add_person).result()
+        with db_session:
+            self.assertFalse(Person.exists(name='Kate'))
+
+    def test_run_in_executor(self):
+        async def main():
+            return await db.run_in_executor(lambda: select(p.name for p in Person).order_by(1)[:])
+        self.assertEqual(list(self.run_async(main())), ['John', 'Mike'])
+
+    def test_fetch_in_executor(self):
+        async def main():
+            persons = await select(p for p in Person if p.age > 25).fetch_in_executor()
+            return [ p.name for p in persons ]
+        self.assertEqual(self.run_async(main()), ['Mike'])
+
+    def test_gather(self):
+        async def main():
+            queries = [ select(p for p in Person if p.age > x).fetch_in_executor() for x in range(0, 40, 10) ]
+            return [ len(result) for result in await asyncio.gather(*queries) ]
+        self.assertEqual(self.run_async(main()), [2, 2, 1, 0])
+
+    def test_max_workers(self):
+        self.assertEqual(db._get_executor()._max_workers, pony.options.EXECUTOR_MAX_WORKERS)
+
+    @raises_exception(MappingError, 'Database object is not bound with a provider yet')
+    def test_unbound_database(self):
+        Database().submit(lambda: None)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+from __future__ import absolute_import, print_function, division
+
+import unittest
+
+from pony import options
+from pony.orm.core import *
+from pony.orm.core import pad_in_list
+from pony.orm.tests.testutils import *
+from pony.orm.tests import setup_database, teardown_database
+
+db = Database()
+
+
+class Person(db.Entity):
+    name = Required(str)
+    age = Required(int)
+
+
+class TestInListPadding(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        setup_database(db)
+        with db_session:
+            for i in range(1, 21): Person(id=i, name='P%d' % i, age=i % 5)
+
+    @classmethod
+    def tearDownClass(cls):
+        teardown_database(db)
+
+    def setUp(self):
+        db._translator_cache.clear()
+        db._translator_cache.reset_stats()
+
+    @db_session
+    def test_translator_reuse(self):
+        for n in range(3, 17):
+            ids = list(range(1, n + 1))
+            self.assertEqual(count(p for p in Person if p.id in ids), n)
+        # lengths 3..16 are padded to 4, 8 and 16
+        self.assertEqual(db.cache_stats['translator']['misses'], 3)
+
+    @db_session
+    def test_sql_text(self):
+        ids = [1, 2, 3, 4, 5]
+        select(p for p in Person if p.id in ids)[:]
+        self.assertEqual(db.last_sql.count('?'), 8)
+
+    @db_session
+    def test_not_in(self):
+        ids = [1, 2, 3, 4, 5]
+        self.assertEqual(count(p for p in Person if p.id not in ids), 15)
+
+    @db_session
+    def test_objects(self):
+        persons = Person.select(lambda p: p.id <= 3)[:]
+        result = select(p.id for p in Person if p in persons)[:]
+        self.assertEqual(sorted(result), [1, 2, 3])
+
+    @db_session
+    def test_filter(self):
+        ids = [1, 2, 3, 4, 5, 6, 7]
+        result = Person.select().filter(lambda p: p.id in ids)[:]
+        self.assertEqual(len(result), 7)
+
+    @db_session
+    def test_tuple_comparison_is_not_padded(self):
+        t = ('P1', 1, 1)
+        result = select(p.id for p in Person if (p.name, p.age, p.id) == t)[:]
+        self.assertEqual(result, [1])
+
+    @db_session
+    def test_mixed_usage_is_not_padded(self):
+        t = ('P1', 1, 1)
+        result = select(p.id for p in Person if p.name in t or (p.name, p.age, p.id) == t)[:]
+        self.assertEqual(result, [1])
+
+    @db_session
+    def test_max_params_count(self):
+        size = 1 << (db.provider.max_params_count.bit_length() - 1)
+        ids = list(range(1, size + 2))  # the padded list would exceed max_params_count
+        self.assertEqual(count(p for p in Person if p.id in ids), 20)
+        self.assertEqual(db.last_sql.count('?'), size + 1)
+        ids = list(range(1, size // 2 + 2))
+        self.assertEqual(count(p for p in Person if p.id in ids), 20)
+        self.assertEqual(db.last_sql.count('?'), size)
+
+    @db_session
+    def test_max_in_list_size(self):
+        provider = db.provider
+        provider.max_in_list_size = 10
+        try:
+            ids = list(range(1, 10))
+            select(p for p in Person if p.id in ids)[:]
+            self.assertEqual(db.last_sql.count('?'), 9)
+            ids = list(range(1, 8))
+            select(p for p in Person if p.id in ids)[:]
+            self.assertEqual(db.last_sql.count('?'), 8)
+        finally:
+            del provider.max_in_list_size
+
+    def test_pad_in_list_limit(self):
+        items = tuple(range(513))
+        self.assertEqual(pad_in_list((int,) * 513, items, 1000), ((int,) * 513, items))
+        self.assertEqual(len(pad_in_list((int,) * 500, items[:500], 1000)[1]), 512)
+
+    @db_session
+    def test_disabled(self):
+        options.IN_LIST_PADDING = False
+        try:
+            ids = [1, 2, 3]
+            select(p for p in Person if p.id in ids)[:]
+            self.assertEqual(db.last_sql.count('?'), 3)
+        finally:
+            options.IN_LIST_PADDING = True
+
+
+if __name__ == '__main__':
+    unittest.main()
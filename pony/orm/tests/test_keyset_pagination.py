@@ -0,0 +1,136 @@
+from __future__ import absolute_import, print_function, division
+
+import unittest
+from datetime import datetime
+
+from pony.orm.core import *
+from pony.orm.tests.testutils import *
+from pony.orm.tests import setup_database, teardown_database
+
+db = Database()
+
+
+class Group(db.Entity):
+    number = Required(int)
+    students = Set('Student')
+
+
+class Student(db.Entity):
+    name = Required(str)
+    age = Required(int)
+    created = Required(datetime)
+    group = Required(Group)
+    nickname = Optional(str)
+    rating = Optional(int)
+
+
+class TestKeysetPagination(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        setup_database(db)
+        with db_session:
+            g1 = Group(id=1, number=101)
+            g2 = Group(id=2, number=102)
+            for i in range(1, 11):
+                Student(id=i, name='S%d' % (i % 4), age=20 + i % 3, created=datetime(2020, 1, i, 12, 30),
+                        group=g1 if i <= 6 else g2, nickname='N%d' % (i % 3) if i % 2 else '',
+                        rating=i if i % 3 else None)
+
+    @classmethod
+    def tearDownClass(cls):
+        teardown_database(db)
+
+    def setUp(self):
+        rollback()
+        db_session.__enter__()
+
+    def tearDown(self):
+        rollback()
+        db_session.__exit__()
+
+    def iterate_pages(self, query, pagesize, use_cursor=False):
+        pages = []
+        key = None
+        while True:
+            page = query.page_after(key, pagesize)[:]
+            if not page: break
+            pages.append([ s.id for s in page ])
+            key = query.get_cursor(page[-1]) if use_cursor else page[-1]
+        return pages
+
+    def test_primary_key(self):
+        self.assertEqual(self.iterate_pages(Student.select(), 4), [[1, 2, 3, 4], [5, 6, 7, 8], [9, 10]])
+        self.assertIn('LIMIT 4', db.last_sql)
+        self.assertNotIn('OFFSET', db.last_sql)
+
+    def test_attributes(self):
+        query = Student.select().order_by(Student.age, desc(Student.name))
+        expected = [ s.id for s in sorted(Student.select(), key=lambda s: (s.age, -int(s.name[1:]), s.id)) ]
+        pages = self.iterate_pages(query, 3)
+        self.assertEqual([ id for page in pages for id in page ], expected)
+        self.assertEqual([ len(page) for page in pages ], [3, 3, 3, 1])
+
+    def test_lambda_ordering(self):
+        query = select(s for s in Student if s.age > 20).order_by(lambda s: desc(s.created))
+        self.assertEqual(self.iterate_pages(query, 3), [[10, 8, 7], [5, 4, 2], [1]])
+
+    def test_cursor(self):
+        query = Student.select().order_by(Student.created)
+        self.assertEqual(self.iterate_pages(query, 4, use_cursor=True), [[1, 2, 3, 4], [5, 6, 7, 8], [9, 10]])
+
+    def test_tuple_key(self):
+        query = Student.select().order_by(Student.group, desc(Student.age))
+        self.assertEqual([ s.id for s in query.seek((1, 22, 2))[:] ], [5, 1, 4, 3, 6, 8, 7, 10, 9])
+
+    def test_row_value_syntax(self):
+        translator_cls = db.provider.translator_cls
+        prev_row_value_syntax = translator_cls.row_value_syntax
+        translator_cls.row_value_syntax = True
+        try:
+            query = Student.select().order_by(Student.age)
+            self.assertEqual([ s.id for s in query.page_after((21, 4), 3) ], [7, 10, 2])
+            self.assertIn('("s"."age", "s"."id") > (?, ?)', db.last_sql)
+        finally:
+            translator_cls.row_value_syntax = prev_row_value_syntax
+            db._translator_cache.clear()
+            db._constructed_sql_cache.clear()
+
+    def test_collection(self):
+        group = Group[1]
+        self.assertEqual([ s.id for s in group.students.page_after(None, 4) ], [1, 2, 3, 4])
+        self.assertEqual([ s.id for s in group.students.page_after(Student[4], 4) ], [5, 6])
+
+    @raises_exception(ValueError, 'Cursor does not correspond to ordering of the query')
+    def test_cursor_of_another_query(self):
+        cursor = Student.select().get_cursor(Student[1])
+        Student.select().order_by(Student.age).seek(cursor)
+
+    @raises_exception(ValueError, "Invalid cursor: 'abc'")
+    def test_invalid_cursor(self):
+        Student.select().seek('abc')
+
+    @raises_exception(TypeError, 'Seek key should contain 2 values (age, id). Got: 1')
+    def test_incorrect_key_length(self):
+        Student.select().order_by(Student.age).seek((20,))
+
+    @raises_exception(TypeError, 'Keyset pagination requires query to be ordered by attributes of Student entity')
+    def test_expression_ordering(self):
+        Student.select().order_by(lambda s: s.age * 2).seek(None)
+
+    def test_optional_str(self):
+        # Optional str attributes are not nullable, missing values are stored as empty strings
+        query = Student.select().order_by(Student.nickname)
+        expected = [ s.id for s in sorted(Student.select(), key=lambda s: (s.nickname, s.id)) ]
+        self.assertEqual([ id for page in self.iterate_pages(query, 3) for id in page ], expected)
+
+    @raises_exception(TypeError, 'Keyset pagination cannot use nullable attribute Student.rating for ordering')
+    def test_nullable_attribute(self):
+        Student.select().order_by(Student.rating).page_after(None, 3)
+
+    @raises_exception(TypeError, 'Keyset pagination is limited to queries which return simple list of objects')
+    def test_not_entity(self):
+        select(s.name for s in Student).seek(None)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,36 @@
+from __future__ import absolute_import, print_function, division
+
+import os, subprocess, sys
+import unittest
+
+import pony
+
+
+class TestLazyImports(unittest.TestCase):
+    def get_imported_modules(self, code):
+        env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.dirname(os.path.abspath(pony.__file__))))
+        code += '; import sys; print(" ".join(sorted(sys.modules)))'
+        output = subprocess.check_output([ sys.executable, '-c', code ], env=env)
+        return set(output.decode('ascii').split())
+
+    def test_import_orm(self):
+        modules = self.get_imported_modules('import pony.orm')
+        for name in ('pony.orm.sqltranslation', 'pony.orm.sqlbuilding', 'pony.orm.dbschema',
+                     'pony.orm.serialization', 'pony.orm.dbproviders.sqlite', 'asyncio', 'concurrent.futures'):
+            self.assertNotIn(name, modules)
+
+    def test_declare_entities(self):
+        modules = self.get_imported_modules(
+            'from pony.orm import *; db = Database(); '
+            'type("Person", (db.Entity,), dict(name=Required(str)))')
+        self.assertNotIn('pony.orm.sqltranslation', modules)
+        self.assertNotIn('pony.orm.dbproviders.sqlite', modules)
+
+    def test_bind(self):
+        modules = self.get_imported_modules('from pony.orm import *; db = Database("sqlite", ":memory:")')
+        self.assertIn('pony.orm.dbproviders.sqlite', modules)
+        self.assertIn('pony.orm.sqltranslation', modules)
+
+
+if __name__ == '__main__':
+    unittest.main()
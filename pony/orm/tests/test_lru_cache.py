@@ -0,0 +1,134 @@
+from __future__ import absolute_import, print_function, division
+
+import unittest
+
+from pony.orm.core import *
+from pony.orm.tests.testutils import *
+from pony.orm.tests import setup_database, teardown_database
+from pony.orm.asttranslation import extractors_cache
+from pony.utils import LRUCache, codeobjects, get_codeobject_id
+
+
+class TestLRUCache(unittest.TestCase):
+    def test_eviction(self):
+        cache = LRUCache(2)
+        cache['a'] = 1
+        cache['b'] = 2
+        self.assertEqual(cache.get('a'), 1)
+        cache['c'] = 3
+        self.assertEqual(len(cache), 2)
+        self.assertTrue('a' in cache)
+        self.assertFalse('b' in cache)
+        self.assertEqual(cache.stats, dict(size=2, maxsize=2, hits=1, misses=0, evictions=1))
+
+    def test_miss(self):
+        cache = LRUCache(2)
+        self.assertEqual(cache.get('x'), None)
+        with self.assertRaises(KeyError):
+            cache['x']
+        self.assertEqual(cache.stats['misses'], 2)
+
+    def test_unlimited(self):
+        cache = LRUCache()
+        for i in range(100): cache[i] = i
+        self.assertEqual(len(cache), 100)
+        self.assertEqual(cache.evictions, 0)
+
+    def test_resize(self):
+        cache = LRUCache()
+        for i in range(10): cache[i] = i
+        cache.resize(3)
+        self.assertEqual(sorted(cache.data), [7, 8, 9])
+        self.assertEqual(cache.evictions, 7)
+
+    def test_pop(self):
+        cache = LRUCache(2)
+        cache['a'] = 1
+        self.assertEqual(cache.pop('a'), 1)
+        self.assertEqual(cache.pop('a'), None)
+
+    @raises_exception(ValueError, 'Cache size must be positive integer or None. Got: 0')
+    def test_incorrect_size(self):
+        LRUCache(0)
+
+
+db = Database()
+
+
+class Person(db.Entity):
+    name = Required(str)
+    age = Required(int)
+
+
+class TestDatabaseCaches(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        setup_database(db)
+        with db_session:
+            Person(name='John', age=20)
+            Person(name='Mike', age=30)
+
+    @classmethod
+    def tearDownClass(cls):
+        teardown_database(db)
+
+    def setUp(self):
+        self.prev_size = db._translator_cache.maxsize
+        db._translator_cache.clear()
+        db._translator_cache.reset_stats()
+
+    def tearDown(self):
+        db._translator_cache.resize(self.prev_size)
+
+    @db_session
+    def test_translator_cache_hits(self):
+        for age in (20, 30, 40):
+            select(p for p in Person if p.age > age)[:]
+        stats = db.cache_stats['translator']
+        self.assertEqual(stats['size'], 1)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['hits'], 2)
+
+    @db_session
+    def test_translator_cache_eviction(self):
+        db._translator_cache.resize(2)
+        for i in range(5):
+            select('p for p in Person if p.age > %d' % i)[:]
+        stats = db.cache_stats['translator']
+        self.assertEqual(stats['size'], 2)
+        self.assertEqual(stats['evictions'], 3)
+
+    @db_session
+    def test_extractors_cache_eviction(self):
+        prev_size = extractors_cache.maxsize
+        extractors_cache.resize(2)
+        try:
+            for i in range(5):
+                select('p for p in Person if p.age > %d' % i)[:]
+            self.assertEqual(len(extractors_cache), 2)
+        finally:
+            extractors_cache.resize(prev_size)
+
+    def test_codeobject_key_after_eviction(self):
+        code1 = (lambda: 1).__code__
+        code2 = (lambda: 2).__code__
+        prev_size = codeobjects.maxsize
+        codeobjects.resize(1)
+        try:
+            key1 = get_codeobject_id(code1)
+            self.assertEqual(get_codeobject_id(code1), key1)
+            key2 = get_codeobject_id(code2)
+            self.assertNotEqual(key2, key1)
+            self.assertNotIn(get_codeobject_id(code1), (key1, key2))
+        finally:
+            codeobjects.resize(prev_size)
+
+    def test_cache_stats_keys(self):
+        self.assertEqual(set(db.cache_stats), { 'translator', 'constructed_sql', 'insert', 'query_results',
+                                                'decompiler', 'adapted_sql', 'string2ast', 'extractors' })
+        for stats in db.cache_stats.values():
+            self.assertIn('maxsize', stats)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+from __future__ import absolute_import, print_function, division
+
+import unittest
+
+from pony.orm.core import *
+from pony.orm.tests.testutils import *
+from pony.orm.tests import setup_database, teardown_database
+
+db = Database()
+
+
+class Group(db.Entity):
+    number = Required(int)
+    students = Set('Student')
+
+
+class Student(db.Entity):
+    name = Required(str)
+    biography = Optional(LongStr)
+    group = Required(Group)
+    courses = Set('Course')
+
+
+class Course(db.Entity):
+    name = Required(str)
+    students = Set(Student)
+
+
+class TestPrefetchPlanner(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        setup_database(db)
+        with db_session:
+            c1 = Course(name='Math')
+            c2 = Course(name='Physics')
+            for i in range(3):
+                g = Group(number=100 + i)
+                for j in range(3):
+                    Student(name='S%d%d' % (i, j), biography='B%d%d' % (i, j), group=g, courses=[c1, c2])
+
+    @classmethod
+    def tearDownClass(cls):
+        teardown_database(db)
+
+    def setUp(self):
+        db.enable_prefetch_planner(threshold=2)
+
+    def tearDown(self):
+        db.disable_prefetch_planner()
+
+    def run_session(self, func):
+        with db_session:
+            db.merge_local_stats()
+            func()
+            return db.local_stats[None].db_count
+
+    def test_lazy_attribute(self):
+        def func():
+            for s in select(s for s in Student):
+                s.biography
+        self.assertEqual(self.run_session(func), 10)
+        self.assertEqual(self.run_session(func), 10)
+        self.assertEqual(self.run_session(func), 1)
+        [ entry ] = db.nplus1_report()
+        self.assertEqual(entry['attr'], Student.biography)
+        self.assertEqual((entry['sessions'], entry['loads'], entry['prefetched']), (2, 18, True))
+        self.assertEqual(entry['query'], '(s for s in Student)')
+
+    def test_collection(self):
+        def func():
+            for g in Group.select(lambda g: g.number > 0):
+                len(g.students)
+        self.assertEqual(self.run_session(func), 3)  # Set.load prefetches collections after the first load
+        self.run_session(func)
+        self.assertEqual(self.run_session(func), 2)
+        [ entry ] = db.nplus1_report()
+        self.assertEqual(entry['attr'], Group.students)
+        self.assertEqual(entry['query'], '(g for g in Group if g.number > 0)')
+        self.assertTrue(entry['prefetched'])
+
+    def test_reference(self):
+        def func():
+            for s in select(s for s in Student if s.name != 'X'):
+                s.group.number
+        self.assertEqual(self.run_session(func), 2)
+        self.run_session(func)
+        self.assertEqual(self.run_session(func), 2)
+        [ entry ] = db.nplus1_report()
+        self.assertEqual((entry['attr'], entry['loads'], entry['prefetched']), (Student.group, 2, True))
+
+    def test_different_queries(self):
+        def func1():
+            for s in select(s for s in Student if s.name > 'A'):
+                s.biography
+        def func2():
+            for s in select(s for s in Student if s.name > 'B'):
+                s.biography
+        self.run_session(func1)
+        self.run_session(func2)
+        self.assertEqual([ entry['prefetched'] for entry in db.nplus1_report() ], [False, False])
+
+    def test_detection_only(self):
+        db.enable_prefetch_planner(threshold=1, auto_prefetch=False)
+        def func():
+            for s in select(s for s in Student if s.name < 'Z'):
+                s.biography
+        self.run_session(func)
+        self.assertEqual(self.run_session(func), 10)
+        [ entry ] = db.nplus1_report()
+        self.assertEqual((entry['sessions'], entry['prefetched']), (2, True))
+
+    def test_disabled(self):
+        db.disable_prefetch_planner()
+        with db_session:
+            for s in select(s for s in Student): s.biography
+        self.assertEqual(db.nplus1_report(), [])
+
+    @raises_exception(ValueError, 'threshold must be positive integer. Got: 0')
+    def test_incorrect_threshold(self):
+        db.enable_prefetch_planner(threshold=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+from __future__ import absolute_import, print_function, division
+
+import unittest
+
+from pony.orm.core import *
+from pony.orm.dbapiprovider import convert_to_prepared
+from pony.orm.tests.testutils import *
+from pony.orm.tests import db_params, only_for
+
+
+@only_for('postgres')
+class TestPreparedStatements(unittest.TestCase):
+    def setUp(self):
+        self.db = db = Database(prepare_threshold=2, max_prepared_statements=2, **db_params)
+        class Person(db.Entity):
+            name = Required(str)
+            age = Required(int)
+        db.generate_mapping(check_tables=False)
+        db.drop_all_tables(with_all_data=True)
+        db.create_tables()
+        with db_session:
+            Person(name='John', age=20)
+            Person(name='Mike', age=30)
+        self.Person = Person
+
+    def tearDown(self):
+        self.db.drop_all_tables(with_all_data=True)
+        self.db.disconnect()
+
+    def prepared_statements(self):
+        with db_session:
+            return set(self.db.select('name from pg_prepared_statements'))
+
+    def test_hot_statement_is_prepared(self):
+        Person = self.Person
+        for age in range(5):
+            with db_session:
+                select(p for p in Person if p.age > age)[:]
+        self.assertEqual(len([ name for name in self.prepared_statements() if name.startswith('pony_stmt_') ]), 1)
+        with db_session:
+            self.assertEqual(select(p.name for p in Person if p.age > 25)[:], ['Mike'])
+
+    def test_max_prepared_statements(self):
+        Person = self.Person
+        for i in range(3):
+            for x in range(3):
+                with db_session:
+                    select(p for p in Person if p.age > x and p.name != str(i))[:]
+                    select(p for p in Person if p.age < x)[:]
+                    select(p for p in Person if p.name == str(x))[:]
+        self.assertLessEqual(len([ name for name in self.prepared_statements() if name.startswith('pony_stmt_') ]), 2)
+
+    def test_update_rowcount(self):
+        Person = self.Person
+        for age in range(4):
+            with db_session:
+                Person.get(name='John').age = age
+        with db_session:
+            self.assertEqual(Person.get(name='John').age, 3)
+
+    @raises_exception(ValueError, 'prepare_threshold must be non-negative integer or None. Got: -1')
+    def test_incorrect_threshold(self):
+        Database(prepare_threshold=-1, **db_params)
+
+
+class TestConvertToPrepared(unittest.TestCase):
+    def test_no_arguments(self):
+        self.assertEqual(convert_to_prepared('s1', 'SELECT 1', False), ('PREPARE s1 AS SELECT 1', 'EXECUTE s1'))
+
+    def test_positional_params(self):
+        prepare_sql, execute_sql = convert_to_prepared('s1', 'SELECT * FROM t WHERE a = %s AND b > %s', True)
+        self.assertEqual(prepare_sql, 'PREPARE s1 AS SELECT * FROM t WHERE a = $1 AND b > $2')
+        self.assertEqual(execute_sql, 'EXECUTE s1 (%s, %s)')
+
+    def test_named_params(self):
+        prepare_sql, execute_sql = convert_to_prepared('s1', 'SELECT * FROM t WHERE a = %(p1)s OR b = %(p2)s OR c = %(p1)s', True)
+        self.assertEqual(prepare_sql, 'PREPARE s1 AS SELECT * FROM t WHERE a = $1 OR b = $2 OR c = $1')
+        self.assertEqual(execute_sql, 'EXECUTE s1 (%(p1)s, %(p2)s)')
+
+    def test_escaped_percent(self):
+        prepare_sql, execute_sql = convert_to_prepared('s1', "SELECT * FROM t WHERE a LIKE 'x%%' AND b = %s", True)
+        self.assertEqual(prepare_sql, "PREPARE s1 AS SELECT * FROM t WHERE a LIKE 'x%' AND b = $1")
+        self.assertEqual(execute_sql, 'EXECUTE s1 (%s)')
+
+    def test_arguments_without_params(self):
+        self.assertEqual(convert_to_prepared('s1', "SELECT '100%%'", True), ("PREPARE s1 AS SELECT '100%'", 'EXECUTE s1'))
+
+
+@only_for('cockroach')
+class TestCockroachPreparedStatements(unittest.TestCase):
+    @raises_exception(TypeError, 'CockroachDB does not support prepared statements, prepare_threshold must be None')
+    def test_prepare_threshold(self):
+        Database(prepare_threshold=2, **db_params)
+
+
+if __name__ == '__main__':
+    unittest.main()
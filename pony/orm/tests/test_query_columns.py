@@ -0,0 +1,109 @@
+from __future__ import absolute_import, print_function, division
+
+import unittest
+from array import array
+from datetime import date
+from decimal import Decimal
+
+from pony.orm.core import *
+from pony.orm.tests.testutils import *
+from pony.orm.tests import setup_database, teardown_database
+
+try: import numpy
+except ImportError: numpy = None
+
+db = Database()
+
+
+class Customer(db.Entity):
+    name = Required(str)
+    orders = Set('Order')
+
+
+class Order(db.Entity):
+    customer = Required(Customer)
+    date = Required(date)
+    amount = Required(float)
+    quantity = Optional(int)
+    paid = Required(bool)
+    total = Required(Decimal)
+
+
+class TestQueryColumns(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        setup_database(db)
+        with db_session:
+            c1 = Customer(id=1, name='John')
+            c2 = Customer(id=2, name='Mike')
+            for i in range(1, 8):
+                Order(id=i, customer=c1 if i % 2 else c2, date=date(2020, 1, i), amount=i * 1.5,
+                      quantity=i if i != 3 else None, paid=i > 4, total=Decimal(i))
+
+    @classmethod
+    def tearDownClass(cls):
+        teardown_database(db)
+
+    def setUp(self):
+        rollback()
+        db_session.__enter__()
+
+    def tearDown(self):
+        rollback()
+        db_session.__exit__()
+
+    def test_typed_columns(self):
+        query = select((o.id, o.amount, o.paid, o.date) for o in Order).order_by(1)
+        ids, amounts, paid, dates = query.to_columns()
+        self.assertEqual((ids.name, ids.py_type), ('o.id', int))
+        self.assertEqual(ids.values, array('q', range(1, 8)))
+        self.assertEqual(amounts.values, array('d', [ i * 1.5 for i in range(1, 8) ]))
+        self.assertEqual(paid.values, array('b', [ 0, 0, 0, 0, 1, 1, 1 ]))
+        self.assertEqual(dates.values, [ date(2020, 1, i) for i in range(1, 8) ])
+        self.assertTrue(all(column.mask is None for column in (ids, amounts, paid, dates)))
+
+    def test_nulls(self):
+        query = select((o.id, o.quantity) for o in Order).order_by(1)
+        for batch_size in (2, 1000):
+            ids, quantities = query.to_columns(batch_size)
+            self.assertEqual(quantities.values, array('q', [ 1, 2, 0, 4, 5, 6, 7 ]))
+            self.assertEqual(quantities.mask, bytearray([ 0, 0, 1, 0, 0, 0, 0 ]))
+            self.assertIsNone(ids.mask)
+
+    def test_single_expression(self):
+        [ totals ] = select(o.total for o in Order if o.id < 4).order_by(1).to_columns()
+        self.assertEqual(totals.values, [ Decimal(1), Decimal(2), Decimal(3) ])
+
+    def test_entity_in_tuple(self):
+        customers, amounts = select((o.customer, o.amount) for o in Order if o.id <= 2).order_by(2).to_columns()
+        self.assertEqual(customers.values, [ Customer[1], Customer[2] ])
+        self.assertEqual(amounts.values, array('d', [ 1.5, 3.0 ]))
+
+    def test_aggregation(self):
+        query = select((o.customer.name, sum(o.quantity), count(o)) for o in Order).order_by(1)
+        names, quantities, counts = query.to_columns()
+        self.assertEqual(names.values, [ 'John', 'Mike' ])
+        self.assertEqual(quantities.values, array('q', [ 13, 12 ]))
+        self.assertEqual(counts.values, array('q', [ 4, 3 ]))
+
+    @raises_exception(TypeError, 'Columns can be fetched only from query which selects attributes or expressions. '
+                                 'Got: o')
+    def test_entity_query(self):
+        select(o for o in Order).to_columns()
+
+    @raises_exception(TypeError, 'batch_size must be positive integer. Got: 0')
+    def test_incorrect_batch_size(self):
+        select(o.id for o in Order).to_columns(0)
+
+    @unittest.skipIf(numpy is None, 'numpy is not installed')
+    def test_numpy(self):
+        ids, quantities, dates = select((o.id, o.quantity, o.date) for o in Order).order_by(1).to_numpy()
+        self.assertEqual(ids.dtype, numpy.int64)
+        self.assertEqual(ids.tolist(), list(range(1, 8)))
+        self.assertTrue(isinstance(quantities, numpy.ma.MaskedArray))
+        self.assertEqual(quantities.mask.tolist(), [ False, False, True, False, False, False, False ])
+        self.assertEqual(dates.dtype, numpy.dtype('datetime64[D]'))
+
+
+if __name__ == '__main__':
+    unittest.main()
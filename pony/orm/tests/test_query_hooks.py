@@ -0,0 +1,104 @@
+from __future__ import absolute_import, print_function, division
+
+import unittest
+
+from pony.orm.core import *
+from pony.orm.core import QueryEvent
+from pony.orm.tests.testutils import *
+from pony.orm.tests import setup_database, teardown_database
+
+db = Database()
+
+
+class Person(db.Entity):
+    name = Required(str)
+    age = Required(int)
+
+
+class TestQueryHooks(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        setup_database(db)
+        with db_session:
+            Person(id=1, name='John', age=20)
+            Person(id=2, name='Mike', age=30)
+
+    @classmethod
+    def tearDownClass(cls):
+        teardown_database(db)
+
+    def setUp(self):
+        self.events = []
+        db.add_hook(self.events.append)
+
+    def tearDown(self):
+        db.remove_hook(self.events.append)
+
+    def phases(self):
+        return [ event.phase for event in self.events ]
+
+    def test_entity_query(self):
+        with db_session:
+            select(p for p in Person if p.age > 10)[:]
+        self.assertEqual(self.phases(), ['translate', 'build', 'execute', 'fetch', 'materialize', 'commit'])
+        for event in self.events:
+            self.assertTrue(isinstance(event, QueryEvent))
+            self.assertTrue(event.database is db)
+            self.assertGreaterEqual(event.duration, 0)
+        translate, build, execute, fetch, materialize = self.events[:5]
+        self.assertEqual(translate.entity, Person)
+        self.assertTrue(build.sql.startswith('SELECT'))
+        self.assertEqual(execute.sql, build.sql)
+        self.assertEqual(execute.arguments_count, 0)
+        self.assertEqual(fetch.sql, build.sql)
+        self.assertEqual((fetch.row_count, fetch.entity), (2, Person))
+        self.assertEqual((materialize.row_count, materialize.entity), (2, Person))
+
+    def test_cached_translation(self):
+        with db_session:
+            for age in (10, 20):
+                select(p.name for p in Person if p.age > age)[:]
+        translate = [ event for event in self.events if event.phase == 'translate' ]
+        build = [ event for event in self.events if event.phase == 'build' ]
+        self.assertEqual([ event.cached for event in translate[1:] ], [True])
+        self.assertEqual([ event.cached for event in build[1:] ], [True])
+        self.assertEqual(translate[0].entity, None)
+        execute = [ event for event in self.events if event.phase == 'execute' ]
+        self.assertEqual([ event.arguments_count for event in execute ], [1, 1])
+        fetch = [ event for event in self.events if event.phase == 'fetch' ]
+        self.assertEqual([ event.row_count for event in fetch ], [2, 1])
+
+    def test_filter(self):
+        with db_session:
+            Person.select().filter(lambda p: p.age > 25)[:]
+        self.assertEqual(self.phases().count('translate'), 2)
+
+    def test_flush_and_commit(self):
+        with db_session:
+            Person(name='Kate', age=40)
+            Person(name='Mary', age=50)
+            flush()
+            flush()
+            rollback()
+        self.assertEqual(self.phases(), ['execute', 'flush'])
+        self.assertEqual(self.events[-1].row_count, 2)
+        del self.events[:]
+        with db_session:
+            Person[1].age = 21
+        self.assertEqual(self.phases()[-3:], ['execute', 'flush', 'commit'])
+        with db_session:
+            Person[1].age = 20
+
+    def test_remove_hook(self):
+        db.remove_hook(self.events.append)
+        with db_session:
+            select(p for p in Person)[:]
+        self.assertEqual(self.events, [])
+
+    @raises_exception(TypeError, 'Hook should be callable. Got: 1')
+    def test_incorrect_hook(self):
+        db.add_hook(1)
+
+
+if __name__ == '__main__':
+    unittest.main()
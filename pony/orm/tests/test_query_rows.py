@@ -0,0 +1,99 @@
+from __future__ import absolute_import, print_function, division
+
+import unittest
+from datetime import date
+
+from pony.orm.core import *
+from pony.orm.tests.testutils import *
+from pony.orm.tests import setup_database, teardown_database
+
+db = Database()
+
+
+class Group(db.Entity):
+    number = PrimaryKey(int)
+    students = Set('Student')
+
+
+class Student(db.Entity):
+    name = Required(str)
+    dob = Optional(date)
+    group = Optional(Group)
+    bio = Optional(LongStr)
+    marks = Set('Mark')
+
+
+class Mark(db.Entity):
+    student = Required(Student)
+    subject = Required(str)
+    value = Required(int)
+    PrimaryKey(student, subject)
+
+
+class TestQueryRows(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        setup_database(db)
+        with db_session:
+            g = Group(number=101)
+            s1 = Student(id=1, name='John', dob=date(2000, 1, 2), group=g, bio='long text')
+            s2 = Student(id=2, name='Mike')
+            Mark(student=s1, subject='Math', value=5)
+            Mark(student=s2, subject='Math', value=4)
+
+    @classmethod
+    def tearDownClass(cls):
+        teardown_database(db)
+
+    @db_session
+    def test_entity_rows(self):
+        rows = select(s for s in Student).order_by(Student.id).as_rows()
+        self.assertEqual(rows, [(1, 'John', date(2000, 1, 2), 101), (2, 'Mike', None, None)])
+
+    @db_session
+    def test_entity_dicts(self):
+        dicts = select(s for s in Student).order_by(Student.id).as_dicts()
+        self.assertEqual(dicts[0], dict(id=1, name='John', dob=date(2000, 1, 2), group=101))
+
+    @db_session
+    def test_namedtuples(self):
+        rows = select((s.name, s.group) for s in Student).order_by(1).as_namedtuples()
+        self.assertEqual(rows[0].s_name, 'John')
+        self.assertEqual(rows[0].s_group, 101)
+        self.assertEqual(rows[1].s_group, None)
+
+    @db_session
+    def test_identity_map_is_not_used(self):
+        select(s for s in Student).as_dicts()
+        select((m.student, m.value) for m in Mark).as_rows()
+        self.assertEqual(db._get_cache().objects, set())
+
+    @db_session
+    def test_composite_pk(self):
+        rows = select(m for m in Mark).order_by(lambda m: m.value).as_dicts()
+        self.assertEqual(rows, [dict(student=2, subject='Math', value=4), dict(student=1, subject='Math', value=5)])
+        rows = select(m.student.group for m in Mark).as_rows()
+        self.assertEqual(rows, [(101,)])
+
+    @db_session
+    def test_aggregated_entity_query(self):
+        query = select(s for s in Student if count(s.marks) > 0 and s.name != 'Kate').order_by(Student.id)
+        self.assertEqual(query.as_rows(), [(1, 'John', date(2000, 1, 2), 101), (2, 'Mike', None, None)])
+        self.assertEqual(query.as_dicts()[1], dict(id=2, name='Mike', dob=None, group=None))
+        self.assertEqual(select(s for s in Student if count(s.marks) > 1).as_rows(), [])
+        self.assertEqual(db._get_cache().objects, set())
+
+    @db_session
+    def test_limit(self):
+        rows = select(s.name for s in Student).order_by(1).as_rows(limit=1, offset=1)
+        self.assertEqual(rows, [('Mike',)])
+
+    @db_session
+    def test_modified_objects_are_flushed(self):
+        Student[2].name = 'Kate'
+        self.assertEqual(select(s.name for s in Student if s.id == 2).as_rows(), [('Kate',)])
+        rollback()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+from __future__ import absolute_import, print_function, division
+
+import unittest
+
+from pony.orm.core import *
+from pony.orm.tests.testutils import *
+from pony.orm.tests import setup_database, teardown_database
+
+db = Database()
+
+
+class Group(db.Entity):
+    number = PrimaryKey(int)
+    students = Set('Student')
+
+
+class Student(db.Entity):
+    name = Required(str, unique=True)
+    score = Required(int)
+    group = Required(Group)
+
+
+class TestQueryStream(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        setup_database(db)
+        with db_session:
+            g1 = Group(number=1)
+            g2 = Group(number=2)
+            for i in range(25): Student(id=i+1, name='S%d' % i, score=i, group=g1 if i % 2 else g2)
+
+    @classmethod
+    def tearDownClass(cls):
+        teardown_database(db)
+
+    @db_session
+    def test_objects(self):
+        names = [ s.name for s in select(s for s in Student).order_by(Student.id).stream(batch_size=10) ]
+        self.assertEqual(names, [ 'S%d' % i for i in range(25) ])
+
+    @db_session
+    def test_tuples(self):
+        result = list(select((s.name, s.score) for s in Student if s.score < 3).order_by(2).stream(2))
+        self.assertEqual(result, [('S0', 0), ('S1', 1), ('S2', 2)])
+
+    @db_session
+    def test_single_column(self):
+        result = list(select(s.score for s in Student if s.score >= 20).stream(batch_size=3))
+        self.assertEqual(sorted(result), [20, 21, 22, 23, 24])
+
+    @db_session
+    def test_incremental(self):
+        cache = db._get_cache()
+        stream = select(s for s in Student).order_by(Student.id).stream(batch_size=5)
+        next(stream)
+        self.assertEqual(len([ obj for obj in cache.objects if isinstance(obj, Student) ]), 5)
+        stream.close()
+
+    @db_session
+    def test_evict(self):
+        cache = db._get_cache()
+        max_count = 0
+        for s in select(s for s in Student).order_by(Student.id).stream(batch_size=5, evict=True):
+            max_count = max(max_count, len([ obj for obj in cache.objects if isinstance(obj, Student) ]))
+        self.assertEqual(max_count, 5)
+        self.assertEqual(len([ obj for obj in cache.objects if isinstance(obj, Student) ]), 0)
+        s = Student[1]
+        self.assertEqual(s.name, 'S0')
+        self.assertTrue(s in Group[2].students)
+
+    @db_session
+    def test_evict_keeps_modified_objects(self):
+        for s in select(s for s in Student).order_by(Student.id).stream(batch_size=5, evict=True):
+            if s.score == 3: s.score = 100
+        s = Student.get(name='S3')
+        self.assertEqual(s.score, 100)
+        rollback()
+
+    @raises_exception(OperationWithEvictedObjectError, 'Cannot assign new value to Student[1].score: '
+                      'the object was evicted from the session cache by stream(evict=True)')
+    @db_session
+    def test_modify_evicted_object(self):
+        students = list(select(s for s in Student).order_by(Student.id).stream(batch_size=5, evict=True))
+        self.assertEqual(students[0].name, 'S0')
+        students[0].score = 100
+
+    @db_session
+    def test_evict_keeps_objects_of_loaded_collections(self):
+        students = set(Group[1].students)
+        for s in select(s for s in Student).stream(batch_size=5, evict=True): pass
+        cache = db._get_cache()
+        self.assertTrue(students <= cache.objects)
+
+    @db_session
+    def test_relation_to_evicted_object(self):
+        students = select(s for s in Student if s.score < 4).order_by(Student.id)[:]
+        group2 = students[0].group
+        for g in select(g for g in Group).stream(batch_size=1, evict=True): pass
+        cache = db._get_cache()
+        self.assertEqual([ obj for obj in cache.objects if isinstance(obj, Group) ], [group2])
+        group = students[1].group
+        self.assertEqual(group.number, 1)
+        self.assertTrue(group in cache.objects)
+        self.assertEqual(len(group.students), 12)
+        self.assertTrue(students[3].group is group)
+
+    @db_session
+    def test_prefetch(self):
+        query = select(s for s in Student).order_by(Student.id).prefetch(Student.group)
+        groups = { s.group.number for s in query.stream(batch_size=10) }
+        self.assertEqual(groups, {1, 2})
+
+    @raises_exception(TypeError, 'batch_size must be positive integer. Got: 0')
+    @db_session
+    def test_incorrect_batch_size(self):
+        select(s for s in Student).stream(batch_size=0)
+
+    @raises_exception(DatabaseSessionIsOver, 'Cannot continue query streaming: the database session is over')
+    def test_session_is_over(self):
+        with db_session:
+            stream = select(s for s in Student).stream(batch_size=5)
+            next(stream)
+        for s in stream: pass
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,163 @@
+from __future__ import absolute_import, print_function, division
+
+import os, shutil, sqlite3, tempfile, threading
+import unittest
+
+from pony.orm.core import *
+from pony.orm.tests.testutils import *
+
+
+class TestReplicas(unittest.TestCase):
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp()
+        self.primary = os.path.join(self.dirname, 'primary.sqlite')
+        db = Database('sqlite', self.primary, create_db=True)
+        class Person(db.Entity):
+            name = Required(str)
+        db.generate_mapping(create_tables=True)
+        with db_session:
+            Person(name='John')
+        db.disconnect()
+        self.replicas = []
+        for i in range(2):
+            filename = os.path.join(self.dirname, 'replica%d.sqlite' % i)
+            shutil.copy(self.primary, filename)
+            con = sqlite3.connect(filename)
+            con.execute("update Person set name = 'replica%d'" % i)
+            con.commit()
+            con.close()
+            self.replicas.append(filename)
+        set_current_user(None)
+
+    def tearDown(self):
+        set_current_user(None)
+        shutil.rmtree(self.dirname, ignore_errors=True)
+
+    def make_db(self, replica_count=1, **kwargs):
+        db = Database()
+        class Person(db.Entity):
+            name = Required(str)
+        replicas = [ dict(filename=filename) for filename in self.replicas[:replica_count] ]
+        db.bind('sqlite', filename=self.primary, replicas=replicas, **kwargs)
+        db.generate_mapping()
+        self.addCleanup(db.disconnect)
+        return db
+
+    def names(self, db):
+        return select(p.name for p in db.Person)[:]
+
+    def test_readonly_session(self):
+        db = self.make_db()
+        with db_session(readonly=True):
+            self.assertEqual(self.names(db), ['replica0'])
+            self.assertEqual(db.replica_stats[0]['connections'], 1)
+        self.assertEqual(db.replica_stats[0]['connections'], 0)
+
+    def test_auto_routing(self):
+        db = self.make_db()
+        with db_session:
+            self.assertEqual(self.names(db), ['replica0'])
+
+    def test_readonly_routing(self):
+        db = self.make_db(replica_routing='readonly')
+        with db_session:
+            self.assertEqual(self.names(db), ['John'])
+        with db_session(readonly=True):
+            self.assertEqual(self.names(db), ['replica0'])
+
+    def test_immediate_session(self):
+        db = self.make_db()
+        with db_session(immediate=True):
+            self.assertEqual(self.names(db), ['John'])
+
+    def test_write_pins_session_to_primary(self):
+        db = self.make_db()
+        with db_session:
+            self.assertEqual(self.names(db), ['replica0'])
+            db.Person(name='Mike')
+            self.assertEqual(set(self.names(db)), {'John', 'Mike'})
+            commit()
+            self.assertEqual(set(self.names(db)), {'John', 'Mike'})
+        self.assertEqual(db.replica_stats[0]['connections'], 0)
+
+    def test_modified_session_uses_primary(self):
+        db = self.make_db()
+        with db_session:
+            db.Person(name='Mike')
+            self.assertEqual(set(self.names(db)), {'John', 'Mike'})
+
+    def test_round_robin(self):
+        db = self.make_db(replica_count=2)
+        result = []
+        for i in range(4):
+            with db_session(readonly=True):
+                result.extend(self.names(db))
+        self.assertEqual(set(result[:2]), {'replica0', 'replica1'})
+        self.assertEqual(result[2:], result[:2])
+
+    def test_least_connections(self):
+        db = self.make_db(replica_count=2, replica_balancing='least_connections')
+        started, finished = threading.Event(), threading.Event()
+        def run():
+            with db_session(readonly=True):
+                self.names(db)
+                started.set()
+                finished.wait()
+        thread = threading.Thread(target=run)
+        thread.start()
+        started.wait()
+        try:
+            with db_session(readonly=True):
+                self.assertEqual(self.names(db), ['replica1'])
+            with db_session(readonly=True):
+                self.assertEqual(self.names(db), ['replica1'])
+        finally:
+            finished.set()
+            thread.join()
+
+    def test_read_your_writes(self):
+        db = self.make_db(read_your_writes=60)
+        set_current_user('user1')
+        with db_session:
+            db.Person[1].name = 'Johnny'
+        with db_session(readonly=True):
+            self.assertEqual(self.names(db), ['Johnny'])
+        set_current_user('user2')
+        with db_session(readonly=True):
+            self.assertEqual(self.names(db), ['replica0'])
+
+    def test_without_read_your_writes(self):
+        db = self.make_db()
+        set_current_user('user1')
+        with db_session:
+            db.Person[1].name = 'Johnny'
+        with db_session(readonly=True):
+            self.assertEqual(self.names(db), ['replica0'])
+
+    @raises_exception(TransactionError, 'Changes cannot be saved inside of read-only db_session')
+    def test_write_in_readonly_session(self):
+        db = self.make_db()
+        with db_session(readonly=True):
+            db.Person(name='Mike')
+
+    def test_positional_parameters_of_primary(self):
+        db = Database('sqlite', self.primary, replicas=[ {}, dict(filename=self.replicas[1]) ])
+        self.addCleanup(db.disconnect)
+        self.assertEqual([ replica.pool.filename for replica in db._replicas ], [ self.primary, self.replicas[1] ])
+
+    @raises_exception(TypeError, "'readonly' parameter of db_session cannot be used together with "
+                                 "'immediate', 'ddl', 'serializable' or 'optimistic=False' parameters")
+    def test_readonly_and_immediate(self):
+        db_session(readonly=True, immediate=True)
+
+    @raises_exception(ValueError, "replica_balancing must be 'round_robin' or 'least_connections'. Got: 'random'")
+    def test_incorrect_balancing(self):
+        self.make_db(replica_balancing='random')
+
+    @raises_exception(TypeError, "Each replica should be specified as dict of connection parameters. Got: 'x'")
+    def test_incorrect_replica(self):
+        Database('sqlite', self.primary, replicas=['x'])
+
+
+if __name__ == '__main__':
+    unittest.main()
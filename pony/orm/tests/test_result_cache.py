@@ -0,0 +1,138 @@
+from __future__ import absolute_import, print_function, division
+
+import time
+import unittest
+
+from pony.orm.core import *
+from pony.orm.tests.testutils import *
+from pony.orm.tests import setup_database, teardown_database
+
+db = Database()
+
+
+class Group(db.Entity):
+    number = Required(int)
+    students = Set('Student')
+
+
+class Student(db.Entity):
+    name = Required(str)
+    age = Required(int)
+    group = Required(Group)
+
+
+class Course(db.Entity):
+    name = Required(str)
+
+
+class TestResultCache(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        setup_database(db)
+        with db_session:
+            g1 = Group(id=1, number=101)
+            g2 = Group(id=2, number=102)
+            Student(id=1, name='John', age=20, group=g1)
+            Student(id=2, name='Mike', age=22, group=g1)
+            Student(id=3, name='Mary', age=25, group=g2)
+            Course(id=1, name='Math')
+
+    @classmethod
+    def tearDownClass(cls):
+        teardown_database(db)
+
+    def setUp(self):
+        db._result_cache.clear()
+
+    def count_queries(self, func):
+        with db_session:
+            db.merge_local_stats()
+            result = func()
+            return result, db.local_stats[None].db_count
+
+    def test_shared_between_sessions(self):
+        query = lambda: select(s.name for s in Student if s.age > 20).cache()[:]
+        result, count = self.count_queries(query)
+        self.assertEqual((sorted(result), count), (['Mary', 'Mike'], 1))
+        result, count = self.count_queries(query)
+        self.assertEqual((sorted(result), count), (['Mary', 'Mike'], 0))
+
+    def test_objects(self):
+        query = lambda: Student.select(lambda s: s.age > 20).cache()[:]
+        self.count_queries(query)
+        with db_session:
+            db.merge_local_stats()
+            students = query()
+            self.assertEqual(db.local_stats[None].db_count, 0)
+            self.assertEqual({s.name for s in students}, {'Mike', 'Mary'})
+            self.assertEqual(students[0]._session_cache_, db._get_cache())
+
+    def test_not_cached_by_default(self):
+        query = lambda: select(s.name for s in Student)[:]
+        self.count_queries(query)
+        result, count = self.count_queries(query)
+        self.assertEqual(count, 1)
+
+    def test_aggregate(self):
+        query = lambda: select(s for s in Student).cache().count()
+        self.assertEqual(self.count_queries(query), (3, 1))
+        self.assertEqual(self.count_queries(query), (3, 0))
+
+    def test_invalidation(self):
+        query = lambda: select(s.age for s in Student).cache().sum()
+        self.assertEqual(self.count_queries(query), (67, 1))
+        with db_session:
+            Student[1].age = 21
+        self.assertEqual(self.count_queries(query), (68, 1))
+        with db_session:
+            Student[1].age = 20
+        self.assertEqual(self.count_queries(query), (67, 1))
+
+    def test_invalidation_of_joined_table(self):
+        query = lambda: select(s.name for s in Student if s.group.number == 101).cache()[:]
+        self.count_queries(query)
+        with db_session:
+            Group[1].number = 103
+        result, count = self.count_queries(query)
+        self.assertEqual((result, count), ([], 1))
+        with db_session:
+            Group[1].number = 101
+
+    def test_other_table_modification(self):
+        query = lambda: select(s for s in Student).cache().count()
+        self.count_queries(query)
+        with db_session:
+            Course[1].name = 'Physics'
+        self.assertEqual(self.count_queries(query), (3, 0))
+
+    def test_raw_sql_invalidates_all(self):
+        query = lambda: select(s for s in Student).cache().count()
+        self.count_queries(query)
+        with db_session:
+            db.execute('update Course set name = name')
+        self.assertEqual(self.count_queries(query), (3, 1))
+
+    def test_no_commit(self):
+        query = lambda: select(s.age for s in Student).cache().max()
+        self.count_queries(query)
+        with db_session:
+            Student[3].age = 50
+            self.assertEqual(query(), 50)
+            rollback()
+        self.assertEqual(self.count_queries(query), (25, 0))
+
+    def test_ttl(self):
+        query = lambda: select(s for s in Student).cache(ttl=0.01).count()
+        self.count_queries(query)
+        time.sleep(0.02)
+        self.assertEqual(self.count_queries(query), (3, 1))
+        self.assertEqual(db.cache_stats['query_results']['expired'], 1)
+
+    @raises_exception(ValueError, 'Cache ttl must be positive number or None. Got: 0')
+    def test_incorrect_ttl(self):
+        with db_session:
+            select(s for s in Student).cache(ttl=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+from __future__ import absolute_import, print_function, division
+
+import os, shutil, tempfile
+import unittest
+
+from pony import options
+from pony.orm.core import *
+from pony.orm.tests.testutils import *
+
+
+def define_entities(db, with_email=False):
+    class Group(db.Entity):
+        number = Required(int, index=True)
+        students = Set('Student')
+
+    class Student(db.Entity):
+        name = Required(str, index=True)
+        group = Required(Group)
+        courses = Set('Course')
+        if with_email:
+            email = Optional(str)
+
+    class Course(db.Entity):
+        title = Required(str, unique=True)
+        students = Set(Student)
+
+
+class TestSchemaCatalog(unittest.TestCase):
+    def setUp(self):
+        self.dirname = tempfile.mkdtemp()
+        self.filename = os.path.join(self.dirname, 'test.sqlite')
+        self.databases = []
+        self.statements = []
+
+    def tearDown(self):
+        for db in self.databases: db.disconnect()
+        shutil.rmtree(self.dirname, ignore_errors=True)
+
+    def make_database(self, with_email=False, **kwargs):
+        db = Database()
+        self.databases.append(db)
+        define_entities(db, with_email)
+        db.bind('sqlite', self.filename, create_db=True)
+        db.generate_mapping(**kwargs)
+        return db
+
+    def trace(self, db):
+        with db_session:
+            db.get_connection().set_trace_callback(self.statements.append)
+        del self.statements[:]
+
+    def raw_execute(self, sql):
+        db = Database('sqlite', self.filename)
+        self.databases.append(db)
+        with db_session:
+            db.execute(sql)
+
+    def test_check_tables(self):
+        self.make_database(create_tables=True)
+        db = self.make_database(check_tables=False)
+        self.trace(db)
+        db.check_tables()
+        probes = [ sql for sql in self.statements if 'WHERE 0 = 1' in sql ]
+        catalog_queries = [ sql for sql in self.statements if 'sqlite_master' in sql ]
+        self.assertEqual((len(probes), len(catalog_queries)), (0, 1))
+
+    def test_create_existing_tables(self):
+        self.make_database(create_tables=True)
+        db = self.make_database(check_tables=False)
+        self.trace(db)
+        db.create_tables()
+        self.assertEqual([ sql for sql in self.statements if 'CREATE' in sql ], [])
+        self.assertEqual(len([ sql for sql in self.statements if 'sqlite_master' in sql ]), 1)
+
+    def test_create_missing_index(self):
+        self.make_database(create_tables=True)
+        self.raw_execute('DROP INDEX "idx_student__name"')
+        db = self.make_database(create_tables=True)
+        with db_session:
+            self.assertEqual(db.provider.index_exists(db.get_connection(), 'Student', 'idx_student__name'),
+                             'idx_student__name')
+
+    def test_missing_column(self):
+        self.make_database(create_tables=True)
+        with self.assertRaises(OperationalError):
+            self.make_database(with_email=True)
+
+    def test_fingerprint(self):
+        self.make_database(create_tables=True, schema_fingerprint=True)
+        db = self.make_database(check_tables=False)
+        with db_session:
+            self.assertEqual(len(db.select('select * from %s' % options.SCHEMA_FINGERPRINT_TABLE)), 1)
+        self.trace(db)
+        db.check_tables(schema_fingerprint=True)
+        self.assertEqual([ sql for sql in self.statements if 'WHERE 0 = 1' in sql or 'pragma_table_info' in sql ], [])
+
+    def test_unchanged_schema_creates_missing_objects(self):
+        self.make_database(create_tables=True, schema_fingerprint=True)
+        self.raw_execute('DROP INDEX "idx_student__name"')
+        db = self.make_database(create_tables=True, schema_fingerprint=True)
+        with db_session:
+            self.assertEqual(db.provider.index_exists(db.get_connection(), 'Student', 'idx_student__name'),
+                             'idx_student__name')
+
+    def test_drop_all_tables_clears_fingerprint(self):
+        db = self.make_database(create_tables=True, schema_fingerprint=True)
+        db.drop_all_tables(with_all_data=True)
+        with db_session:
+            self.assertEqual(db.select('select * from %s' % options.SCHEMA_FINGERPRINT_TABLE), [])
+        db = self.make_database(create_tables=True, schema_fingerprint=True)
+        with db_session:
+            self.assertEqual(db.Student.select().count(), 0)
+
+    def test_drop_table_clears_fingerprint(self):
+        db = self.make_database(create_tables=True, schema_fingerprint=True)
+        db.drop_table('Course_Student', with_all_data=True)
+        db = self.make_database(create_tables=True, schema_fingerprint=True)
+        with db_session:
+            self.assertTrue(db.provider.table_exists(db.get_connection(), 'Course_Student'))
+
+    def test_only_latest_fingerprint_is_stored(self):
+        self.make_database(create_tables=True, schema_fingerprint=True)
+        self.raw_execute('ALTER TABLE "Student" ADD COLUMN "email" TEXT')
+        db = self.make_database(with_email=True, check_tables=True, schema_fingerprint=True)
+        with db_session:
+            self.assertEqual(db.select('select * from %s' % options.SCHEMA_FINGERPRINT_TABLE),
+                             [ db.schema.get_fingerprint() ])
+
+    def test_changed_schema_is_verified(self):
+        self.make_database(create_tables=True, schema_fingerprint=True)
+        with self.assertRaises(OperationalError):
+            self.make_database(with_email=True, schema_fingerprint=True)
+        self.make_database(check_tables=True, schema_fingerprint=True)
+        with db_session:
+            db = self.databases[-1]
+            self.assertEqual(len(db.select('select * from %s' % options.SCHEMA_FINGERPRINT_TABLE)), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
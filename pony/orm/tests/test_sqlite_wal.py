@@ -0,0 +1,86 @@
+from __future__ import absolute_import, print_function, division
+
+import os, shutil, tempfile, threading
+import unittest
+
+from pony.orm.core import *
+from pony.orm.tests.testutils import *
+
+db = Database()
+
+
+class Account(db.Entity):
+    name = Required(str)
+    balance = Required(int)
+
+
+class TestSQLiteWAL(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.dirname = tempfile.mkdtemp()
+        db.bind('sqlite', os.path.join(cls.dirname, 'test.sqlite'), create_db=True, wal=True, busy_timeout=2000)
+        db.generate_mapping(create_tables=True)
+        with db_session:
+            Account(id=1, name='A', balance=100)
+
+    @classmethod
+    def tearDownClass(cls):
+        db.disconnect()
+        shutil.rmtree(cls.dirname, ignore_errors=True)
+
+    def test_pragmas(self):
+        with db_session:
+            connection = db.get_connection()
+            self.assertEqual(connection.execute('PRAGMA journal_mode').fetchone()[0], 'wal')
+            self.assertEqual(connection.execute('PRAGMA busy_timeout').fetchone()[0], 2000)
+
+    def test_read_connection(self):
+        with db_session(readonly=True):
+            self.assertEqual(Account[1].name, 'A')
+            connection = db._get_cache().connection
+            self.assertIs(connection, db.provider.read_pool.con)
+            self.assertEqual(connection.execute('PRAGMA query_only').fetchone()[0], 1)
+        with db_session:
+            self.assertEqual(Account[1].name, 'A')
+            self.assertIsNot(db._get_cache().connection, db.provider.read_pool.con)
+
+    def test_reader_is_not_blocked_by_writer(self):
+        flushed = threading.Event()
+        done = threading.Event()
+        def writer():
+            with db_session:
+                Account[1].balance = 200
+                flush()
+                flushed.set()
+                done.wait(5)
+        thread = threading.Thread(target=writer)
+        thread.start()
+        try:
+            self.assertTrue(flushed.wait(5))
+            with db_session(readonly=True):
+                self.assertEqual(Account[1].balance, 100)
+        finally:
+            done.set()
+            thread.join()
+        with db_session(readonly=True):
+            self.assertEqual(Account[1].balance, 200)
+        with db_session:
+            Account[1].balance = 100
+
+    @raises_exception(TransactionError, 'Transaction cannot be started inside of read-only db_session')
+    def test_for_update(self):
+        with db_session(readonly=True):
+            Account[1]
+            Account.select().for_update()[:]
+
+    @raises_exception(TypeError, 'WAL mode cannot be used with in-memory SQLite database')
+    def test_in_memory(self):
+        Database('sqlite', ':memory:', wal=True)
+
+    @raises_exception(ValueError, 'busy_timeout must be non-negative number of milliseconds. Got: -1')
+    def test_incorrect_busy_timeout(self):
+        Database('sqlite', ':memory:', busy_timeout=-1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+from __future__ import absolute_import, print_function, division
+
+import io, json
+import unittest
+
+from pony.orm.core import *
+from pony.orm.serialization import Bag, iter_objects_json
+from pony.orm.tests.testutils import *
+from pony.orm.tests import setup_database, teardown_database
+
+db = Database()
+
+
+class Group(db.Entity):
+    number = Required(int)
+    students = Set('Student')
+
+
+class Student(db.Entity):
+    name = Required(str)
+    group = Required(Group)
+    courses = Set('Course')
+
+
+class Course(db.Entity):
+    name = Required(str)
+    semester = Required(int)
+    PrimaryKey(name, semester)
+    students = Set(Student)
+
+
+class TestToJson(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        setup_database(db)
+        with db.set_perms_for(Group, Student, Course):
+            perm('view', group='anybody')
+        with db_session:
+            courses = [ Course(name='C%d' % (i // 2), semester=i % 2 + 1) for i in range(4) ]
+            for i in range(1, 4):
+                Group(id=i, number=100 + i)
+            for i in range(1, 13):
+                Student(id=i, name='S%d' % i, group=(i - 1) // 4 + 1, courses=courses[i % 4:i % 4 + 2])
+
+    @classmethod
+    def tearDownClass(cls):
+        teardown_database(db)
+
+    def setUp(self):
+        rollback()
+        db_session.__enter__()
+        db.merge_local_stats()
+
+    def tearDown(self):
+        rollback()
+        db_session.__exit__()
+
+    def get_queries_count(self):
+        count = db.local_stats[None].db_count
+        db.merge_local_stats()
+        return count
+
+    def test_objects(self):
+        students = select(s for s in Student if s.id <= 2)[:]
+        result = json.loads(db.to_json(students, with_schema=False))
+        self.assertEqual(result['data'], [ {'class': 'Student', 'pk': 1}, {'class': 'Student', 'pk': 2} ])
+        self.assertEqual(result['objects'], {'Student': {
+            '1': {'id': 1, 'name': 'S1', 'group': 1}, '2': {'id': 2, 'name': 'S2', 'group': 1}}})
+
+    def test_batch_loading(self):
+        students = Student.select()[:]
+        self.get_queries_count()
+        result = json.loads(db.to_json(students, include=[Student.group, Student.courses], with_schema=False))
+        # groups, collections of courses and courses are loaded by a single query each
+        self.assertEqual(self.get_queries_count(), 3)
+        self.assertEqual(sorted(result['objects']), ['Course', 'Group', 'Student'])
+        self.assertEqual(len(result['objects']['Student']), 12)
+        self.assertEqual(result['objects']['Group']['2'], {'id': 2, 'number': 102})
+        self.assertEqual(result['objects']['Student']['1']['courses'], [ ['C0', 2], ['C1', 1] ])
+
+    def test_composite_primary_key(self):
+        courses = Course.select()[:]
+        result = json.loads(db.to_json(courses, with_schema=False))
+        self.assertEqual(result['objects']['Course'], {
+            'C0': {'1': {'name': 'C0', 'semester': 1}, '2': {'name': 'C0', 'semester': 2}},
+            'C1': {'1': {'name': 'C1', 'semester': 1}, '2': {'name': 'C1', 'semester': 2}}})
+
+    def test_stream(self):
+        groups = Group.select()[:]
+        stream = io.StringIO()
+        self.assertIsNone(db.to_json(groups, include=[Group.students], stream=stream))
+        self.assertEqual(stream.getvalue(), db.to_json(groups, include=[Group.students]))
+
+    def test_schema_hash(self):
+        result = json.loads(Group.select().to_json())
+        self.assertIn('schema', result)
+        result = json.loads(Group.select().to_json(schema_hash=result['schema_hash']))
+        self.assertNotIn('schema', result)
+        self.assertIn('schema_hash', result)
+
+    def test_chunks(self):
+        courses = Course.select()[:]
+        chunks = list(iter_objects_json(courses, lambda obj: obj.semester, None, chunk_size=1))
+        # courses with the same name are in the same chunk
+        self.assertEqual(chunks, [ '{', '"Course": {', '"C0": {"1": 1, "2": 2}', ', "C1": {"1": 1, "2": 2}', '}', '}' ])
+
+    def test_bag(self):
+        students = Student.select()[:]
+        self.get_queries_count()
+        bag = Bag(db)
+        bag.put(students)
+        result = bag.to_dict()
+        self.assertEqual(self.get_queries_count(), 3)
+        self.assertEqual(len(result['Group']), 3)
+        self.assertEqual(result['Course']['C1,1'], {'name': 'C1', 'semester': 1})
+        self.assertEqual(result['Student'][2]['courses'], ['C1,1', 'C1,2'])
+
+    def test_bag_stream(self):
+        bag = Bag(db)
+        bag.put(Group.select())
+        stream = io.StringIO()
+        bag.to_json(stream)
+        self.assertEqual(json.loads(stream.getvalue()), json.loads(bag.to_json()))
+
+    @raises_exception(TypeError, "Each item of 'include' list should be attribute. Got: students")
+    def test_incorrect_include(self):
+        db.to_json(Group.select()[:], include=['students'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+from __future__ import absolute_import, print_function, division
+
+import unittest
+
+from pony.orm.core import *
+from pony.orm.tests.testutils import *
+from pony.orm.tests import setup_database, teardown_database
+
+db = Database()
+
+
+class Group(db.Entity):
+    number = Required(int, unique=True)
+    students = Set('Student')
+
+
+class Student(db.Entity):
+    code = Required(str, unique=True)
+    name = Required(str)
+    score = Required(int, default=0)
+    group = Optional(Group)
+
+
+class TestUpsert(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        setup_database(db)
+
+    @classmethod
+    def tearDownClass(cls):
+        teardown_database(db)
+
+    def setUp(self):
+        with db_session:
+            Student.select().delete(bulk=True)
+            Group.select().delete(bulk=True)
+            Group(id=1, number=101)
+            Student(id=1, code='S1', name='John', score=10, group=1)
+        db.merge_local_stats()
+
+    def test_insert_and_update(self):
+        with db_session:
+            count = Student.upsert_many([
+                dict(code='S1', name='John Smith', score=20),
+                dict(code='S2', name='Mike', score=30),
+            ], conflict_keys='code')
+            self.assertEqual(count, 2)
+        with db_session:
+            self.assertEqual(select((s.code, s.name, s.score) for s in Student).order_by(1)[:],
+                             [('S1', 'John Smith', 20), ('S2', 'Mike', 30)])
+            self.assertEqual(Student.get(code='S1').group, Group[1])
+
+    def test_primary_key(self):
+        with db_session:
+            Student.upsert_many([ dict(id=1, code='S1', name='Johnny'), dict(id=2, code='S2', name='Kate') ],
+                                update=['name'])
+        with db_session:
+            self.assertEqual(Student[1].name, 'Johnny')
+            self.assertEqual(Student[1].score, 10)
+            self.assertEqual(Student[2].score, 0)  # default value
+
+    def test_do_nothing(self):
+        with db_session:
+            Student.upsert_many([ dict(code='S1', name='Other') ], conflict_keys=['code'], update=())
+        with db_session:
+            self.assertEqual(Student.get(code='S1').name, 'John')
+
+    def test_reference(self):
+        with db_session:
+            Student.upsert_many([ dict(code='S3', name='Mary', group=Group[1]), dict(code='S4', name='Kate', group=1) ],
+                                conflict_keys='code')
+        with db_session:
+            self.assertEqual(Group[1].students.count(), 3)
+
+    def test_batches(self):
+        prev_max_params_count = db.provider.max_params_count
+        db.provider.max_params_count = 10
+        try:
+            with db_session:
+                Student.upsert_many([ dict(code='N%d' % i, name='Student %d' % i) for i in range(10) ],
+                                    conflict_keys='code')
+        finally:
+            db.provider.max_params_count = prev_max_params_count
+        upserts = [ stat.db_count for sql, stat in db.local_stats.items() if sql and 'ON CONFLICT' in sql ]
+        self.assertEqual(sum(upserts), 4)
+        with db_session:
+            self.assertEqual(count(s for s in Student), 11)
+
+    def test_cached_batch_sizes(self):
+        Student._insert_sql_cache_.clear()
+        with db_session:
+            Student.upsert_many([ dict(code='N%d' % i, name='Student %d' % i) for i in range(40) ], conflict_keys='code')
+        rows_counts = sorted(key[-1] for key in Student._insert_sql_cache_ if key[0] == 'UPSERT')
+        self.assertEqual(rows_counts, [8, 32])
+        with db_session:
+            self.assertEqual(count(s for s in Student), 41)
+
+    def test_loaded_objects_are_refreshed(self):
+        with db_session:
+            s1 = Student[1]
+            self.assertEqual(s1.score, 10)
+            Student.upsert_many([ dict(code='S1', name='John', score=50) ], conflict_keys='code')
+            self.assertEqual(s1.score, 50)
+            s1.score += 1
+        with db_session:
+            self.assertEqual(Student[1].score, 51)
+
+    def test_unsaved_changes_are_flushed(self):
+        with db_session:
+            Student(code='S5', name='Alex')
+            Student.upsert_many([ dict(code='S5', name='Alexander') ], conflict_keys='code')
+        with db_session:
+            self.assertEqual(Student.get(code='S5').name, 'Alexander')
+
+    @raises_exception(TypeError, 'conflict_keys should be primary key or unique key of entity Student. Got: name')
+    def test_not_unique_key(self):
+        with db_session:
+            Student.upsert_many([ dict(code='S1', name='John') ], conflict_keys='name')
+
+    @raises_exception(TypeError, 'All rows should have the same set of attributes')
+    def test_different_attributes(self):
+        with db_session:
+            Student.upsert_many([ dict(code='S1', name='John'), dict(code='S2', name='Mike', score=1) ],
+                                conflict_keys='code')
+
+    @raises_exception(TypeError, 'Conflict key Student.code cannot be updated')
+    def test_update_conflict_key(self):
+        with db_session:
+            Student.upsert_many([ dict(code='S1', name='John') ], conflict_keys='code', update='code name')
+
+    @raises_exception(ValueError, 'Attribute Student.name is required')
+    def test_required(self):
+        with db_session:
+            Student.upsert_many([ dict(code='S1', name=None) ], conflict_keys='code')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,6 @@
-import sys, platform
+import sys
 
-PYPY = platform.python_implementation() == 'PyPy'
+PYPY = sys.implementation.name == 'pypy'
 PY37 = sys.version_info[:2] >= (3, 7)
 PY38 = sys.version_info[:2] >= (3, 8)
 PY39 = sys.version_info[:2] >= (3, 9)
@@ -6,10 +6,10 @@ from datetime import datetime
 from itertools import count as _count
 from inspect import isfunction
 from time import strptime
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 from functools import update_wrapper, wraps
-from xml.etree import cElementTree
 from copy import deepcopy
+from threading import Lock
 
 import pony
 from pony import options
@@ -105,15 +105,16 @@ def truncate_repr(s, max_len=100):
     s = repr(s)
     return s if len(s) <= max_len else s[:max_len-3] + '...'
 
-codeobjects = {}
+_codeobject_keys = _count(1)
 
 def get_codeobject_id(codeobject):
+    # Returns key which is used instead of id(codeobject) in caches. Cached code object is kept alive,
+    # after its eviction the same id may belong to another code object, which gets a new unique key
     codeobject_id = id(codeobject)
-    if codeobject_id not in codeobjects:
-        codeobjects[codeobject_id] = codeobject
-    return codeobject_id
-
-lambda_args_cache = {}
+    entry = codeobjects.get(codeobject_id)
+    if entry is None or entry[0] is not codeobject:
+        entry = codeobjects[codeobject_id] = codeobject, next(_codeobject_keys)
+    return entry[1]
 
 def get_lambda_args(func):
     if type(func) is types.FunctionType:
@@ -303,7 +304,9 @@ def tostring(x):
     if hasattr(x, '__unicode__'):
         try: return str(x)
         except: pass
-    if hasattr(x, 'makeelement'): return cElementTree.tostring(x)
+    if hasattr(x, 'makeelement'):
+        from xml.etree import cElementTree
+        return cElementTree.tostring(x)
     try: return str(x)
     except: pass
     try: return repr(x)
@@ -424,6 +427,70 @@ class HashableDict(dict):
     setdefault = _hashable_wrap(dict.setdefault)
     update = _hashable_wrap(dict.update)
 
+class LRUCache(object):
+    def __init__(cache, maxsize=None):
+        if maxsize is not None and (not isinstance(maxsize, int) or maxsize < 1):
+            throw(ValueError, 'Cache size must be positive integer or None. Got: %r' % maxsize)
+        cache.maxsize = maxsize
+        cache.data = OrderedDict()
+        cache.lock = Lock()
+        cache.hits = cache.misses = cache.evictions = 0
+    def __len__(cache):
+        return len(cache.data)
+    def __contains__(cache, key):
+        return key in cache.data
+    def get(cache, key, default=None):
+        with cache.lock:
+            data = cache.data
+            try: value = data[key]
+            except KeyError:
+                cache.misses += 1
+                return default
+            data.move_to_end(key)
+            cache.hits += 1
+            return value
+    def __getitem__(cache, key):
+        value = cache.get(key, _missing)
+        if value is _missing: raise KeyError(key)
+        return value
+    def __setitem__(cache, key, value):
+        with cache.lock:
+            data = cache.data
+            data[key] = value
+            data.move_to_end(key)
+            cache._evict()
+    def __delitem__(cache, key):
+        with cache.lock: del cache.data[key]
+    def pop(cache, key, default=None):
+        with cache.lock: return cache.data.pop(key, default)
+    def clear(cache):
+        with cache.lock: cache.data.clear()
+    def resize(cache, maxsize):
+        if maxsize is not None and (not isinstance(maxsize, int) or maxsize < 1):
+            throw(ValueError, 'Cache size must be positive integer or None. Got: %r' % maxsize)
+        with cache.lock:
+            cache.maxsize = maxsize
+            cache._evict()
+    def _evict(cache):
+        maxsize = cache.maxsize
+        if maxsize is None: return
+        data = cache.data
+        while len(data) > maxsize:
+            data.popitem(last=False)
+            cache.evictions += 1
+    def reset_stats(cache):
+        with cache.lock: cache.hits = cache.misses = cache.evictions = 0
+    @property
+    def stats(cache):
+        with cache.lock:
+            return dict(size=len(cache.data), maxsize=cache.maxsize,
+                        hits=cache.hits, misses=cache.misses, evictions=cache.evictions)
+
+_missing = object()
+
+codeobjects = LRUCache(options.CODEOBJECT_CACHE_SIZE)  # id(codeobject) -> (codeobject, key)
+lambda_args_cache = LRUCache(options.CODEOBJECT_CACHE_SIZE)
+
 def deref_proxy(value):
     t = type(value)
     if t.__name__ == 'LocalProxy' and '_get_current_object' in t.__dict__:
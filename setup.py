@@ -89,6 +89,7 @@ packages = [
     "pony.flask",
     "pony.flask.example",
     "pony.orm",
+    "pony.orm.benchmarks",
     "pony.orm.dbproviders",
     "pony.orm.examples",
     "pony.orm.integration",
@@ -99,6 +100,7 @@ packages = [
 
 package_data = {
     'pony.flask.example': ['templates/*.html'],
+    'pony.orm.benchmarks': ['baseline.json'],
     'pony.orm.tests': ['queries.txt']
 }
 